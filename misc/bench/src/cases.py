@@ -0,0 +1,253 @@
+#
+# Benchmark cases with synthetic inputs parameterised by size
+#
+# Each case is
+#   setup(n : int, tmpdir : str) -> args : tuple (not measured)
+#   run(*args) -> result (measured, summarized for checking against baseline)
+#
+import collections, json, os
+import numpy as np
+
+
+Case = collections.namedtuple('Case', [
+  'name',  # str
+  'sizes', # map<str, int> (e.g. dict(small=..., medium=..., large=...))
+  'setup', # (n : int, tmpdir : str) -> tuple
+  'run',   # (*args) -> result
+])
+
+
+#
+# Synthetic data
+#
+
+def make_environment(h): # -> float32[h, 2 * h, 3] (deterministic equirectangular "sky")
+  rng = np.random.default_rng(0)
+  theta, phi = np.meshgrid(
+      np.linspace(0, np.pi, num=h, dtype=np.float32),
+      np.linspace(0, 2 * np.pi, num=2 * h, dtype=np.float32), indexing='ij')
+  sky = np.stack([1 + np.cos(theta), 0.5 + 0.5 * np.sin(phi), np.full_like(theta, 0.2)], axis=-1)
+  sun = 50 * np.exp(-((theta - 0.6)**2 + (phi - 2.0)**2) * 100)[..., None]
+  noise = 0.1 * rng.random(sky.shape, dtype=np.float32)
+  return np.float32(sky + sun + noise)
+
+
+def make_torus(n): # -> (float32[?, 3], uint32[?, 4])
+  from misc.mesh.src import data
+  return data.torus(n=n, m=max(n // 4, 3))
+
+
+def make_torus_tris(n): # -> (float32[?, 3], uint32[?, 3])
+  from misc.mesh.src import utils
+  p_vs, faces = make_torus(n)
+  return p_vs, utils.quads_to_tris(faces)
+
+
+def write_ply_ascii(filename, p_vs, faces):
+  with open(filename, 'w') as f:
+    f.write('ply\nformat ascii 1.0\n')
+    f.write(f"element vertex {len(p_vs)}\nproperty float x\nproperty float y\nproperty float z\n")
+    f.write(f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n")
+    np.savetxt(f, p_vs, fmt='%.7g')
+    np.savetxt(f, np.concatenate([np.full((len(faces), 1), 3, np.uint32), faces], axis=1), fmt='%d')
+
+
+# Same layout as Armadillo.ply assumed by loader_ply.load_binary_big_endian
+def write_ply_binary(filename, p_vs, faces):
+  face_data = np.empty(len(faces), np.dtype([('xx', 'u1', (2,)), ('indices', '>u4', (3,))]))
+  face_data['xx'] = [0, 3]
+  face_data['indices'] = faces
+  with open(filename, 'wb') as f:
+    f.write(b'ply\nformat binary_big_endian 1.0\n')
+    f.write(f"element vertex {len(p_vs)}\nproperty float x\nproperty float y\nproperty float z\n".encode())
+    f.write(f"element face {len(faces)}\nproperty uchar intensity\nproperty list uchar int vertex_indices\n".encode())
+    f.write(b'end_header\n')
+    f.write(np.asarray(p_vs, '>f4').tobytes())
+    f.write(face_data.tobytes())
+
+
+def write_obj(filename, p_vs, faces):
+  with open(filename, 'w') as f:
+    np.savetxt(f, p_vs, fmt='v %.7g %.7g %.7g')
+    np.savetxt(f, faces + 1, fmt='f %d %d %d')
+
+
+def write_gltf(gltf_file, buffer_file, p_vs, faces):
+  positions = np.float32(p_vs).tobytes()
+  indices = np.uint32(faces).tobytes()
+  gltf = dict(
+    accessors=[
+      dict(bufferView=0, componentType=5126, count=len(p_vs), type='VEC3'),
+      dict(bufferView=1, componentType=5125, count=faces.size, type='SCALAR'),
+    ],
+    bufferViews=[
+      dict(buffer=0, byteOffset=0, byteLength=len(positions)),
+      dict(buffer=0, byteOffset=len(positions), byteLength=len(indices)),
+    ],
+    buffers=[dict(uri=os.path.basename(buffer_file), byteLength=len(positions) + len(indices))],
+    meshes=[dict(primitives=[dict(attributes=dict(POSITION=0), indices=1)])],
+  )
+  with open(gltf_file, 'w') as f:
+    json.dump(gltf, f)
+  with open(buffer_file, 'wb') as f:
+    f.write(positions + indices)
+
+
+def make_scalar_field(n): # -> float32[n + 1, n + 1, n + 1] (sphere distance with noise)
+  rng = np.random.default_rng(0)
+  x = np.linspace(-1, 1, num=n + 1, dtype=np.float32)
+  x, y, z = np.meshgrid(x, x, x, indexing='ij')
+  return np.float32(np.sqrt(x**2 + y**2 + z**2) + 0.05 * rng.random(x.shape))
+
+
+#
+# Cases
+#
+
+def setup_hdr_write(n, tmpdir):
+  return make_environment(n), os.path.join(tmpdir, 'out.hdr')
+
+def run_hdr_write(rgb, filename):
+  from misc.hdr.src import main
+  main.write_file(filename, rgb)
+  return np.fromfile(filename, np.uint8)
+
+
+def setup_hdr_load(n, tmpdir):
+  from misc.hdr.src import main
+  filename = os.path.join(tmpdir, 'in.hdr')
+  main.write_file(filename, make_environment(n))
+  return (filename,)
+
+def run_hdr_load(filename):
+  from misc.hdr.src import main
+  return main.load_file(filename)
+
+def run_hdr_load_v2(filename):
+  from misc.hdr.src import main_v2
+  return main_v2.load_file(filename)
+
+
+def setup_irradiance(n, tmpdir):
+  return make_environment(n), 64, 32
+
+def run_irradiance(rgb, w, h):
+  from misc.hdr.src import irradiance
+  return irradiance.make_irradiance_map(rgb, w, h)
+
+
+def setup_finalize(n, tmpdir):
+  return make_torus(n)
+
+def run_finalize_smooth(p_vs, faces):
+  from misc.mesh.src import utils
+  return utils.finalize(p_vs, faces, smooth=True)
+
+def run_finalize_flat(p_vs, faces):
+  from misc.mesh.src import utils
+  return utils.finalize(p_vs, faces, smooth=False)
+
+
+def setup_subdiv(n, tmpdir):
+  from misc.mesh.src import data
+  return data.cube() + (n,)
+
+def run_subdiv(p_vs, faces, n):
+  from misc.mesh.src import utils
+  return utils.subdiv(p_vs, faces, n)
+
+
+def setup_subdiv_triforce(n, tmpdir):
+  from misc.mesh.src import data, utils
+  p_vs, faces = data.hedron20()
+  for _ in range(n):
+    p_vs, faces = utils.subdiv_triforce(p_vs, faces)
+  return p_vs, faces
+
+def run_subdiv_triforce(p_vs, faces):
+  from misc.mesh.src import utils
+  return utils.subdiv_triforce(p_vs, faces)
+
+
+def run_subdivision(p_vs, faces):
+  from misc.mesh.src import subdivision
+  return subdivision.subdivision(p_vs, faces)
+
+
+def setup_loader(writer, ext):
+  def setup(n, tmpdir):
+    filename = os.path.join(tmpdir, f"mesh.{ext}")
+    writer(filename, *make_torus_tris(n))
+    return (filename,)
+  return setup
+
+def run_loader_ply(filename):
+  from misc.mesh.src import loader_ply
+  return loader_ply.load(filename)
+
+def run_loader_obj(filename):
+  from misc.mesh.src import loader_obj
+  return loader_obj.load(filename)
+
+
+def setup_loader_gltf(n, tmpdir):
+  gltf_file, buffer_file = os.path.join(tmpdir, 'mesh.gltf'), os.path.join(tmpdir, 'mesh.bin')
+  write_gltf(gltf_file, buffer_file, *make_torus_tris(n))
+  return gltf_file, buffer_file
+
+def run_loader_gltf(gltf_file, buffer_file):
+  from misc.mesh.src import loader_gltf
+  return loader_gltf.load(gltf_file, buffer_file)
+
+
+def setup_marching_cube(n, tmpdir):
+  from misc.marching_cube.src import table_marching_cube
+  return make_scalar_field(n), 1.0, table_marching_cube.data
+
+# Polygonize every cell (as reference for vectorized implementation)
+def run_marching_cube(field, threshold, table):
+  from misc.marching_cube.src import utils
+  corners = utils.kCornerPositions.astype(np.int64)
+  n = field.shape[0] - 1
+  num_verts, num_faces, position_sum = 0, 0, 0.0
+  for i in range(n):
+    for j in range(n):
+      for k in range(n):
+        f = field[i + corners[:, 0], j + corners[:, 1], k + corners[:, 2]]
+        positions, faces = utils.marching_cube_single(f, threshold, table)
+        num_verts += len(positions)
+        num_faces += len(faces)
+        position_sum += float(np.sum(positions))
+  return num_verts, num_faces, position_sum
+
+
+def setup_marching_cube_table(n, tmpdir):
+  from misc.marching_cube.src import table_all_faces
+  return (table_all_faces.data,)
+
+def run_marching_cube_table(table):
+  from misc.marching_cube.src import utils
+  return utils.make_data(table)
+
+
+SIZES_IMAGE = dict(small=64, medium=256, large=1024)  # env map height
+SIZES_MESH = dict(small=32, medium=128, large=512)    # torus resolution
+SIZES_LEVEL = dict(small=1, medium=3, large=4)        # subdivision level
+
+CASES = [
+  Case('hdr.main.write',          SIZES_IMAGE, setup_hdr_write, run_hdr_write),
+  Case('hdr.main.load',           SIZES_IMAGE, setup_hdr_load, run_hdr_load),
+  Case('hdr.main_v2.load',        SIZES_IMAGE, setup_hdr_load, run_hdr_load_v2),
+  Case('hdr.irradiance.make_irradiance_map', dict(small=32, medium=128, large=512), setup_irradiance, run_irradiance),
+  Case('mesh.utils.finalize.smooth', SIZES_MESH, setup_finalize, run_finalize_smooth),
+  Case('mesh.utils.finalize.flat', SIZES_MESH, setup_finalize, run_finalize_flat),
+  Case('mesh.utils.subdiv',       SIZES_LEVEL, setup_subdiv, run_subdiv),
+  Case('mesh.utils.subdiv_triforce', SIZES_LEVEL, setup_subdiv_triforce, run_subdiv_triforce),
+  Case('mesh.subdivision.subdivision', SIZES_MESH, setup_finalize, run_subdivision),
+  Case('mesh.loader_ply.ascii',   SIZES_MESH, setup_loader(write_ply_ascii, 'ply'), run_loader_ply),
+  Case('mesh.loader_ply.binary',  SIZES_MESH, setup_loader(write_ply_binary, 'ply'), run_loader_ply),
+  Case('mesh.loader_obj',         SIZES_MESH, setup_loader(write_obj, 'obj'), run_loader_obj),
+  Case('mesh.loader_gltf',        SIZES_MESH, setup_loader_gltf, run_loader_gltf),
+  Case('marching_cube.utils.marching_cube_single', dict(small=8, medium=24, large=64), setup_marching_cube, run_marching_cube),
+  Case('marching_cube.utils.make_data', dict(small=0, medium=0, large=0), setup_marching_cube_table, run_marching_cube_table),
+]
@@ -0,0 +1,126 @@
+#
+# Run benchmark cases (cf. cases.py) and check time/peak memory/result against baseline
+#
+import argparse, fnmatch, json, sys, tempfile, time, traceback, tracemalloc
+import numpy as np
+from .cases import CASES
+
+
+# result -> JSON-able nested list (shape, dtype, sum and absolute sum of each array in result)
+def summarize(result):
+  if isinstance(result, dict):
+    return [[k, summarize(result[k])] for k in sorted(result)]
+  if isinstance(result, (tuple, list)):
+    return [summarize(x) for x in result]
+  array = np.asarray(result)
+  if array.dtype == object:
+    return [summarize(x) for x in result]
+  values = array.astype(np.float64)
+  return [list(array.shape), str(array.dtype), float(np.sum(values)), float(np.sum(np.abs(values)))]
+
+
+def checksum_equal(a, b, rtol=1e-6): # -> bool
+  if isinstance(a, list) and isinstance(b, list):
+    return len(a) == len(b) and all(checksum_equal(x, y, rtol) for x, y in zip(a, b))
+  if isinstance(a, float) and isinstance(b, float):
+    return bool(np.isclose(a, b, rtol=rtol, atol=0))
+  return a == b
+
+
+# Time is best of `repeat` runs. Peak memory is measured by separate run under tracemalloc
+# since tracing slows allocation heavy code.
+def run_case(case, size, repeat): # -> dict
+  n = case.sizes[size]
+  with tempfile.TemporaryDirectory() as tmpdir:
+    args = case.setup(n, tmpdir)
+    times = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      result = case.run(*args)
+      times += [time.perf_counter() - start]
+
+    tracemalloc.start()
+    try:
+      case.run(*args)
+      _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+  return dict(n=n, time_s=min(times), peak_bytes=peak_bytes, checksum=summarize(result))
+
+
+def run_cases(patterns, size, repeat): # -> map<str, dict>
+  results = {}
+  for case in CASES:
+    if patterns and not any(fnmatch.fnmatch(case.name, p) for p in patterns):
+      continue
+    try:
+      results[case.name] = run_case(case, size, repeat)
+      entry = results[case.name]
+      print(f"[bench] {case.name: <44} {entry['time_s'] * 1e3: >10.2f}ms {entry['peak_bytes'] / 2**20: >8.2f}MB")
+    except Exception:
+      results[case.name] = dict(error=traceback.format_exc())
+      print(f"[bench] {case.name: <44} failed\n{results[case.name]['error']}", end='')
+  return results
+
+
+# -> [(name : str, kind : 'time' | 'memory' | 'checksum', baseline, current)]
+def compare_results(baseline, current, time_threshold=0.25, memory_threshold=0.1, rtol=1e-6):
+  problems = []
+  for name, entry in current.items():
+    base = baseline.get(name)
+    if base is None or 'error' in base or 'error' in entry or base['n'] != entry['n']:
+      continue
+    if not checksum_equal(base['checksum'], entry['checksum'], rtol):
+      problems += [(name, 'checksum', base['checksum'], entry['checksum'])]
+    if entry['time_s'] > base['time_s'] * (1 + time_threshold):
+      problems += [(name, 'time', base['time_s'], entry['time_s'])]
+    if entry['peak_bytes'] > base['peak_bytes'] * (1 + memory_threshold):
+      problems += [(name, 'memory', base['peak_bytes'], entry['peak_bytes'])]
+  return problems
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark of misc/ numeric modules')
+  parser.add_argument('cases', type=str, nargs='*', help='case name patterns (e.g. "mesh.*", default: all)')
+  parser.add_argument('--size', type=str, default='small', choices=['small', 'medium', 'large'])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--out', type=str, default=None, help='write results as JSON')
+  parser.add_argument('--baseline', type=str, default=None, help='baseline JSON to compare with')
+  parser.add_argument('--save-baseline', action='store_true', default=False, help='overwrite baseline with results')
+  parser.add_argument('--time-threshold', type=float, default=0.25, help='relative slowdown regarded as regression')
+  parser.add_argument('--memory-threshold', type=float, default=0.1, help='relative peak memory increase regarded as regression')
+  parser.add_argument('--rtol', type=float, default=1e-6, help='relative tolerance of result checksum')
+  args = parser.parse_args()
+
+  np.random.seed(0) # in case module under test uses global random state
+  results = run_cases(args.cases, args.size, args.repeat)
+  current = dict(size=args.size, results=results)
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump(current, f, indent=2)
+
+  failed = [name for name, entry in results.items() if 'error' in entry]
+  problems = []
+  if args.baseline and args.save_baseline:
+    with open(args.baseline, 'w') as f:
+      json.dump(current, f, indent=2)
+    print(f"[bench] saved baseline {args.baseline}")
+  elif args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    problems = compare_results(
+        baseline['results'], results, args.time_threshold, args.memory_threshold, args.rtol)
+    for name, kind, base, cur in problems:
+      if kind == 'checksum':
+        print(f"[bench] result changed {name}\n  baseline {base}\n  current  {cur}")
+      else:
+        print(f"[bench] {kind} regression {name} {base:.4g} -> {cur:.4g} ({(cur / max(base, 1e-12) - 1) * 100:+.0f}%)")
+    print(f"[bench] {len(problems)} problems")
+
+  for name in failed:
+    print(f"[bench] failed : {name}")
+  sys.exit(1 if problems or failed else 0)
+
+
+if __name__ == '__main__':
+  main()
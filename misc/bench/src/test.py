@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from . import main
+
+
+class TestBench(unittest.TestCase):
+  def test_summarize00(self):
+    result = (np.float32([[1, -2], [3, 4]]), dict(b=np.uint8([1, 2]), a=3), [np.zeros(0)])
+    summary = main.summarize(result)
+    self.assertEqual(summary[0], [[2, 2], 'float32', 6.0, 10.0])
+    self.assertEqual(summary[1], [['a', [[], 'int64', 3.0, 3.0]], ['b', [[2], 'uint8', 3.0, 3.0]]])
+    self.assertEqual(summary[2], [[[0], 'float64', 0.0, 0.0]])
+
+  def test_compare00(self):
+    entry = dict(n=8, time_s=1.0, peak_bytes=1000, checksum=[[2], 'float32', 1.0, 1.0])
+    baseline = dict(a=entry, b=entry, c=entry, d=dict(error='...'))
+    current = dict(
+      a=dict(entry, time_s=1.1, peak_bytes=1050, checksum=[[2], 'float32', 1.0 + 1e-9, 1.0]),
+      b=dict(entry, time_s=2.0, peak_bytes=2000, checksum=[[2], 'float32', 1.5, 1.5]),
+      c=dict(entry, n=16, time_s=2.0),
+      d=entry,
+    )
+    problems = main.compare_results(baseline, current)
+    self.assertEqual([(name, kind) for name, kind, _, _ in problems], [('b', 'checksum'), ('b', 'time'), ('b', 'memory')])
+
+  def test_run_case00(self):
+    case = main.CASES[0]._replace(
+        sizes=dict(small=4), setup=lambda n, tmpdir: (n,), run=lambda n: np.ones(n))
+    entry = main.run_case(case, 'small', 2)
+    self.assertEqual(entry['n'], 4)
+    self.assertEqual(entry['checksum'], [[4], 'float64', 4.0, 4.0])
+    self.assertGreater(entry['peak_bytes'], 0)
@@ -0,0 +1,53 @@
+//
+// Progressive supersampling of aliased checker plane (renderer owned accumulation)
+//
+// Usage:
+//   python -m src.app shaders/ex87_accumulate_checker_plane.glsl --offscreen test.png
+//
+
+/*
+%%config-start%%
+plugins: []
+samplers: []
+programs:
+  - name: mainImage
+    output: $default
+    samplers: []
+
+accumulate:
+  max_samples: 4096
+  target_noise: 0.002
+  time_budget: 30
+  check_interval: 16
+
+# "num_frames" is omitted so that offscreen rendering accumulates until convergence
+offscreen_option:
+  fps: 60
+%%config-end%%
+*/
+
+#include "utils/hash_v0.glsl"
+
+float checker(vec2 uv) {
+  return float(mod(floor(uv.x) + floor(uv.y), 2.0) == 1.0);
+}
+
+vec3 COLOR1 = vec3(1.0) * 0.30;
+vec3 COLOR2 = vec3(0.0, 1.0, 1.0);
+vec3 COLOR_SKY = vec3(0.8, 0.9, 1.0);
+
+void mainImage(out vec4 frag_color, vec2 frag_coord) {
+  // Jitter within pixel by sample index
+  vec2 jitter = uintToUnitFloat(hash32u(uvec3(frag_coord, iSample)));
+  vec2 p = (frag_coord - 0.5 + jitter - 0.5 * iResolution.xy) / iResolution.y;
+
+  // Intersect camera ray with plane y = -1
+  vec3 ray = normalize(vec3(p, -1.0));
+  if (ray.y >= 0.0) {
+    frag_color = vec4(COLOR_SKY, 1.0);
+    return;
+  }
+  vec3 q = ray * (-1.0 / ray.y);
+  vec3 color = mix(COLOR1, COLOR2, checker(q.xz * 2.0));
+  frag_color = vec4(color, 1.0);
+}
@@ -0,0 +1,132 @@
+//
+// Bloom by blurring bright part at half and quarter resolution
+// (sampler "scale"/"size" relative to window, each pass gets iResolution of its output)
+//
+// Usage:
+//   python -m src.app shaders/ex88_bloom_multi_resolution.glsl
+//
+
+/*
+%%config-start%%
+samplers:
+  - name: buf_scene
+    type: framebuffer
+    size: $default
+    mipmap: false
+    wrap: clamp
+    filter: linear
+    internal_format: GL_RGBA16F
+    double_buffering: false
+
+  - name: buf_bright
+    type: framebuffer
+    scale: 0.5
+    mipmap: false
+    wrap: clamp
+    filter: linear
+    internal_format: GL_R11F_G11F_B10F
+    double_buffering: false
+
+  - name: buf_blur_h
+    type: framebuffer
+    size: "W // 4, H // 4"
+    mipmap: false
+    wrap: clamp
+    filter: linear
+    internal_format: GL_R11F_G11F_B10F
+    double_buffering: false
+
+  - name: buf_blur_v
+    type: framebuffer
+    size: "W // 4, H // 4"
+    mipmap: false
+    wrap: clamp
+    filter: linear
+    internal_format: GL_R11F_G11F_B10F
+    double_buffering: false
+
+programs:
+  - name: mainImageScene
+    output: buf_scene
+    samplers: []
+
+  - name: mainImageBright
+    output: buf_bright
+    samplers:
+      - buf_scene
+
+  - name: mainImageBlurH
+    output: buf_blur_h
+    samplers:
+      - buf_bright
+
+  - name: mainImageBlurV
+    output: buf_blur_v
+    samplers:
+      - buf_blur_h
+
+  - name: mainImage
+    output: $default
+    samplers:
+      - buf_scene
+      - buf_blur_v
+
+offscreen_option:
+  fps: 60
+  num_frames: 1
+%%config-end%%
+*/
+
+const float BLOOM_THRESHOLD = 1.0;
+const float BLOOM_INTENSITY = 0.6;
+
+// 9-tap gaussian with bilinear filtering (cf. "Efficient Gaussian blur with linear sampling")
+const float BLUR_OFFSETS[3] = float[](0.0, 1.3846153846, 3.2307692308);
+const float BLUR_WEIGHTS[3] = float[](0.2270270270, 0.3162162162, 0.0702702703);
+
+vec3 blur(sampler2D buf, vec2 frag_coord, vec2 direction) {
+  vec2 uv = frag_coord / iResolution.xy;
+  vec2 duv = direction / iResolution.xy;
+  vec3 result = texture(buf, uv).rgb * BLUR_WEIGHTS[0];
+  for (int i = 1; i < 3; i++) {
+    result += texture(buf, uv + BLUR_OFFSETS[i] * duv).rgb * BLUR_WEIGHTS[i];
+    result += texture(buf, uv - BLUR_OFFSETS[i] * duv).rgb * BLUR_WEIGHTS[i];
+  }
+  return result;
+}
+
+// HDR scene (a few lights brighter than 1)
+void mainImageScene(out vec4 frag_color, vec2 frag_coord) {
+  vec2 p = (frag_coord - 0.5 * iResolution.xy) / iResolution.y;
+  vec3 color = vec3(0.05, 0.06, 0.08) * (1.0 - 0.5 * length(p));
+  for (int i = 0; i < 5; i++) {
+    float t = iTime * 0.5 + float(i) * 1.2566;
+    vec2 center = 0.3 * vec2(cos(t), sin(2.0 * t));
+    vec3 light_color = 0.5 + 0.5 * cos(vec3(0.0, 2.0, 4.0) + float(i));
+    color += light_color * 4.0 * smoothstep(0.03, 0.02, length(p - center));
+  }
+  frag_color = vec4(color, 1.0);
+}
+
+// Bright part at half resolution
+void mainImageBright(out vec4 frag_color, vec2 frag_coord, sampler2D buf_scene) {
+  vec3 color = texture(buf_scene, frag_coord / iResolution.xy).rgb;
+  frag_color = vec4(max(color - BLOOM_THRESHOLD, 0.0), 1.0);
+}
+
+// Separable blur at quarter resolution
+void mainImageBlurH(out vec4 frag_color, vec2 frag_coord, sampler2D buf_bright) {
+  frag_color = vec4(blur(buf_bright, frag_coord, vec2(1.0, 0.0)), 1.0);
+}
+
+void mainImageBlurV(out vec4 frag_color, vec2 frag_coord, sampler2D buf_blur_h) {
+  frag_color = vec4(blur(buf_blur_h, frag_coord, vec2(0.0, 1.0)), 1.0);
+}
+
+void mainImage(out vec4 frag_color, vec2 frag_coord, sampler2D buf_scene, sampler2D buf_blur_v) {
+  vec2 uv = frag_coord / iResolution.xy;
+  vec3 color = texture(buf_scene, uv).rgb + BLOOM_INTENSITY * texture(buf_blur_v, uv).rgb;
+  color = color / (1.0 + color); // Reinhard
+  color = pow(color, vec3(1.0 / 2.2));
+  frag_color = vec4(color, 1.0);
+}
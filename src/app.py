@@ -1,16 +1,25 @@
 from PySide2 import QtCore, QtGui, QtWidgets, QtUiTools
 import OpenGL.GL as gl
 import pydash
-import os, array, ctypes, time, collections
+import os, array, ctypes, time, collections, copy, math
+import numpy as np
 from .utils import \
     exit_app_on_exception, setup_interrupt_handler, setup_qt_message_handler, \
     preprocess_include, PreprocessIncludeWatcher, parse_shader_config, \
-    handle_OpenGL_debug_message, preprocess_source
+    handle_OpenGL_debug_message, preprocess_source, file_stamps, get_exec_file_stamps
 from .plugins import \
-    PluginConfigureArg, \
+    Plugin, PluginConfigureArg, \
     SsboPlugin, RasterPlugin, SsboscriptPlugin, \
     RasterscriptPlugin, TexturePlugin, UniformPlugin, CubemapPlugin, UniformlistPlugin
 from .compute_program import ComputeProgram, COMPUTE_SHADER_TEMPLATE
+from .program_cache import build_program
+from .readback import FrameWriter, PboReadback
+from .frame_sink import StillImageSink, ImageSequenceSink, TiledImageSink, make_video_sink
+from .utils_gl import FrameFences, get_active_uniforms
+from .render_graph import schedule_ops, analyze_liveness, plan_framebuffers, find_feedback
+from .profiler import GpuProfiler, GpuFrameTimer
+from .dynamic_resolution import ResolutionScaler
+from . import trace
 from .common import ShaderError
 
 
@@ -43,6 +52,8 @@ VERTEX_SPEC = {
 class Renderer():
   def __init__(self):
     self.program = None
+    self.uniform_locations = {} # map<str, int>
+    self.active_uniforms = set() # set<str> (cf. get_active_uniforms)
     self.vao = None
     self.vertex_buffer = None
     self.index_buffer = None
@@ -64,20 +75,22 @@ class Renderer():
     self.index_buffer.allocate(INDEX_DATA, INDEX_DATA.itemsize * len(INDEX_DATA))
     self.index_buffer.release()
 
-  def load_fragment_shader(self, complete_src):
-    self.program.removeAllShaders()
-    vs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Vertex, VERTEX_SHADER_SOURCE)
-    if not vs_success:
-      raise ShaderError(f"Vertex: \n{self.program.log()}")
-
-    fs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Fragment, complete_src)
-    if not fs_success:
-      raise ShaderError(f"Fragment: \n{self.program.log()}")
-
-    if not self.program.link():
-      raise ShaderError(f"Link: \n{self.program.log()}")
-
+  # program : QOpenGLShaderProgram | None (already linked e.g. on other thread cf. ShaderBuilder)
+  def load_fragment_shader(self, complete_src, program=None):
+    if program is None:
+      build_program(self.program, get_program_stages(dict(), complete_src))
+    else:
+      self.program = program
     self.setup_vertex_spec()
+    self.uniform_locations = {}
+    self.active_uniforms = get_active_uniforms(self.program.programId())
+
+  # Cached QOpenGLShaderProgram.uniformLocation
+  def uniform_location(self, name):
+    location = self.uniform_locations.get(name)
+    if location is None:
+      location = self.uniform_locations[name] = self.program.uniformLocation(name)
+    return location
 
   def setup_vertex_spec(self):
     self.vao.bind()
@@ -95,9 +108,11 @@ class Renderer():
   def draw(
       self, texture_ids, W, H, frame, time, mouse_down,
       mouse_press_pos, mouse_release_pos, mouse_move_pos,
-      key, key_modifiers, plugins):
+      key, key_modifiers, plugins, tile=None):
     # State setup
-    gl.glViewport(0, 0, W, H)
+    # (tile : (x, y, w, h) renders only the region of W x H image into viewport origin)
+    tile_x, tile_y, tile_w, tile_h = tile or (0, 0, W, H)
+    gl.glViewport(0, 0, tile_w, tile_h)
 
     self.program.bind()
     self.vao.bind()
@@ -108,15 +123,16 @@ class Renderer():
       plugin.on_bind_program(self.program.programId())
 
     # Uniform setup
-    gl.glUniform1f(self.program.uniformLocation('iTime'), time)
-    gl.glUniform1i(self.program.uniformLocation('iFrame'), frame)
-    gl.glUniform3f(self.program.uniformLocation('iResolution'), W, H, W / H)
-    gl.glUniform1ui(self.program.uniformLocation('iKey'), key)
-    gl.glUniform1ui(self.program.uniformLocation('iKeyModifiers'), key_modifiers)
+    gl.glUniform1f(self.uniform_location('iTime'), time)
+    gl.glUniform1i(self.uniform_location('iFrame'), frame)
+    gl.glUniform3f(self.uniform_location('iResolution'), W, H, W / H)
+    gl.glUniform2f(self.uniform_location('iTileOffset'), tile_x, tile_y)
+    gl.glUniform1ui(self.uniform_location('iKey'), key)
+    gl.glUniform1ui(self.uniform_location('iKeyModifiers'), key_modifiers)
 
     for i, texture_id in enumerate(texture_ids):
-      gl.glUniform1i(self.program.uniformLocation(f"iSampler{i}"), i)
-      gl.glActiveTexture(getattr(gl, f"GL_TEXTURE{i}"))
+      gl.glUniform1i(self.uniform_location(f"iSampler{i}"), i)
+      gl.glActiveTexture(gl.GL_TEXTURE0 + i)
       gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
 
     mz, mw = mouse_press_pos or (0, H - 1)
@@ -127,7 +143,7 @@ class Renderer():
       mx, my = mouse_release_pos or (0, H - 1)
       my, mw = [ H - 1 - t for t in [my, mw] ]
       mz, mw = [ -t for t in [mz, mw] ]
-    gl.glUniform4f(self.program.uniformLocation('iMouse'), mx, my, mz, mw)
+    gl.glUniform4f(self.uniform_location('iMouse'), mx, my, mz, mw)
 
     # Draw call
     gl.glDrawElements(gl.GL_TRIANGLES, len(INDEX_DATA), gl.GL_UNSIGNED_SHORT, ctypes.c_void_p(0))
@@ -138,6 +154,10 @@ class Renderer():
     self.program.release()
 
 
+# Uniforms whose use makes frame change over time or by user input (cf. MultiPassRenderer.is_static)
+TIME_UNIFORMS = {'iTime', 'iFrame', 'iSample'}
+INPUT_UNIFORMS = {'iMouse', 'iKey', 'iKeyModifiers'}
+
 DEFAULT_CONFIG = {
   'plugins': [],
   'samplers': [],
@@ -150,6 +170,8 @@ FRAGMENT_SHADER_TEMPLATE = """
 uniform float iTime;
 uniform int iFrame;
 uniform vec3 iResolution;
+uniform vec2 iTileOffset;
+uniform int iSample;
 uniform vec4 iMouse;
 uniform uint iKey;
 uniform uint iKeyModifiers;
@@ -157,37 +179,286 @@ layout (location = 0) out vec4 iMainFragColor;
 {sampler_uniform_decls}
 void {name}(out vec4, vec2 {sampler_arg_decls});
 void main() {{
-  {name}(iMainFragColor, vec2(gl_FragCoord) {sampler_args});
+  {name}(iMainFragColor, vec2(gl_FragCoord) + iTileOffset {sampler_args});
 }}
 #define COMPILE_{name}
 {src}
 """
 
+# program : dict, src : str (after preprocess_source) -> str
+def get_complete_src(program, src):
+  N = len(program['samplers'])
+  sampler_uniform_decls = ''.join(f"uniform sampler2D iSampler{i};\n" for i in range(N))
+  sampler_arg_decls     = ''.join(f", sampler2D" for i in range(N))
+  sampler_args          = ''.join(f", iSampler{i}" for i in range(N))
+
+  if program.get('type') == 'compute':
+    complete_src_attrs = dict(
+      src=src, name=program['name'],
+      sampler_uniform_decls = sampler_uniform_decls,
+      sampler_arg_decls     = sampler_arg_decls[2:],
+      sampler_args          = sampler_args[2:],
+      local_size            = program['local_size'])
+    return COMPUTE_SHADER_TEMPLATE.format(**complete_src_attrs)
+
+  complete_src_attrs = dict(
+    src=src, name=program['name'],
+    sampler_uniform_decls = sampler_uniform_decls,
+    sampler_arg_decls     = sampler_arg_decls,
+    sampler_args          = sampler_args)
+  return FRAGMENT_SHADER_TEMPLATE.format(**complete_src_attrs)
+
+
+def get_program_stages(program, complete_src): # -> [(QOpenGLShader.ShaderTypeBit, str)]
+  if program.get('type') == 'compute':
+    return [(QtGui.QOpenGLShader.Compute, complete_src)]
+  return [(QtGui.QOpenGLShader.Vertex, VERTEX_SHADER_SOURCE), (QtGui.QOpenGLShader.Fragment, complete_src)]
+
+
+PreparedShader = collections.namedtuple('PreparedShader', [
+  'src',      # str (after preprocess_source)
+  'config',   # dict
+  'programs', # map<str, QOpenGLShaderProgram> (linked program per complete source)
+])
+
+# Work of MultiPassRenderer.configure which doesn't touch per-context GL objects, so that it can run
+# on other thread with shared context (cf. ShaderBuilder)
+# src : str (after preprocess_include)
+# build : bool (compile and link programs whose complete source isn't in `loaded_sources`)
+@trace.traced()
+def prepare_shader(src, build=True, loaded_sources=frozenset()): # -> PreparedShader
+  src = preprocess_source(src)
+  config = parse_shader_config(src)
+  if config is None:
+    print(f"[MultiPassRenderer] Configuration not found. Use default configuration.")
+    config = DEFAULT_CONFIG
+  programs = {}
+  if build:
+    analyze_liveness(config) # fail early on invalid configuration
+    for program in config['programs']:
+      complete_src = get_complete_src(program, src)
+      if complete_src in loaded_sources or complete_src in programs:
+        continue
+      qprogram = QtGui.QOpenGLShaderProgram()
+      build_program(qprogram, get_program_stages(program, complete_src))
+      programs[complete_src] = qprogram
+  return PreparedShader(src, config, programs)
+
+
+# Framebuffer size evaluated against W x H (on every resize)
+# - size : "$default" | [w, h] | str (python expression of W and H e.g. "W // 4, H // 4")
+# - scale : float (multiplies size e.g. 0.5 for half of window)
+def get_sampler_size(sampler, W, H): # -> (int, int)
+  size = sampler.get('size', '$default')
+  if size == '$default':
+    w, h = W, H
+  elif type(size) == str:
+    w, h = eval(size, {'__builtins__': {}}, {'W': W, 'H': H}) # arithmetic of W, H only
+  else:
+    w, h = size
+  scale = sampler.get('scale', 1)
+  return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+# Mouse position from W x H to w x h pixels
+def scale_position(pos, w, h, W, H): # (int, int) | None -> (float, float) | None
+  return pos and (pos[0] * w / W, pos[1] * h / H)
+
+
 MyImage = collections.namedtuple('MyImage', [
   'qimage', # QtGui.QImage
   'handle'  # GLuint (OpenGL texture handle)
 ])
 
+# Step of MultiPassRenderer.plan
+DrawStep = collections.namedtuple('DrawStep', [
+  'renderer', # Renderer | ComputeProgram
+  'compute',  # bool
+  'textures', # [(GLuint | None, fbo pair | None, mipmap : bool)] (fixed texture handle or fbo pair whose front is sampled)
+  'output',   # fbo pair | None (None for default framebuffer or compute program)
+  'name',     # str (program name)
+  'size',     # (int, int) | None (size of output framebuffer i.e. viewport and iResolution)
+])
+
+SwapStep = collections.namedtuple('SwapStep', [
+  'fbo_pair', # [QOpenGLFramebufferObject, QOpenGLFramebufferObject]
+])
+
+ACCUMULATE_SHADER_SOURCE = """
+#version 430 core
+uniform sampler2D iSampler0;
+layout (location = 0) out vec4 Fragment_sum;
+layout (location = 1) out vec4 Fragment_sum_sq;
+void main() {
+  vec4 color = texelFetch(iSampler0, ivec2(gl_FragCoord), 0);
+  Fragment_sum = color;
+  Fragment_sum_sq = color * color;
+}
+"""
+
+RESOLVE_SHADER_SOURCE = """
+#version 430 core
+uniform int iFrame;
+uniform sampler2D iSampler0;
+layout (location = 0) out vec4 Fragment_color;
+void main() {
+  Fragment_color = texelFetch(iSampler0, ivec2(gl_FragCoord), 0) / float(iFrame);
+}
+"""
+
+# Per-pixel standard error of mean color
+NOISE_SHADER_SOURCE = """
+#version 430 core
+uniform int iFrame;
+uniform sampler2D iSampler0;
+uniform sampler2D iSampler1;
+layout (location = 0) out vec4 Fragment_noise;
+void main() {
+  float n = float(iFrame);
+  vec3 mean = texelFetch(iSampler0, ivec2(gl_FragCoord), 0).rgb / n;
+  vec3 mean_sq = texelFetch(iSampler1, ivec2(gl_FragCoord), 0).rgb / n;
+  vec3 variance = max(mean_sq - mean * mean, 0.0) * n / max(n - 1.0, 1.0);
+  Fragment_noise = vec4(sqrt(variance / n), 1.0);
+}
+"""
+
+# Running mean of what programs draw to $default (cf. "accumulate" in configuration)
+# - "iSample" uniform is index of sample being rendered
+# - stop at "max_samples", after "time_budget" seconds or when noise estimated on GPU
+#   (standard error of mean color averaged over pixels) reaches "target_noise"
+class Accumulator(Plugin):
+  def __init__(self, option):
+    self.max_samples = option.get('max_samples', 1024)
+    self.target_noise = option.get('target_noise', 0)
+    self.time_budget = option.get('time_budget')
+    self.check_interval = option.get('check_interval', 16)
+    self.sample_fbo = None # QOpenGLFramebufferObject (RGBA32F target of programs instead of $default)
+    self.sum_fbo = None    # QOpenGLFramebufferObject (RGBA32F sum and sum of squares)
+    self.noise_fbo = None  # QOpenGLFramebufferObject (RGBA32F with mipmap for reduction)
+    self.renderers = {}    # map<str, Renderer>
+    self.reset()
+
+  def reset(self):
+    self.num_samples = 0
+    self.noise = None      # float | None
+    self.start_time = None # float | None
+
+  def init_resource(self, W, H):
+    fbo_format = QtGui.QOpenGLFramebufferObjectFormat()
+    fbo_format.setInternalTextureFormat(gl.GL_RGBA32F)
+    self.sum_fbo = QtGui.QOpenGLFramebufferObject(W, H, fbo_format)
+    self.sum_fbo.addColorAttachment(W, H, gl.GL_RGBA32F)
+    fbo_format.setAttachment(QtGui.QOpenGLFramebufferObject.Depth)
+    self.sample_fbo = QtGui.QOpenGLFramebufferObject(W, H, fbo_format)
+    fbo_format.setAttachment(QtGui.QOpenGLFramebufferObject.NoAttachment)
+    fbo_format.setMipmap(True)
+    self.noise_fbo = QtGui.QOpenGLFramebufferObject(W, H, fbo_format)
+    sources = dict(accumulate=ACCUMULATE_SHADER_SOURCE, resolve=RESOLVE_SHADER_SOURCE, noise=NOISE_SHADER_SOURCE)
+    for name, src in sources.items():
+      renderer = self.renderers[name] = Renderer()
+      renderer.init_resource()
+      renderer.load_fragment_shader(src)
+
+  def cleanup(self):
+    for renderer in self.renderers.values():
+      renderer.cleanup()
+    self.renderers = {}
+    self.sample_fbo = self.sum_fbo = self.noise_fbo = None # Default destructor frees gl resource
+
+  # override
+  def on_bind_program(self, program_handle):
+    gl.glUniform1i(gl.glGetUniformLocation(program_handle, 'iSample'), self.num_samples)
+
+  def elapsed(self): # -> float (seconds since first sample)
+    return 0 if self.start_time is None else time.time() - self.start_time
+
+  def is_done(self): # -> bool
+    if self.num_samples >= self.max_samples:
+      return True
+    if self.time_budget is not None and self.elapsed() >= self.time_budget:
+      return True
+    return self.noise is not None and self.noise <= self.target_noise
+
+  def draw_quad(self, name, texture_ids, W, H):
+    self.renderers[name].draw(
+        texture_ids, W, H, self.num_samples, 0, mouse_down=False,
+        mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+        key=0, key_modifiers=0, plugins=[])
+
+  # Add sample_fbo into running sum then present mean to default_framebuffer
+  def accumulate(self, default_framebuffer, W, H):
+    self.sum_fbo.bind()
+    gl.glDrawBuffers(2, [gl.GL_COLOR_ATTACHMENT0, gl.GL_COLOR_ATTACHMENT1])
+    if self.num_samples == 0:
+      self.start_time = time.time()
+      gl.glClearBufferfv(gl.GL_COLOR, 0, bytes(array.array('f', [0, 0, 0, 0])))
+      gl.glClearBufferfv(gl.GL_COLOR, 1, bytes(array.array('f', [0, 0, 0, 0])))
+    self.num_samples += 1
+    gl.glEnable(gl.GL_BLEND)
+    gl.glBlendFunc(gl.GL_ONE, gl.GL_ONE)
+    self.draw_quad('accumulate', [self.sample_fbo.texture()], W, H)
+    gl.glDisable(gl.GL_BLEND)
+
+    if self.target_noise > 0 and self.num_samples % self.check_interval == 0:
+      self.noise = self.estimate_noise(W, H)
+    self.present(default_framebuffer, W, H)
+
+  def present(self, default_framebuffer, W, H):
+    gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, default_framebuffer)
+    if self.num_samples > 0:
+      self.draw_quad('resolve', [self.sum_fbo.textures()[0]], W, H)
+
+  # Average of per-pixel noise by reducing with mipmap chain (so that only 1x1 level is read back)
+  def estimate_noise(self, W, H): # -> float
+    self.noise_fbo.bind()
+    self.draw_quad('noise', self.sum_fbo.textures(), W, H)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, self.noise_fbo.texture())
+    gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+    level = int(math.log2(max(W, H)))
+    data = gl.glGetTexImage(gl.GL_TEXTURE_2D, level, gl.GL_RGBA, gl.GL_FLOAT)
+    gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+    return float(np.mean(np.asarray(data, np.float32).reshape((-1, 4))[:, :3]))
+
+
 class MultiPassRenderer():
   def __init__(self, offscreen):
     self.config = None     # dict (cf. parse_shader_config)
-    self.renderers = {}    # map<str, Renderer>
+    self.renderers = {}    # map<str, Renderer | ComputeProgram>
     self.framebuffers = {} # map<str, (QOpenGLFramebufferObject, QOpenGLFramebufferObject)>
     self.images = {}       # map<str, MyImage>
     self.plugins = []      # list<Plugin>
+    self.plan = None       # list<DrawStep | SwapStep> (cf. compile_plan)
+    self.live_programs = set() # set<str> (cf. analyze_liveness)
+    self.feedback_samplers = set() # set<str> (cf. find_feedback)
+    self.framebuffer_sizes = {}  # map<str, (int, int)> (cf. get_sampler_size)
+    self.framebuffer_stats = None # dict (cf. plan_framebuffers)
+    self.mipmap_clean = set()  # set<GLuint> (framebuffer textures whose mipmap is up-to-date)
+    self.accumulator = None    # Accumulator | None
+    self.profiler = None       # GpuProfiler | None
     self.offscreen = offscreen # bool
 
+    # Configuration each resource was created from (for incremental reconfigure)
+    self.renderer_keys = {} # map<str, tuple>
+    self.sampler_keys = {}  # map<str, tuple>
+    self.plugin_keys = []   # list<tuple> (parallel to self.plugins)
+    self.plugin_src = None  # str
+
   def cleanup(self):
+    if self.profiler is not None:
+      self.profiler.cleanup()
+    self.cleanup_accumulator()
     self.cleanup_plugins()
     self.cleanup_renderers()
     self.cleanup_images()
     self.cleanup_framebuffers()
     self.config = None
+    self.plan = None
 
   def cleanup_renderers(self):
     for renderer in self.renderers.values():
       renderer.cleanup()
     self.renderers = {}
+    self.renderer_keys = {}
 
   def cleanup_images(self):
     for image in self.images.values():
@@ -197,56 +468,150 @@ class MultiPassRenderer():
   def cleanup_framebuffers(self):
     self.framebuffers = {} # Default destructor frees gl resource
 
+  def cleanup_accumulator(self):
+    if self.accumulator is not None:
+      self.accumulator.cleanup()
+    self.accumulator = None
+
   def cleanup_plugins(self):
     for plugin in self.plugins:
       plugin.cleanup()
     self.plugins = []
-
-  def configure(self, src, W, H):
-    src = preprocess_source(src)
-    self.config = parse_shader_config(src)
-    if self.config is None:
-      print(f"[MultiPassRenderer] Configuration not found. Use default configuration.")
-      self.config = DEFAULT_CONFIG
+    self.plugin_keys = []
+    self.plugin_src = None
+
+  # incremental : bool (reuse plugins, samplers and programs whose configuration didn't change)
+  # prepared : PreparedShader | None (`src` is ignored since it's already processed cf. prepare_shader)
+  @trace.traced()
+  def configure(self, src, W, H, incremental=False, prepared=None):
+    if prepared is None:
+      prepared = prepare_shader(src, build=False)
+    src, self.config, programs = prepared
     print(f"[MultiPassRenderer] Current configuration\n{self.config}")
-    self.configure_plugins(self.config.get('plugins', []), src, W, H)
-    self.configure_samplers(W, H)
-    self.configure_programs(src)
-
-  # TODO: remove unnecessary re-configure when reloading .glsl
-  def configure_plugins(self, plugins_config, src, W, H):
-    self.cleanup_plugins()
-    for plugin_config in plugins_config:
-      name = plugin_config['type']
-      params = plugin_config['params']
-      klass_name = name.capitalize() + 'Plugin'
-      plugin = globals()[klass_name]()
-      plugin.configure(PluginConfigureArg(params, src, W, H, self.offscreen))
-      self.plugins += [plugin]
-
-  def configure_samplers(self, W, H):
-    self.cleanup_framebuffers()
-    self.cleanup_images()
-
-    for sampler in self.config['samplers']:
-      name = sampler['name']
-      assert sampler['type'] in ['file', 'framebuffer']
-      if sampler['type'] == 'file':
-        assert sampler['file']
-        image = self.create_image(sampler['file'])
-        self.configure_gl_texture(image.handle, sampler)
-        self.images[name] = image
-
-      if sampler['type'] == 'framebuffer':
-        w, h = (W, H) if sampler['size'] == '$default' else sampler['size']
-        fbo_pair = self.create_fbo_pair(
-            w, h, sampler['mipmap'],
-            sampler.get('internal_format', 'GL_RGBA8'),
-            sampler.get('double_buffering', True))
-        for fbo in fbo_pair:
-          self.configure_gl_texture(fbo.texture(), sampler)
-        self.framebuffers[name] = fbo_pair
-
+    self.live_programs = analyze_liveness(self.config)
+    culled = [program['name'] for program in self.config['programs'] if program['name'] not in self.live_programs]
+    if len(culled) > 0:
+      print(f"[MultiPassRenderer] Culled programs not reaching screen ( {', '.join(culled)} )")
+    self.configure_plugins(self.config.get('plugins', []), src, W, H, incremental)
+    self.configure_samplers(W, H, incremental)
+    # Reported only here since configure_samplers also runs on every resize/render scale change
+    stats = self.framebuffer_stats
+    if stats['planned_bytes'] < stats['naive_bytes']:
+      print(f"[MultiPassRenderer] Framebuffer memory {stats['planned_bytes'] / 2**20:.1f}MB "
+            f"(saved {(stats['naive_bytes'] - stats['planned_bytes']) / 2**20:.1f}MB)")
+    self.configure_accumulator(W, H)
+    self.configure_programs(src, incremental, programs)
+    if self.is_static():
+      print(f"[MultiPassRenderer] Configuration is static (frame doesn't change over time)")
+
+  # Accumulation restarts whenever configuration or size changes
+  def configure_accumulator(self, W, H):
+    self.cleanup_accumulator()
+    option = self.config.get('accumulate')
+    if option is not None:
+      self.accumulator = Accumulator(option)
+      self.accumulator.init_resource(W, H)
+
+  def configure_plugins(self, plugins_config, src, W, H, incremental=False):
+    if not incremental:
+      self.cleanup_plugins()
+    unused = list(zip(self.plugin_keys, self.plugins))
+    plugins, plugin_keys = [], []
+    try:
+      for plugin_config in plugins_config:
+        name = plugin_config['type']
+        params = plugin_config['params']
+        klass_name = name.capitalize() + 'Plugin'
+        klass = globals()[klass_name]
+        # Reuse plugin unless its configuration, resolution (when it depends on it),
+        # referenced files or python modules imported by its snippets changed (e.g. RELOAD_REC of misc/mesh)
+        key = (
+          name, copy.deepcopy(params), (W, H) if klass.depends_on_size(params) else None,
+          file_stamps(params), get_exec_file_stamps(params))
+        found = pydash.find_index(unused, lambda entry: entry[0] == key)
+        if found >= 0:
+          _, plugin = unused.pop(found)
+          plugins += [plugin]
+          plugin_keys += [key]
+          if src != self.plugin_src:
+            plugin.configure_src(src)
+          continue
+        plugin = klass()
+        with trace.span(f"{klass_name}.configure"):
+          plugin.configure(PluginConfigureArg(params, src, W, H, self.offscreen))
+        plugins += [plugin]
+        plugin_keys += [key]
+      self.plugin_src = src
+    finally:
+      for _, plugin in unused:
+        plugin.cleanup()
+      self.plugins, self.plugin_keys = plugins, plugin_keys
+
+  # NOTE: Called on resize too, so file samplers are kept unless their configuration changed
+  @trace.traced()
+  def configure_samplers(self, W, H, incremental=True):
+    if not incremental:
+      self.cleanup_framebuffers()
+      self.cleanup_images()
+      self.sampler_keys = {}
+
+    # Decide double buffering and texture aliasing of framebuffers (cf. plan_framebuffers)
+    sizes = {
+      sampler['name']: get_sampler_size(sampler, W, H)
+      for sampler in self.config['samplers'] if sampler['type'] == 'framebuffer'
+    }
+    layout, stats = plan_framebuffers(self.config, sizes)
+    self.feedback_samplers = find_feedback(
+        self.config, { name: double_buffering for name, (double_buffering, _) in layout.items() })
+    self.framebuffer_sizes = sizes
+    self.framebuffer_stats = stats
+
+    framebuffers, images, sampler_keys, aliases = {}, {}, {}, {}
+    try:
+      for sampler in self.config['samplers']:
+        name = sampler['name']
+        assert sampler['type'] in ['file', 'framebuffer']
+        if sampler['type'] == 'file':
+          assert sampler['file']
+          key = (copy.deepcopy(sampler), file_stamps(sampler))
+          if self.sampler_keys.get(name) == key and name in self.images:
+            images[name] = self.images.pop(name)
+          else:
+            image = self.create_image(sampler['file'])
+            self.configure_gl_texture(image.handle, sampler)
+            images[name] = image
+
+        if sampler['type'] == 'framebuffer':
+          w, h = sizes[name]
+          double_buffering, alias = layout[name]
+          if alias is not None:
+            aliases[name] = alias
+            continue
+          key = (copy.deepcopy(sampler), w, h, double_buffering)
+          if self.sampler_keys.get(name) == key and name in self.framebuffers:
+            framebuffers[name] = self.framebuffers.pop(name)
+          else:
+            fbo_pair = self.create_fbo_pair(
+                w, h, sampler['mipmap'],
+                sampler.get('internal_format', 'GL_RGBA8'),
+                double_buffering)
+            for fbo in fbo_pair:
+              self.configure_gl_texture(fbo.texture(), sampler)
+            framebuffers[name] = fbo_pair
+        sampler_keys[name] = key
+
+      # Aliased framebuffer shares single-buffered pair with other framebuffer
+      for name, alias in aliases.items():
+        framebuffers[name] = framebuffers[alias]
+        sampler_keys[name] = ('alias', alias)
+    finally:
+      self.cleanup_framebuffers()
+      self.cleanup_images()
+      self.framebuffers, self.images, self.sampler_keys = framebuffers, images, sampler_keys
+      self.plan = None
+      self.mipmap_clean = set()
+
+  @trace.traced()
   def create_image(self, filename):
     # TODO: Support .hdr texture (cf. stb_image)
 
@@ -297,105 +662,198 @@ class MultiPassRenderer():
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, min_filter)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, mag_filter)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_BASE_LEVEL, 0)
-    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, 10)
+    # "mipmap_max_level" limits mip chain generation to levels actually sampled
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, sampler_config.get('mipmap_max_level', 10))
     if sampler_config['mipmap'] and sampler_config['type'] == 'file':
       gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
     gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
 
-  def configure_programs(self, src):
-    # cleanup first
-    for renderer in self.renderers.values():
-      renderer.cleanup()
-    self.renderers = {}
+  @trace.traced()
+  # programs : map<str, QOpenGLShaderProgram> (already linked program per complete source cf. PreparedShader)
+  def configure_programs(self, src, incremental=False, programs={}):
+    if not incremental:
+      self.cleanup_renderers()
 
     # validate and setup programs
     # TODO: Refactor API for Renderer and ComputeProgram
+    renderers, renderer_keys = {}, {}
+    try:
+      for program in self.config['programs']:
+        for sampler_name in program['samplers']:
+          assert sampler_name in list(self.framebuffers.keys()) + list(self.images.keys())
+
+        if program.get('type') != 'compute':
+          assert program['output'] in (['$default'] + list(self.framebuffers.keys()))
+        complete_src = get_complete_src(program, src)
+
+        # Reuse program when neither its configuration nor its source changed
+        name = program['name']
+        key = (copy.deepcopy(program), complete_src)
+        renderer_keys[name] = key
+        if self.renderer_keys.get(name) == key and name in self.renderers:
+          renderers[name] = self.renderers.pop(name)
+          continue
+
+        if program.get('type') == 'compute':
+          # Setup ComputeProgram
+          renderers[name] = renderer = ComputeProgram(program)
+          renderer.init_resource()
+          renderer.load_compute_shader(complete_src, programs.get(complete_src))
+
+        else:
+          # Setup Renderer
+          renderers[name] = renderer = Renderer()
+          renderer.init_resource()
+          renderer.load_fragment_shader(complete_src, programs.get(complete_src))
+    finally:
+      self.cleanup_renderers()
+      self.renderers, self.renderer_keys = renderers, renderer_keys
+      self.plan = None
+
+  def loaded_sources(self): # -> frozenset<str> (complete sources of current programs cf. prepare_shader)
+    return frozenset(complete_src for _, complete_src in self.renderer_keys.values())
+
+  # Whether frame is determined by uniforms and framebuffers alone
+  # (plugins, substep, accumulation and compute programs may keep state elsewhere)
+  def is_self_contained(self): # -> bool
+    config = self.config
+    if config is None or config.get('plugins') or config.get('substep') or config.get('accumulate') is not None:
+      return False
+    return not any(program.get('type') == 'compute' for program in config['programs'])
+
+  # Whether W x H can change between frames without affecting result (cf. MyWidget.render_scale)
+  # i.e. nothing carries state across frames at the resolution it was rendered
+  def supports_render_scale(self): # -> bool
+    if not self.is_self_contained():
+      return False
+    keep = any(sampler.get('keep') for sampler in self.config['samplers'])
+    return len(self.feedback_samplers) == 0 and not keep
+
+  # Whether frame stays same over time (cf. MyWidget.paintGL) judging from uniforms programs actually use
+  def is_static(self): # -> bool
+    if not self.is_self_contained():
+      return False
     for program in self.config['programs']:
-      for sampler_name in program['samplers']:
-        assert sampler_name in list(self.framebuffers.keys()) + list(self.images.keys())
-
-      N = len(program['samplers'])
-      sampler_uniform_decls = ''.join(f"uniform sampler2D iSampler{i};\n" for i in range(N))
-      sampler_arg_decls     = ''.join(f", sampler2D" for i in range(N))
-      sampler_args          = ''.join(f", iSampler{i}" for i in range(N))
-
-      if program.get('type') == 'compute':
-        # Setup ComputeProgram
-        self.renderers[program['name']] = renderer = ComputeProgram(program)
-        renderer.init_resource()
-        complete_src_attrs = dict(
-          src=src, name=program['name'],
-          sampler_uniform_decls = sampler_uniform_decls,
-          sampler_arg_decls     = sampler_arg_decls[2:],
-          sampler_args          = sampler_args[2:],
-          local_size            = program['local_size'])
-        complete_src = COMPUTE_SHADER_TEMPLATE.format(**complete_src_attrs)
-        renderer.load_compute_shader(complete_src)
-
-      else:
-        # Setup Renderer
-        assert program['output'] in (['$default'] + list(self.framebuffers.keys()))
-        self.renderers[program['name']] = renderer = Renderer()
-        renderer.init_resource()
-        complete_src_attrs = dict(
-          src=src, name=program['name'],
-          sampler_uniform_decls = sampler_uniform_decls,
-          sampler_arg_decls     = sampler_arg_decls,
-          sampler_args          = sampler_args)
-        complete_src = FRAGMENT_SHADER_TEMPLATE.format(**complete_src_attrs)
-        renderer.load_fragment_shader(complete_src)
+      if program['name'] not in self.live_programs:
+        continue
+      uniforms = self.renderers[program['name']].active_uniforms
+      if len(uniforms & TIME_UNIFORMS) > 0:
+        return False
+      for i, sampler_name in enumerate(program['samplers']):
+        if f"iSampler{i}" in uniforms and sampler_name in self.feedback_samplers:
+          return False
+    return True
+
+  def uses_input(self): # -> bool
+    return any(len(self.renderers[name].active_uniforms & INPUT_UNIFORMS) > 0 for name in self.live_programs)
 
   def on_begin_draw(self):
     for plugin in self.plugins:
       plugin.on_begin_draw()
 
   def on_draw(self, *args):
-    for plugin in self.plugins:
+    profiler = self.profiler
+    for i, plugin in enumerate(self.plugins):
+      if profiler is not None:
+        profiler.begin(f"plugin{i}:{type(plugin).__name__}")
       plugin.on_draw(*args)
+      if profiler is not None:
+        profiler.end()
 
   def on_end_draw(self):
     for plugin in self.plugins:
       plugin.on_end_draw()
 
-  def draw_program_substep(
-      self, program, default_framebuffer, W, H, frame, time, mouse_down,
-      mouse_press_pos, mouse_release_pos, mouse_move_pos,
-      key, key_modifiers):
-    texture_ids = []
+  # Resolve config into flat list of steps so that `draw` doesn't need to look up config every frame
+  def compile_plan(self): # -> [DrawStep | SwapStep]
+    samplers = {}
+    for sampler in self.config['samplers']:
+      samplers.setdefault(sampler['name'], sampler)
+
+    # NOTE: Global substep schedule is unrolled `num_iter` times (cf. schedule_ops)
+    # TODO: provide someway for program to know substep (e.g. "iSubstepFrame")
+    plan = []
+    for op, arg in schedule_ops(self.config):
+      if op == 'program' and arg['name'] in self.live_programs:
+        plan += [self.compile_draw_step(arg, samplers)]
+      if op == 'swap':
+        plan += [SwapStep(self.framebuffers[arg])]
+    return plan
+
+  def compile_draw_step(self, program, samplers): # -> DrawStep
+    textures = []
     for sampler_name in program['samplers']:
-      sampler = pydash.find(self.config['samplers'], {'name': sampler_name})
-      if sampler['type'] == 'file':
-        handle = self.images[sampler_name].handle
+      if samplers[sampler_name]['type'] == 'file':
+        textures += [(self.images[sampler_name].handle, None, False)]
 
-      if sampler['type'] == 'framebuffer':
-        fbo_pair = self.framebuffers[sampler_name]
-        handle = fbo_pair[0].texture()
-        gl.glBindTexture(gl.GL_TEXTURE_2D, handle)
-        gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
-        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+      if samplers[sampler_name]['type'] == 'framebuffer':
+        textures += [(None, self.framebuffers[sampler_name], samplers[sampler_name]['mipmap'])]
+
+    compute = program.get('type') == 'compute'
+    output, size = None, None
+    if not compute and program['output'] != '$default':
+      output = self.framebuffers[program['output']]
+      size = self.framebuffer_sizes[program['output']]
+    return DrawStep(self.renderers[program['name']], compute, textures, output, program['name'], size)
 
+  def draw_step(
+      self, step, default_framebuffer, W, H, frame, time, mouse_down,
+      mouse_press_pos, mouse_release_pos, mouse_move_pos,
+      key, key_modifiers, plugins, tile=None):
+    texture_ids = []
+    for handle, fbo_pair, mipmap in step.textures:
+      if fbo_pair is not None:
+        handle = fbo_pair[0].texture()
+        # Regenerate mipmap only when texture is written after last generation
+        if mipmap and handle not in self.mipmap_clean:
+          gl.glBindTexture(gl.GL_TEXTURE_2D, handle)
+          gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+          gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+          self.mipmap_clean.add(handle)
       texture_ids.append(handle)
 
-    if not program.get('type') == 'compute':
-      if program['output'] == '$default':
+    if not step.compute:
+      if step.output is None:
         gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, default_framebuffer)
       else:
-        fbo_pair = self.framebuffers[program['output']]
-        fbo_pair[1].bind()
+        step.output[1].bind()
+        self.mipmap_clean.discard(step.output[1].texture())
+
+    # Pass rendering to framebuffer of other size sees its own viewport, iResolution and mouse position
+    if step.size is not None and step.size != (W, H):
+      w, h = step.size
+      mouse_press_pos, mouse_release_pos, mouse_move_pos = [
+          scale_position(pos, w, h, W, H) for pos in [mouse_press_pos, mouse_release_pos, mouse_move_pos]]
+      W, H = w, h
 
-    renderer = self.renderers[program['name']]
-    renderer.draw(
+    step.renderer.draw(
         texture_ids, W, H, frame, time, mouse_down,
         mouse_press_pos, mouse_release_pos, mouse_move_pos,
-        key, key_modifiers, self.plugins)
+        key, key_modifiers, plugins, **({} if step.compute else dict(tile=tile)))
 
   # default_framebuffer : GLuint (e.g. QOpenGLFramebufferObject.handle(), QOpenGLWidget.defaultFramebufferObject())
+  # tile : (x, y, w, h) | None (cf. render_offscreen_tiled)
   # TODO: Fold all arguments into dataclass
   # TODO: Better uniform handling
+  @trace.traced()
   def draw(
       self, default_framebuffer, W, H, frame, time, mouse_down,
       mouse_press_pos, mouse_release_pos, mouse_move_pos,
-      key, key_modifiers):
+      key, key_modifiers, tile=None):
+
+    # Programs draw into accumulator's sample buffer instead of default framebuffer
+    plugins = self.plugins
+    accumulator = self.accumulator
+    if accumulator is not None:
+      if accumulator.is_done():
+        accumulator.present(default_framebuffer, W, H)
+        return
+      plugins = self.plugins + [accumulator]
+      default_framebuffer, presented_framebuffer = accumulator.sample_fbo.handle(), default_framebuffer
+
+    profiler = self.profiler
+    if profiler is not None:
+      profiler.begin_frame()
 
     # Clear default framebuffer
     gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, default_framebuffer)
@@ -408,83 +866,134 @@ class MultiPassRenderer():
     self.on_draw(
         default_framebuffer, W, H, frame, time, mouse_down,
         mouse_press_pos, mouse_release_pos, mouse_move_pos,
-        key, key_modifiers, self.plugins)
-
-    # Global substep mode
-    global_substep = self.config.get('substep')
-    if global_substep:
-      self.draw_global_substep_mode(
-          global_substep, default_framebuffer, W, H, frame, time, mouse_down,
-          mouse_press_pos, mouse_release_pos, mouse_move_pos,
-          key, key_modifiers)
+        key, key_modifiers, plugins)
+
+    if self.plan is None:
+      self.plan = self.compile_plan()
+
+    for step in self.plan:
+      if type(step) is SwapStep:
+        pair = step.fbo_pair
+        pair[0], pair[1] = pair[1], pair[0]
+        continue
+      if profiler is not None:
+        profiler.begin(step.name)
+      with trace.span(step.name):
+        self.draw_step(
+            step, default_framebuffer, W, H, frame, time, mouse_down,
+            mouse_press_pos, mouse_release_pos, mouse_move_pos,
+            key, key_modifiers, plugins, tile)
+      if profiler is not None:
+        profiler.end()
+
+    if accumulator is not None:
+      if profiler is not None:
+        profiler.begin('$accumulate')
+      accumulator.accumulate(presented_framebuffer, W, H)
+      if profiler is not None:
+        profiler.end()
+
+    # Callback for plugins (NOTE: global substep mode doesn't call this)
+    if not self.config.get('substep'):
+      self.on_end_draw()
+
+    if profiler is not None:
+      profiler.end_frame()
+
+
+class ShaderBuildWorker(QtCore.QObject):
+  finished = QtCore.Signal(int, object) # (build id, PreparedShader | Exception)
+
+  def __init__(self, surface):
+    super(ShaderBuildWorker, self).__init__()
+    self.surface = surface # QOffscreenSurface (created on GUI thread)
+    self.context = None    # QOpenGLContext (created on worker thread)
+    self.latest_id = 0     # int (set from GUI thread so that superseded request is skipped)
+
+  @QtCore.Slot(int, str, object)
+  def build(self, build_id, file, loaded_sources):
+    if build_id < self.latest_id:
       return
+    if self.context is None:
+      self.context = QtGui.QOpenGLContext()
+      self.context.setFormat(QtGui.QSurfaceFormat.defaultFormat())
+      self.context.setShareContext(QtGui.QOpenGLContext.globalShareContext())
+      assert self.context.create()
+    self.context.makeCurrent(self.surface)
+    try:
+      src, _ = preprocess_include(file)
+      result = prepare_shader(src, build=True, loaded_sources=loaded_sources)
+      # Programs must be complete before other context uses them
+      gl.glFinish()
+      for program in result.programs.values():
+        program.moveToThread(QtWidgets.QApplication.instance().thread())
+    except ShaderError as e:
+      result = e
+    except Exception as e:
+      import traceback
+      traceback.print_exc()
+      result = e
+    finally:
+      self.context.doneCurrent()
+    self.finished.emit(build_id, result)
+
+  @QtCore.Slot()
+  def cleanup(self):
+    self.context = None
 
-    # Default mode
-    self.draw_default_mode(
-        default_framebuffer, W, H, frame, time, mouse_down,
-        mouse_press_pos, mouse_release_pos, mouse_move_pos,
-        key, key_modifiers)
 
-    # Callback for plugins
-    self.on_end_draw()
+# Preprocess and compile shader on worker thread whose context shares programs with GUI's context
+# (framebuffers and vertex arrays aren't shared, so they're still created by MultiPassRenderer.configure)
+class ShaderBuilder(QtCore.QObject):
+  requested = QtCore.Signal(int, str, object) # (build id, file, loaded_sources)
+  finished = QtCore.Signal(int, object)       # (build id, PreparedShader | Exception)
 
-  def draw_default_mode(
-      self, default_framebuffer, W, H, frame, time, mouse_down,
-      mouse_press_pos, mouse_release_pos, mouse_move_pos,
-      key, key_modifiers):
-    for program in self.config['programs']:
-      self.draw_program_substep(
-          program, default_framebuffer, W, H, frame, time, mouse_down,
-          mouse_press_pos, mouse_release_pos, mouse_move_pos,
-          key, key_modifiers)
-
-    # Swap double buffers
-    for pair in self.framebuffers.values():
-      pair[0], pair[1] = pair[1], pair[0]
-
-  def draw_global_substep_mode(
-      self, global_substep,
-      default_framebuffer, W, H, frame, time, mouse_down,
-      mouse_press_pos, mouse_release_pos, mouse_move_pos,
-      key, key_modifiers):
-    global_substep = self.config.get('substep')
-    num_iter = global_substep['num_iter']
-    schedule = global_substep['schedule']
+  def __init__(self):
+    super(ShaderBuilder, self).__init__()
+    self.surface = QtGui.QOffscreenSurface()
+    self.surface.setFormat(QtGui.QSurfaceFormat.defaultFormat())
+    self.surface.create()
+    self.thread = QtCore.QThread()
+    self.worker = ShaderBuildWorker(self.surface)
+    self.worker.moveToThread(self.thread)
+    self.requested.connect(self.worker.build)
+    self.worker.finished.connect(self.finished)
+    self.thread.start()
+    QtWidgets.QApplication.instance().aboutToQuit.connect(self.cleanup)
+
+  # loaded_sources : frozenset<str> (cf. MultiPassRenderer.loaded_sources)
+  def request(self, build_id, file, loaded_sources):
+    self.worker.latest_id = build_id
+    self.requested.emit(build_id, file, loaded_sources)
 
-    # Iterate substep scedule
-    # TODO: provide someway for program to know substep (e.g. "iSubstepFrame")
-    for i in range(global_substep['num_iter']):
-      for task in schedule:
-        if task['type'] == 'program':
-          program = pydash.find(self.config['programs'], {'name': task['name']})
-          self.draw_program_substep(
-              program, default_framebuffer, W, H, frame, time, mouse_down,
-              mouse_press_pos, mouse_release_pos, mouse_move_pos,
-              key, key_modifiers)
-
-        if task['type'] == 'sampler':
-          pair = self.framebuffers[task['name']]
-          pair[0], pair[1] = pair[1], pair[0]
-
-    # Iterate "non-substep" program (it should be only window render pass)
-    for program in self.config['programs']:
-      if not program.get('substep'):
-        self.draw_program_substep(
-            program, default_framebuffer, W, H, frame, time, mouse_down,
-            mouse_press_pos, mouse_release_pos, mouse_move_pos,
-            key, key_modifiers)
+  def cleanup(self):
+    if self.thread.isRunning():
+      QtCore.QMetaObject.invokeMethod(self.worker, 'cleanup', QtCore.Qt.BlockingQueuedConnection)
+      self.thread.quit()
+      self.thread.wait()
 
 
 class MyWidget(QtWidgets.QOpenGLWidget):
-  def __init__(self, fragment_shader_file, play_mode, parent=None):
+  # target_fps : float | None (enable dynamic resolution cf. render_scale)
+  # scale_range : (float, float) (bounds of render scale, at most 1)
+  # background_build : bool (rebuild on file change by ShaderBuilder while current shader keeps running)
+  def __init__(
+      self, fragment_shader_file, play_mode, profile=False, target_fps=None, scale_range=(0.25, 1.0),
+      background_build=True, parent=None):
     super(MyWidget, self).__init__(parent)
     self.setFocusPolicy(QtCore.Qt.FocusPolicy.ClickFocus) # Needed for triggering keyPressEvent
     self.renderer = MultiPassRenderer(offscreen=False)
+    if profile:
+      self.renderer.profiler = GpuProfiler()
     self.fragment_shader_file = fragment_shader_file
     self.preprocess_watcher = PreprocessIncludeWatcher(self.fragment_shader_file)
 
     self.gl_ready = False
     self.shader_error = None
+    self.build_error = None    # Exception | None (failed background build while previous shader keeps running)
+    self.builder = None        # ShaderBuilder | None (created after GL is ready)
+    self.background_build = background_build
+    self.build_id = 0          # int (only result of latest request is applied)
 
     # TODO: organize time/frame refresh logic (e.g. for reload shader, resize, gui time slider etc...)
     self.full_throttle = play_mode
@@ -501,34 +1010,61 @@ class MyWidget(QtWidgets.QOpenGLWidget):
     self.key = 0               # int (cf. https://doc.qt.io/qt-5/qt.html#Key-enum)
     self.key_modifiers = 0     # int (cf. https://doc.qt.io/qt-5/qt.html#KeyboardModifier-enum)
 
+    # Dynamic resolution (programs render into scaled_fbo at reduced size which is upscaled to widget)
+    assert scale_range[1] <= 1
+    self.scaler = None if target_fps is None else ResolutionScaler(target_fps, *scale_range)
+    self.frame_timer = None    # GpuFrameTimer | None
+    self.scaled_fbo = None     # QOpenGLFramebufferObject | None (widget size, only w x h region is used)
+    self.sampler_size = None   # (int, int) (size samplers are configured at)
+    self.render_size = None    # (int, int) (size of last frame i.e. iResolution)
+    self.refine_timer = QtCore.QTimer(self) # active while interaction continues
+    self.refine_timer.setSingleShot(True)
+    self.refine_timer.setInterval(200)
+    self.refine_timer.timeout.connect(self.update)
+
+    # Static configuration is drawn only when what determines frame changes (cf. get_static_key)
+    # and otherwise previous frame is kept in widget's framebuffer
+    self.setUpdateBehavior(QtWidgets.QOpenGLWidget.PartialUpdate)
+    self.static_key = None     # tuple | None (state last frame of static configuration was drawn with)
+
   # override
   def keyPressEvent(self, event): # QKeyEvent
     # TODO: during (non-modifier) key press, mouse event is not triggered at all.
     self.key = event.key()
+    self.reset_accumulation()
+    self.mark_interaction()
     self.update()
     if self.key == QtCore.Qt.Key_R:
-      self.load_fragment_shader_file()
+      self.load_fragment_shader_file(incremental=False)
 
   # override
   def keyReleaseEvent(self, event): # QKeyEvent
     self.key = 0
+    self.reset_accumulation()
+    self.mark_interaction()
     self.update()
 
   # override
   def mousePressEvent(self, event):
     self.mouse_down = True
     self.mouse_press_pos = self.mouse_move_pos = (event.x(), event.y())
+    self.reset_accumulation()
+    self.mark_interaction()
     self.update()
 
   # override
   def mouseReleaseEvent(self, event):
     self.mouse_down = False
     self.mouse_release_pos = (event.x(), event.y())
+    self.reset_accumulation()
+    self.mark_interaction()
     self.update()
 
   # override
   def mouseMoveEvent(self, event):
     self.mouse_move_pos = (event.x(), event.y())
+    self.reset_accumulation()
+    self.mark_interaction()
     self.update()
 
   # override
@@ -536,12 +1072,20 @@ class MyWidget(QtWidgets.QOpenGLWidget):
   def initializeGL(self):
     self.enable_debug()
     self.load_fragment_shader_file()
-    self.preprocess_watcher.changed.connect(self.load_fragment_shader_file)
+    if self.background_build:
+      self.builder = ShaderBuilder()
+      self.builder.finished.connect(self.handle_build_finished)
+    self.preprocess_watcher.changed.connect(self.request_build)
     self.gl_ready = True
 
   # override
   def resizeGL(self, W, H):
-    self.renderer.configure_samplers(W, H) # TODO: reconfigure only framebuffers (not images)
+    self.renderer.configure_samplers(W, H)
+    self.sampler_size = (W, H)
+    self.scaled_fbo = None
+    self.static_key = None
+    if self.renderer.config is not None:
+      self.renderer.configure_accumulator(W, H)
     self.init_frame()
 
   # override
@@ -549,7 +1093,10 @@ class MyWidget(QtWidgets.QOpenGLWidget):
   def paintGL(self):
     if self.gl_ready and not self.shader_error:
       self.renderPre()
-      self.render()
+      key = self.get_static_key()
+      if key is None or key != self.static_key:
+        self.render()
+      self.static_key = key
       self.renderPost()
 
   def init_frame(self):
@@ -557,17 +1104,78 @@ class MyWidget(QtWidgets.QOpenGLWidget):
     # (usually initialize at iFrame = 0 and do something at iFrame > 0)
     self.makeCurrent()
     self.app_frame = 0
+    self.reset_accumulation()
     self.paintGL()
     self.paintGL()
     self.doneCurrent()
     self.update()
 
 
-  def load_fragment_shader_file(self):
+  # Mean of previous samples is invalid once view changes (e.g. by mouse/key input)
+  def reset_accumulation(self):
+    if self.renderer.accumulator is not None:
+      self.renderer.accumulator.reset()
+
+  # Resolution drops while user interacts and is refined once interaction stops (cf. render_scale)
+  def mark_interaction(self):
+    if self.scaler is not None:
+      self.refine_timer.start()
+
+  # State determining frame of static configuration (None when frame changes over time)
+  def get_static_key(self): # -> tuple | None
+    if not self.renderer.is_static():
+      return None
+    key = (self.width(), self.height(), self.render_scale())
+    if self.renderer.uses_input():
+      key += (
+        self.mouse_down, self.mouse_press_pos, self.mouse_release_pos, self.mouse_move_pos,
+        self.key, self.key_modifiers)
+    return key
+
+  def render_scale(self): # -> float
+    if self.scaler is None or not self.renderer.supports_render_scale():
+      return 1
+    interacting = self.mouse_down or self.refine_timer.isActive()
+    if not interacting and not self.full_throttle:
+      return self.scaler.max_scale # Paused frame is refined
+    return self.scaler.get_scale(interacting)
+
+  def request_build(self):
+    if self.builder is None or self.shader_error is not None:
+      # Nothing valid to keep showing while building, so reload synchronously
+      self.load_fragment_shader_file()
+      return
+    self.build_id += 1
+    self.builder.request(self.build_id, self.fragment_shader_file, self.renderer.loaded_sources())
+
+  # Swap in (between paints on GUI thread) or keep previous shader running on failure
+  @exit_app_on_exception
+  def handle_build_finished(self, build_id, result):
+    if build_id != self.build_id:
+      return
+    if isinstance(result, Exception):
+      self.build_error = result
+      self.update() # show error
+      return
+    self.build_error = None
+    self.load_fragment_shader_file(prepared=result)
+
+  # incremental : bool (False when user explicitly requests full reload by "R" key)
+  # prepared : PreparedShader | None (built by ShaderBuilder)
+  @trace.traced()
+  def load_fragment_shader_file(self, incremental=True, prepared=None):
     self.makeCurrent()
     try:
-      src, _ = preprocess_include(self.fragment_shader_file)
-      self.renderer.configure(src, self.width(), self.height())
+      src = None
+      if prepared is None:
+        src, _ = preprocess_include(self.fragment_shader_file)
+        self.build_id += 1 # discard background build in flight
+        self.build_error = None
+      self.renderer.configure(src, self.width(), self.height(), incremental, prepared)
+      self.sampler_size = (self.width(), self.height())
+      self.static_key = None
+      if self.scaler is not None:
+        self.scaler.reset()
       self.shader_error = None
     except ShaderError as e:
       self.shader_error = e
@@ -585,6 +1193,9 @@ class MyWidget(QtWidgets.QOpenGLWidget):
   def cleanup(self):
     self.makeCurrent()
     self.renderer.cleanup()
+    if self.frame_timer is not None:
+      self.frame_timer.cleanup()
+    self.scaled_fbo = None
     self.doneCurrent()
 
   def renderPre(self):
@@ -604,15 +1215,45 @@ class MyWidget(QtWidgets.QOpenGLWidget):
     self.key_modifiers = int(QtGui.QGuiApplication.keyboardModifiers())
 
   def render(self):
+    W, H = self.width(), self.height()
+    scale = self.render_scale()
+    w, h = max(1, round(W * scale)), max(1, round(H * scale))
+    if (w, h) != self.sampler_size:
+      self.renderer.configure_samplers(w, h)
+      self.sampler_size = (w, h)
+
+    framebuffer = self.defaultFramebufferObject()
+    if (w, h) != (W, H):
+      if self.scaled_fbo is None:
+        self.scaled_fbo = QtGui.QOpenGLFramebufferObject(W, H, QtGui.QOpenGLFramebufferObject.Depth)
+      framebuffer = self.scaled_fbo.handle()
+
+    # Mouse position in rendered resolution
+    def scale_pos(pos):
+      return scale_position(pos, w, h, W, H)
+
+    if self.scaler is not None:
+      self.frame_timer = self.frame_timer or GpuFrameTimer()
+      self.frame_timer.begin_frame(scale)
     self.renderer.draw(
-      self.defaultFramebufferObject(),
-      self.width(), self.height(), self.app_frame, self.app_time,
-      self.mouse_down, self.mouse_press_pos,
-      self.mouse_release_pos, self.mouse_move_pos, self.key, self.key_modifiers)
+      framebuffer, w, h, self.app_frame, self.app_time,
+      self.mouse_down, scale_pos(self.mouse_press_pos),
+      scale_pos(self.mouse_release_pos), scale_pos(self.mouse_move_pos), self.key, self.key_modifiers)
+    if self.scaler is not None:
+      self.frame_timer.end_frame()
+      for frame_scale, ms in self.frame_timer.collect():
+        self.scaler.add_sample(ms, frame_scale)
+
+    if framebuffer != self.defaultFramebufferObject():
+      gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, framebuffer)
+      gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, self.defaultFramebufferObject())
+      gl.glBlitFramebuffer(0, 0, w, h, 0, 0, W, H, gl.GL_COLOR_BUFFER_BIT, gl.GL_LINEAR)
+      gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.defaultFramebufferObject())
+    self.render_size = (w, h)
 
   def renderPost(self):
     self.app_frame += 1
-    if self.full_throttle:
+    if self.full_throttle and self.static_key is None:
       self.update() # schedule next repaint
 
   def set_full_throttle(self, value):
@@ -636,7 +1277,9 @@ def load_ui_file(file):
   return widget
 
 
-def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
+def setup_gui(
+    fragment_shader_file, w, h, x, y, play_mode, profile=False, target_fps=None, scale_range=(0.25, 1.0),
+    background_build=True):
   # TODO: Temporary inline class/instance
   self = type('MyWindow', (object,), {})()
   self.window = load_ui_file(os.path.join(os.path.dirname(__file__), 'app.ui'))
@@ -644,8 +1287,11 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
   self.pause_icon = QtGui.QIcon.fromTheme('media-playback-pause-symbolic')
 
   # Add widgets not in .ui file
-  self.widget = MyWidget(fragment_shader_file, play_mode=play_mode)
+  self.widget = MyWidget(
+      fragment_shader_file, play_mode=play_mode, profile=profile,
+      target_fps=target_fps, scale_range=scale_range, background_build=background_build)
   self.dialog = QtWidgets.QMessageBox() # shader error dialog
+  self.profile_label = QtWidgets.QLabel() if profile else None # GPU time per pass
 
   # Grab children from .ui file
   names = ['main_container', 'sub_container', 'dummy', 'button', 'slider', 'label1', 'label2', 'label3', 'label4']
@@ -656,6 +1302,9 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
   self.dummy.close()
   self.main_container.addWidget(self.widget)
   self.main_container.removeWidget(self.dummy)
+  if self.profile_label:
+    self.profile_label.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+    self.main_container.addWidget(self.profile_label)
   self.button._current_icon = None  # for custom dirty checking
   self.label2.setValidator(QtGui.QDoubleValidator())
   self.dialog.setText("[Shader Error]")
@@ -671,7 +1320,14 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
     if not self.label2.hasFocus():
       self.label2.setText(f"{self.widget.app_time_maximum: >5.2f}")
     self.label3.setText(f"{self.widget.sec_per_frame() * 1000: >5.2f} (ms/f)")
-    self.label4.setText(f"{self.widget.width()}x{self.widget.height()}")
+    size = (self.widget.width(), self.widget.height())
+    render_size = self.widget.render_size or size
+    self.label4.setText(
+        f"{size[0]}x{size[1]}" if render_size == size else f"{render_size[0]}x{render_size[1]} / {size[0]}x{size[1]}")
+    if self.profile_label:
+      summary = self.widget.renderer.profiler.summary(num_frames=30)
+      self.profile_label.setText('\n'.join(
+          f"{name: <32} {entry['mean_ms']: >6.2f} (ms)" for name, entry in summary.items()))
 
     # QIcon doesn't have equality, so we need to do equality check by ourselves
     # in order to prevent unnecessarily repaint
@@ -680,8 +1336,9 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
       self.button.setIcon(next_icon)
       self.button._current_icon = next_icon
 
-    if self.widget.shader_error:
-      self.dialog.setInformativeText(str(self.widget.shader_error))
+    error = self.widget.shader_error or self.widget.build_error
+    if error:
+      self.dialog.setInformativeText(str(error))
       self.dialog.show()
     else:
       self.dialog.close()
@@ -694,6 +1351,7 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
     v = self.slider.value() / self.slider_resolution
     if self.slider.isSliderDown() and v < self.widget.app_time_maximum:
       self.widget.app_time = v
+      self.widget.mark_interaction()
       self.widget.init_frame()
       update_gui()
 
@@ -718,8 +1376,12 @@ def setup_gui(fragment_shader_file, w, h, x, y, play_mode):
 
 
 class OffscreenRenderer():
-  def __init__(self, width, height):
+  # max_frames_in_flight : int (frames CPU can run ahead of GPU)
+  # throttle : bool (sleep before every frame as in old behaviour)
+  def __init__(self, width, height, max_frames_in_flight=2, throttle=False):
     self.w, self.h = width, height
+    self.max_frames_in_flight = max_frames_in_flight
+    self.throttle = throttle
     self.surface = QtGui.QOffscreenSurface()
     self.surface.create()
     self.context = QtGui.QOpenGLContext()
@@ -728,29 +1390,145 @@ class OffscreenRenderer():
     self.fbo = QtGui.QOpenGLFramebufferObject(self.w, self.h, QtGui.QOpenGLFramebufferObject.Depth)
     self.renderer = MultiPassRenderer(offscreen=True)
 
-  def render(self, shader_file):
+  # sinks : [FrameSink] (frames are passed on background writer thread)
+  # readback_all : bool (if False, only last frame is read back)
+  def render(self, shader_file, sinks=[], readback_all=True):
     from time import sleep
     src, _ = preprocess_include(shader_file)
     self.renderer.configure(src, self.w, self.h)
     option = self.renderer.config.get('offscreen_option', dict(fps = 60, num_frames = 1))
     fps = option['fps']
-    num_frames = option['num_frames']
-    for frame in range(num_frames):
-      sleep(1 / 120)  # throttle loop since it stalls whole graphics system
-      time = frame / fps
-      self.renderer.draw(
-          self.fbo.handle(), self.w, self.h, frame, time, mouse_down=False,
-          mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
-          key=0, key_modifiers=0)
-
+    accumulator = self.renderer.accumulator
+    # Without explicit "num_frames", accumulation runs up to max_samples and stops earlier once converged
+    # (so sinks get upper bound of number of frames cf. FrameSink.open)
+    num_frames = option.get('num_frames', 1 if accumulator is None else accumulator.max_samples)
+
+    fences = FrameFences(self.max_frames_in_flight)
+    writer, readback = None, None
+    for sink in sinks:
+      sink.open(self.w, self.h, fps, num_frames)
+    if len(sinks) > 0:
+      writer = FrameWriter(lambda frame, data: [sink.write(frame, data) for sink in sinks])
+      readback = PboReadback(self.w, self.h, writer.put)
+      readback.init_resource()
 
-def render_offscreen(shader_file, output_file, w, h):
-  renderer = OffscreenRenderer(w, h)
-  renderer.render(shader_file)
-  renderer.fbo.toImage().save(output_file)
+    try:
+      for frame in range(num_frames):
+        if self.throttle:
+          sleep(1 / 120)
+        time = frame / fps
+        self.renderer.draw(
+            self.fbo.handle(), self.w, self.h, frame, time, mouse_down=False,
+            mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+            key=0, key_modifiers=0)
+        done = accumulator is not None and accumulator.is_done()
+        if readback and (readback_all or done or frame == num_frames - 1):
+          readback.read(self.fbo.handle(), frame)
+        # Wait GPU instead of queueing unbounded work which stalls whole graphics system
+        fences.end_frame()
+        if done:
+          break
+      if accumulator is not None:
+        noise = 'n/a' if accumulator.noise is None else f"{accumulator.noise:.5f}"
+        print(f"[OffscreenRenderer] Accumulated {accumulator.num_samples} samples "
+              f"(noise {noise}, {accumulator.elapsed():.2f}s)")
+      if readback:
+        readback.flush()
+    finally:
+      fences.cleanup()
+      try:
+        if readback:
+          readback.cleanup()
+          writer.close()
+      finally:
+        for sink in sinks:
+          sink.close()
+
+  def render_image(self, shader_file, output_file):
+    self.render(shader_file, [StillImageSink(output_file)], readback_all=False)
+
+
+# Print GPU time per pass and dump every frame's timings as JSON
+def report_profile(profiler, profile_out=None):
+  profiler.collect(wait=True)
+  for name, entry in profiler.summary().items():
+    print(f"[GpuProfiler] {name: <32} mean {entry['mean_ms']: >8.3f}ms, max {entry['max_ms']: >8.3f}ms")
+  if profile_out:
+    profiler.dump(profile_out)
+
+
+# frames_out : str (e.g. "out/%04d.png"), video_out : str (e.g. "out.mp4", "out.npy")
+# profile : bool, profile_out : str | None (e.g. "profile.json")
+def render_offscreen(
+    shader_file, output_file, w, h, max_frames_in_flight=2, throttle=False,
+    frames_out=None, video_out=None, profile=False, profile_out=None):
+  renderer = OffscreenRenderer(w, h, max_frames_in_flight, throttle)
+  if profile or profile_out:
+    renderer.renderer.profiler = GpuProfiler()
+  sinks = []
+  if output_file:
+    sinks += [StillImageSink(output_file)]
+  if frames_out:
+    sinks += [ImageSequenceSink(frames_out)]
+  if video_out:
+    sinks += [make_video_sink(video_out)]
+  renderer.render(shader_file, sinks, readback_all=bool(frames_out or video_out))
+  if renderer.renderer.profiler is not None:
+    report_profile(renderer.renderer.profiler, profile_out)
   renderer.renderer.cleanup()
 
 
+# Render w x h image by tile_size x tile_size tiles (for resolution beyond max texture size)
+# where only the last frame of stateless single-pass configuration is rendered
+# output_file : str (".npy" or ".ppm" written as memmap)
+def render_offscreen_tiled(shader_file, output_file, w, h, tile_size, max_frames_in_flight=2):
+  # Check configuration before allocating anything at full size
+  # (prepared once and passed to configure so that %%EXEC%% etc. run only once)
+  src, _ = preprocess_include(shader_file)
+  prepared = prepare_shader(src, build=False)
+  config = prepared.config
+  stateful = \
+      len(config.get('plugins', [])) > 0 or config.get('substep') or config.get('accumulate') or \
+      len(config['programs']) != 1 or \
+      any(sampler['type'] != 'file' for sampler in config['samplers']) or \
+      config['programs'][0].get('type') == 'compute'
+  if stateful:
+    raise ShaderError("[render_offscreen_tiled] Only stateless single-pass configuration is supported")
+
+  sink = TiledImageSink(output_file, w, h, tile_size)
+  renderer = OffscreenRenderer(tile_size, tile_size, max_frames_in_flight)
+  mp_renderer = renderer.renderer
+  mp_renderer.configure(src, w, h, prepared=prepared)
+
+  option = config.get('offscreen_option', dict(fps = 60, num_frames = 1))
+  frame = option['num_frames'] - 1
+  time = frame / option['fps']
+
+  sink.open()
+  writer = FrameWriter(sink.write)
+  readback = PboReadback(tile_size, tile_size, writer.put)
+  readback.init_resource()
+  fences = FrameFences(max_frames_in_flight)
+  try:
+    for i, tile in enumerate(sink.tiles):
+      mp_renderer.draw(
+          renderer.fbo.handle(), w, h, frame, time, mouse_down=False,
+          mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+          key=0, key_modifiers=0, tile=tile)
+      readback.read(renderer.fbo.handle(), i)
+      # Small draw per submission also keeps each tile within driver watchdog
+      fences.end_frame()
+    readback.flush()
+  finally:
+    fences.cleanup()
+    try:
+      readback.cleanup()
+      writer.close()
+    finally:
+      sink.close()
+      mp_renderer.cleanup()
+
+
 def setup_gl_version():
   surface_format = QtGui.QSurfaceFormat()
   surface_format.setMajorVersion(4)
@@ -769,15 +1547,27 @@ def setup_misc():
   QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_ShareOpenGLContexts)
 
 
-def run_app(fragment_shader_file, offscreen_output_file, w, h, x=2**7, y=2**7, play_mode=True):
+def run_app(
+    fragment_shader_file, offscreen_output_file, w, h, x=2**7, y=2**7, play_mode=True,
+    max_frames_in_flight=2, throttle=False, frames_out=None, video_out=None, tile_size=None,
+    profile=False, profile_out=None, target_fps=None, scale_range=(0.25, 1.0), background_build=True):
   setup_misc()
   app = QtWidgets.QApplication.instance() or QtWidgets.QApplication()
-  if offscreen_output_file:
-    render_offscreen(fragment_shader_file, offscreen_output_file, w, h)
+  if offscreen_output_file and tile_size:
+    render_offscreen_tiled(fragment_shader_file, offscreen_output_file, w, h, tile_size, max_frames_in_flight)
+  elif offscreen_output_file or frames_out or video_out:
+    render_offscreen(
+        fragment_shader_file, offscreen_output_file, w, h, max_frames_in_flight, throttle,
+        frames_out, video_out, profile, profile_out)
   else:
-    window = setup_gui(fragment_shader_file, w, h, x, y, play_mode)
+    window = setup_gui(
+        fragment_shader_file, w, h, x, y, play_mode, profile or bool(profile_out), target_fps, scale_range,
+        background_build)
     setup_interrupt_handler(app)
     app.exec_()
+    if profile_out:
+      window.widget.makeCurrent()
+      report_profile(window.widget.renderer.profiler, profile_out)
 
 
 def main():
@@ -788,8 +1578,38 @@ def main():
   parser.add_argument('--height', type=int, default=2**9,        help='resolution height')
   parser.add_argument('--offscreen', type=str, default=None,     help='offscreen render output file')
   parser.add_argument('--paused', action='store_true', default=False, help='start app as paused mode')
+  parser.add_argument('--max-frames-in-flight', type=int, default=2, help='offscreen frames queued ahead of GPU')
+  parser.add_argument('--throttle', action='store_true', default=False, help='sleep 1/120 sec before every offscreen frame')
+  parser.add_argument('--frames-out', type=str, default=None, help='offscreen render every frame to image sequence (e.g. out/%%04d.png)')
+  parser.add_argument('--video-out', type=str, default=None,  help='offscreen render every frame to video via ffmpeg (or .npy)')
+  parser.add_argument('--tile-size', type=int, default=None,  help='offscreen render by tiles into memmap (--offscreen must be .npy or .ppm)')
+  parser.add_argument('--profile', action='store_true', default=False, help='measure GPU time of each pass and plugin')
+  parser.add_argument('--profile-out', type=str, default=None, help='write GPU time of each pass and plugin as JSON (implies --profile)')
+  parser.add_argument('--trace', type=str, default=None,       help='write CPU trace as Chrome trace-event JSON (e.g. out.json)')
+  parser.add_argument('--target-fps', type=float, default=None, help='lower GUI render resolution to hold frame rate')
+  parser.add_argument('--min-scale', type=float, default=0.25,  help='lower bound of render scale (cf. --target-fps)')
+  parser.add_argument('--max-scale', type=float, default=1.0,   help='upper bound of render scale (cf. --target-fps)')
+  parser.add_argument('--sync-reload', action='store_true', default=False, help='rebuild changed shader on GUI thread')
   args = parser.parse_args()
-  run_app(args.file, args.offscreen, args.width, args.height, play_mode=not args.paused)
+  if args.tile_size is not None and not args.offscreen:
+    parser.error('--tile-size requires --offscreen')
+  if args.tile_size is not None and (args.frames_out or args.video_out):
+    parser.error('--tile-size renders only last frame (cannot be used with --frames-out/--video-out)')
+  if args.tile_size is not None and args.tile_size <= 0:
+    parser.error('--tile-size must be positive')
+  if args.trace:
+    trace.enable()
+  try:
+    run_app(
+        args.file, args.offscreen, args.width, args.height, play_mode=not args.paused,
+        max_frames_in_flight=args.max_frames_in_flight, throttle=args.throttle,
+        frames_out=args.frames_out, video_out=args.video_out, tile_size=args.tile_size,
+        profile=args.profile, profile_out=args.profile_out,
+        target_fps=args.target_fps, scale_range=(args.min_scale, args.max_scale),
+        background_build=not args.sync_reload)
+  finally:
+    if args.trace:
+      trace.export(args.trace)
 
 
 if __name__ == '__main__':
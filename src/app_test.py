@@ -0,0 +1,358 @@
+import unittest, os, sys, tempfile
+from unittest import mock
+from . import app
+from .testing import NullGL, FakeRenderer, FakeFbo, make_renderer, draw, SUBSTEP_CONFIG
+
+
+class TestMultiPassRenderer(unittest.TestCase):
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_plan00(self):
+    log = []
+    config = dict(
+      samplers=[dict(name='buf', type='framebuffer', mipmap=True)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    renderer = make_renderer(config, log)
+    draw(renderer)
+    draw(renderer)
+    self.assertEqual(log, [
+      ('mainImage1', (1,)), ('mainImage', (1,)),
+      ('mainImage1', (2,)), ('mainImage', (2,)),
+    ])
+
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_plan01(self):
+    log = []
+    renderer = make_renderer(SUBSTEP_CONFIG, log)
+    draw(renderer)
+    self.assertEqual(log, [
+      ('mainImage1', (1,)), ('mainImage1', (2,)), ('mainImage1', (1,)),
+      ('mainImage', (2,)),
+    ])
+
+  def test_mipmap00(self):
+    # Two readers of same texture and reader without preceding write only need one generation
+    config = dict(
+      samplers=[
+        dict(name='buf', type='framebuffer', mipmap=True),
+        dict(name='buf_nomip', type='framebuffer', mipmap=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf', 'buf_nomip'], output='buf'),
+        dict(name='mainImage2', samplers=['buf', 'buf_nomip'], output='buf_nomip'),
+        dict(name='mainImage', samplers=['buf', 'buf_nomip'], output='$default'),
+      ])
+    null_gl = NullGL()
+    with mock.patch.object(app, 'gl', null_gl):
+      renderer = make_renderer(config, [])
+      draw(renderer)
+      self.assertEqual(null_gl.calls.count('glGenerateMipmap'), 1)
+      draw(renderer)
+      self.assertEqual(null_gl.calls.count('glGenerateMipmap'), 2)
+
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_accumulate00(self):
+    # Programs stop drawing once accumulator reaches target noise or max_samples
+    log = []
+    config = dict(
+      samplers=[],
+      programs=[dict(name='mainImage', samplers=[], output='$default')])
+    for option, noises, num_samples in [
+        (dict(max_samples=3), [], 3),
+        (dict(max_samples=100, target_noise=0.1, check_interval=2), [0.5, 0.2, 0.05], 6)]:
+      log.clear()
+      renderer = make_renderer(config, log)
+      accumulator = renderer.accumulator = app.Accumulator(option)
+      accumulator.sample_fbo = accumulator.sum_fbo = mock.Mock(**{'textures.return_value': [1, 2]})
+      accumulator.renderers = { name: FakeRenderer(name, []) for name in ['accumulate', 'resolve'] }
+      accumulator.estimate_noise = mock.Mock(side_effect=noises)
+      for frame in range(10):
+        draw(renderer, frame)
+      self.assertEqual(accumulator.num_samples, num_samples)
+      self.assertEqual(len(log), num_samples)
+      self.assertTrue(accumulator.is_done())
+      accumulator.reset()
+      self.assertFalse(accumulator.is_done())
+
+  def test_render_scale00(self):
+    # Resolution can change between frames only when no framebuffer carries content across frames
+    from .render_graph import plan_framebuffers, find_feedback
+    transient = dict(
+      samplers=[dict(name='buf', type='framebuffer', mipmap=False, double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=[], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    feedback = dict(
+      samplers=[dict(name='buf', type='framebuffer', mipmap=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    for config, expected in [
+        (transient, True), (feedback, False), (dict(transient, accumulate=dict()), False),
+        (dict(transient, samplers=[dict(transient['samplers'][0], keep=True)]), False)]:
+      renderer = app.MultiPassRenderer(offscreen=False)
+      renderer.config = config
+      layout, _ = plan_framebuffers(config, { 'buf': (16, 16) })
+      renderer.feedback_samplers = find_feedback(config, { name: double for name, (double, _) in layout.items() })
+      self.assertEqual(renderer.supports_render_scale(), expected)
+
+  def test_sampler_size00(self):
+    for sampler, size in [
+        (dict(size='$default'), (64, 48)), (dict(), (64, 48)), (dict(size=[256, 256]), (256, 256)),
+        (dict(scale=0.5), (32, 24)), (dict(size='W // 4, H // 4'), (16, 12)),
+        (dict(size='W // 4, H // 4', scale=0.5), (8, 6)), (dict(scale=0.001), (1, 1))]:
+      self.assertEqual(app.get_sampler_size(sampler, 64, 48), size)
+    with self.assertRaises(NameError):
+      app.get_sampler_size(dict(size="__import__('os').getpid(), H"), 64, 48)
+
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_sampler_size01(self):
+    # Each pass gets viewport/iResolution and mouse position of its output
+    log = []
+    config = dict(
+      samplers=[
+        dict(name='half', type='framebuffer', mipmap=False, scale=0.5, double_buffering=False),
+        dict(name='quarter', type='framebuffer', mipmap=False, size='W // 4, H // 4', double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=[], output='half'),
+        dict(name='mainImage2', samplers=['half'], output='quarter'),
+        dict(name='mainImage', samplers=['quarter'], output='$default'),
+      ])
+    renderer = make_renderer(config, [])
+    for program in config['programs']:
+      renderer.renderers[program['name']].draw = \
+          lambda texture_ids, W, H, frame, time, mouse_down, press_pos, *args, name=program['name'], **kwargs: \
+              log.append((name, W, H, press_pos))
+    renderer.draw(
+        0, 16, 16, 0, 0, mouse_down=True,
+        mouse_press_pos=(8, 4), mouse_release_pos=None, mouse_move_pos=(8, 4),
+        key=0, key_modifiers=0)
+    self.assertEqual(log, [
+      ('mainImage1', 8, 8, (4, 2)), ('mainImage2', 4, 4, (2, 1)), ('mainImage', 16, 16, (8, 4))])
+
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_sampler_size02(self):
+    # Pass writing fixed size framebuffer (e.g. ex29 [3, 3], ex41 [256, 256]) sees its own resolution
+    # regardless of window size, while pass writing to screen sees window size
+    log = []
+    config = dict(
+      samplers=[
+        dict(name='state', type='framebuffer', mipmap=False, size=[3, 3], double_buffering=True),
+        dict(name='noise', type='framebuffer', mipmap=False, size=[256, 256], double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['state'], output='state'),
+        dict(name='mainImage2', samplers=[], output='noise'),
+        dict(name='mainImage', samplers=['state', 'noise'], output='$default'),
+      ])
+    renderer = make_renderer(config, [])
+    for program in config['programs']:
+      renderer.renderers[program['name']].draw = \
+          lambda texture_ids, W, H, *args, name=program['name'], **kwargs: log.append((name, W, H))
+    for W, H in [(64, 48), (1280, 720)]:
+      log.clear()
+      renderer.draw(
+          0, W, H, 0, 0, mouse_down=False,
+          mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+          key=0, key_modifiers=0)
+      self.assertEqual(log, [('mainImage1', 3, 3), ('mainImage2', 256, 256), ('mainImage', W, H)])
+
+  def test_static00(self):
+    # Frame changes over time only when live program uses time or reads feedback sampler
+    config = dict(
+      samplers=[dict(name='buf', type='framebuffer', mipmap=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    for uniforms, uniforms1, static, uses_input in [
+        ({'iResolution'}, {'iResolution'}, True, False),
+        ({'iResolution', 'iMouse'}, {'iResolution'}, True, True),
+        ({'iTime'}, set(), False, False),
+        ({'iSampler0'}, set(), False, False)]:
+      renderer = make_renderer(config, [])
+      renderer.feedback_samplers = {'buf'}
+      renderer.renderers['mainImage'].active_uniforms = uniforms
+      renderer.renderers['mainImage1'].active_uniforms = uniforms1
+      self.assertEqual(renderer.is_static(), static)
+      self.assertEqual(renderer.uses_input(), uses_input)
+
+  def test_prepare_shader00(self):
+    # Only programs whose complete source isn't loaded yet are built (once per distinct source)
+    src = """
+/*
+%%config-start%%
+samplers: []
+programs:
+  - name: mainImage1
+    output: $default
+    samplers: []
+  - name: mainImage
+    output: $default
+    samplers: []
+%%config-end%%
+*/
+"""
+    prepared = app.prepare_shader(src, build=False)
+    self.assertEqual([program['name'] for program in prepared.config['programs']], ['mainImage1', 'mainImage'])
+    self.assertEqual(prepared.programs, {})
+
+    built = []
+    with mock.patch.object(app.QtGui, 'QOpenGLShaderProgram', mock.Mock), \
+         mock.patch.object(app, 'build_program', lambda program, stages: built.append(stages[1][1])):
+      loaded = frozenset([app.get_complete_src(prepared.config['programs'][0], prepared.src)])
+      prepared = app.prepare_shader(src, build=True, loaded_sources=loaded)
+    self.assertEqual(len(built), 1)
+    self.assertIn('void mainImage(out vec4', built[0])
+    self.assertEqual(list(prepared.programs.keys()), built)
+
+  @mock.patch.object(app, 'gl', NullGL())
+  def test_incremental_plugins00(self):
+    # Unchanged plugins are reused (only "configure_src" on source change) while plugins whose
+    # configuration, size (when depending on it) or imported module changed are rebuilt
+    log = []
+    def make_fake_plugin(base):
+      class FakePlugin(base):
+        def configure(self, arg):
+          self.name = arg.config['name']
+          log.append(('configure', self.name))
+        def configure_src(self, src): log.append(('configure_src', self.name))
+        def cleanup(self): log.append(('cleanup', self.name))
+      return FakePlugin
+
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         mock.patch.object(app, 'SsboPlugin', make_fake_plugin(app.SsboPlugin)), \
+         mock.patch.object(app, 'RasterscriptPlugin', make_fake_plugin(app.RasterscriptPlugin)):
+      module_file = os.path.join(tmpdir, 'test_app_plugin_module.py')
+      with open(module_file, 'w') as f: f.write('X = 1\n')
+      sys.path.insert(0, tmpdir)
+      try:
+        plugins_config = [
+          dict(type='ssbo', params=dict(name='a', type='size', size='W * H * 4', binding=0)),
+          dict(type='ssbo', params=dict(name='b', type='size', size=16, binding=1)),
+          dict(type='rasterscript', params=dict(name='c', exec='import test_app_plugin_module\nRESULT = 0\n')),
+        ]
+        renderer = app.MultiPassRenderer(offscreen=True)
+        renderer.configure_plugins(plugins_config, 'src0', 8, 8)
+        self.assertEqual(log, [('configure', 'a'), ('configure', 'b'), ('configure', 'c')])
+        plugins = list(renderer.plugins)
+
+        log.clear()
+        renderer.configure_plugins(plugins_config, 'src1', 8, 8, incremental=True)
+        self.assertEqual(log, [('configure_src', 'a'), ('configure_src', 'b'), ('configure_src', 'c')])
+        self.assertEqual([id(plugin) for plugin in renderer.plugins], [id(plugin) for plugin in plugins])
+
+        # Only plugin whose size is evaluated from W, H is rebuilt on resize
+        log.clear()
+        renderer.configure_plugins(plugins_config, 'src1', 16, 16, incremental=True)
+        self.assertEqual(log, [('configure', 'a'), ('cleanup', 'a')])
+        self.assertIsNot(renderer.plugins[0], plugins[0])
+        self.assertIs(renderer.plugins[1], plugins[1])
+
+        # Editing module imported by snippet rebuilds plugin (e.g. RELOAD_REC of misc/mesh)
+        log.clear()
+        with open(module_file, 'w') as f: f.write('X = 12\n')
+        renderer.configure_plugins(plugins_config, 'src1', 16, 16, incremental=True)
+        self.assertEqual(log, [('configure', 'c'), ('cleanup', 'c')])
+
+        # Removed plugin is cleaned up
+        log.clear()
+        renderer.configure_plugins(plugins_config[:1] + plugins_config[2:], 'src1', 16, 16, incremental=True)
+        self.assertEqual(log, [('cleanup', 'b')])
+        self.assertEqual(len(renderer.plugins), 2)
+      finally:
+        sys.path.remove(tmpdir)
+        sys.modules.pop('test_app_plugin_module', None)
+
+  def test_incremental_samplers00(self):
+    # Images and framebuffers are kept unless their configuration (or size) changed
+    null_gl = NullGL()
+    with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(app, 'gl', null_gl):
+      image_file = os.path.join(tmpdir, 'a.png')
+      with open(image_file, 'wb') as f: f.write(bytes(4))
+      config = dict(
+        samplers=[
+          dict(name='img', type='file', file=image_file),
+          dict(name='buf', type='framebuffer', mipmap=False),
+          dict(name='buf2', type='framebuffer', mipmap=False)],
+        programs=[
+          dict(name='mainImage1', samplers=['buf'], output='buf'),
+          dict(name='mainImage2', samplers=['buf'], output='buf2'),
+          dict(name='mainImage', samplers=['img', 'buf2'], output='$default'),
+        ])
+      renderer = app.MultiPassRenderer(offscreen=True)
+      renderer.config = config
+      handles = iter(range(1, 100))
+      renderer.create_image = lambda filename: app.MyImage(qimage=None, handle=next(handles))
+      renderer.create_fbo_pair = lambda W, H, mipmap, internal_format, double_buffering: \
+          [FakeFbo(next(handles)) for _ in range(2 if double_buffering else 1)]
+      renderer.configure_gl_texture = lambda handle, sampler: None
+
+      renderer.configure_samplers(16, 16, incremental=False)
+      images, framebuffers = dict(renderer.images), dict(renderer.framebuffers)
+      renderer.configure_samplers(16, 16)
+      self.assertIs(renderer.images['img'], images['img'])
+      self.assertIs(renderer.framebuffers['buf'], framebuffers['buf'])
+      self.assertIs(renderer.framebuffers['buf2'], framebuffers['buf2'])
+
+      config['samplers'][2]['mipmap'] = True
+      renderer.configure_samplers(16, 16)
+      self.assertIs(renderer.framebuffers['buf'], framebuffers['buf'])
+      self.assertIsNot(renderer.framebuffers['buf2'], framebuffers['buf2'])
+
+      # Resize rebuilds framebuffers only
+      framebuffers = dict(renderer.framebuffers)
+      renderer.configure_samplers(32, 32)
+      self.assertIs(renderer.images['img'], images['img'])
+      self.assertIsNot(renderer.framebuffers['buf'], framebuffers['buf'])
+      self.assertIsNot(renderer.framebuffers['buf2'], framebuffers['buf2'])
+      self.assertEqual(null_gl.calls.count('glDeleteTextures'), 0)
+
+      # Removed image is deleted
+      config['samplers'] = config['samplers'][1:]
+      config['programs'][2]['samplers'] = ['buf2']
+      renderer.configure_samplers(32, 32)
+      self.assertEqual(renderer.images, {})
+      self.assertEqual(null_gl.calls.count('glDeleteTextures'), 1)
+
+  def test_incremental_programs00(self):
+    # Renderers are kept unless their program configuration or complete source changed
+    log = []
+    class FakeProgram():
+      def init_resource(self): pass
+      def load_fragment_shader(self, src, program=None): log.append(('load', src))
+      def cleanup(self): log.append(('cleanup', self))
+
+    config = dict(
+      samplers=[dict(name='buf', type='framebuffer', mipmap=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf'),
+        dict(name='mainImage2', samplers=[], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    src = 'void mainImage(out vec4 fragColor, vec2 fragCoord) {}\n'
+    with mock.patch.object(app, 'Renderer', FakeProgram):
+      renderer = app.MultiPassRenderer(offscreen=True)
+      renderer.config = config
+      renderer.framebuffers = { 'buf': [FakeFbo(1), FakeFbo(2)] }
+      renderer.configure_programs(src)
+      self.assertEqual(len(log), 3)
+      renderers = dict(renderer.renderers)
+
+      log.clear()
+      renderer.configure_programs(src, incremental=True)
+      self.assertEqual(log, [])
+      for name, program in renderers.items():
+        self.assertIs(renderer.renderers[name], program)
+
+      # Changed program is rebuilt and removed one is cleaned up
+      log.clear()
+      config['programs'] = [dict(config['programs'][0], samplers=[]), config['programs'][2]]
+      renderer.configure_programs(src, incremental=True)
+      self.assertEqual([entry[0] for entry in log], ['load', 'cleanup', 'cleanup'])
+      self.assertEqual(
+          { entry[1] for entry in log[1:] }, { renderers['mainImage1'], renderers['mainImage2'] })
+      self.assertIsNot(renderer.renderers['mainImage1'], renderers['mainImage1'])
+      self.assertIs(renderer.renderers['mainImage'], renderers['mainImage'])
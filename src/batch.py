@@ -1,20 +1,232 @@
 import argparse
-import os
+import os, sys, time, traceback, queue, collections, hashlib, json
 from PySide2 import QtWidgets, QtGui
 from .app import setup_misc, OffscreenRenderer
-from .utils import setup_interrupt_handler, setup_qt_message_handler, preprocess_include
+from .frame_sink import StillImageSink, ImageSequenceSink, make_video_sink
+from .utils import \
+    setup_interrupt_handler, setup_qt_message_handler, preprocess_include, \
+    preprocess_source, parse_shader_config, file_stamps, get_exec_file_stamps
 
 
-def process_batch(files, width, height, out_dir, format):
+def get_output_file(file, out_dir, format):
+  basename_wo_ext = os.path.splitext(os.path.basename(file))[0]
+  return os.path.join(out_dir, f"{basename_wo_ext}.{format}")
+
+
+# frames_out : bool (write every frame to <out_dir>/<name>/%04d.<format>)
+# video_out : str | None (extension e.g. "mp4", "npy" to write every frame to <out_dir>/<name>.<video_out>)
+# -> [str] (still image, image sequence directory and video written by `render_file`)
+def get_output_paths(file, out_dir, format, frames_out=False, video_out=None):
+  basename_wo_ext = os.path.splitext(os.path.basename(file))[0]
+  paths = [get_output_file(file, out_dir, format)]
+  if frames_out:
+    paths += [os.path.join(out_dir, basename_wo_ext)]
+  if video_out:
+    paths += [os.path.join(out_dir, f"{basename_wo_ext}.{video_out}")]
+  return paths
+
+
+def render_file(renderer, file, out_dir, format, frames_out=False, video_out=None):
+  paths = get_output_paths(file, out_dir, format, frames_out, video_out)
+  print(f"[process_batch] (input) {file} (output) {paths[0]}")
+  sinks = [StillImageSink(paths[0])]
+  if frames_out:
+    sinks += [ImageSequenceSink(os.path.join(paths[1], f"%04d.{format}"))]
+  if video_out:
+    sinks += [make_video_sink(paths[-1])]
+  renderer.render(file, sinks, readback_all=len(sinks) > 1)
+
+
+# Hash of python sources of renderer (so that renderer change invalidates cache)
+def get_renderer_version(): # -> str
+  h = hashlib.sha256()
+  src_dir = os.path.dirname(__file__)
+  for name in sorted(os.listdir(src_dir)):
+    if name.endswith('.py') and not name.endswith('_test.py'):
+      with open(os.path.join(src_dir, name), 'rb') as f:
+        h.update(f.read())
+  return h.hexdigest()
+
+
+# Hash of everything affecting output of `render_file`
+# (source with includes and directives expanded e.g. %%ENV%%, config, referenced files, resolution,
+#  options and renderer version)
+def get_render_hash(file, width, height, render_options, renderer_version): # -> str
+  src, _ = preprocess_include(file)
+  src = preprocess_source(src)
+  config = parse_shader_config(src)
+  key = dict(
+    src=src, config=config, assets=file_stamps(config), exec_files=get_exec_file_stamps(config),
+    width=width, height=height, options=render_options, version=renderer_version)
+  return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Render hash and outputs of each input file stored in <out_dir>/.batch_cache.json
+class BatchCache():
+  def __init__(self, out_dir):
+    self.out_dir = out_dir
+    self.path = os.path.join(out_dir, '.batch_cache.json')
+    self.entries = {} # map<str, { digest : str, outputs : [str] }>
+    if os.path.exists(self.path):
+      with open(self.path) as f:
+        self.entries = json.load(f)
+
+  # Fresh only when every output written by last render still exists
+  def is_fresh(self, file, digest):
+    entry = self.entries.get(file)
+    return isinstance(entry, dict) and entry['digest'] == digest and \
+           all(os.path.exists(path) for path in entry['outputs'])
+
+  # outputs : [str] (cf. get_output_paths, directory is recorded together with its files e.g. frames)
+  def update(self, file, digest, outputs):
+    paths = []
+    for path in outputs:
+      paths += [path]
+      if os.path.isdir(path):
+        paths += [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    self.entries[file] = dict(digest=digest, outputs=paths)
+    os.makedirs(self.out_dir, exist_ok=True)
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump(self.entries, f, indent=2, sort_keys=True)
+    os.replace(self.path + '.tmp', self.path)
+
+
+# Render files with single offscreen context
+# -> generator of (file : str, error : str | None, elapsed : float)
+def process_batch_serial(files, width, height, max_frames_in_flight, throttle, render_options):
   setup_misc()
-  app = QtWidgets.QApplication()
-  renderer = OffscreenRenderer(width, height)
+  app = QtWidgets.QApplication.instance() or QtWidgets.QApplication()
+  renderer = OffscreenRenderer(width, height, max_frames_in_flight, throttle)
   for file in files:
-    basename_wo_ext = os.path.splitext(os.path.basename(file))[0]
-    out_file = os.path.join(out_dir, f"{basename_wo_ext}.{format}")
-    print(f"[process_batch] (input) {file} (output) {out_file}")
-    renderer.render(file)
-    renderer.fbo.toImage().save(out_file)
+    start = time.time()
+    try:
+      render_file(renderer, file, **render_options)
+      error = None
+    except Exception:
+      error = traceback.format_exc()
+    yield file, error, time.time() - start
+
+
+# Worker process for `process_batch_parallel` (which owns its own QApplication and offscreen context)
+# tasks : Queue (file dispatched to this worker, None to exit)
+def batch_worker(tasks, results, *worker_args):
+  for file, error, elapsed in process_batch_serial(iter(tasks.get, None), *worker_args):
+    results.put(('done', os.getpid(), file, error, elapsed))
+
+
+# Render files with `jobs` worker processes
+# (each worker renders one file at a time, so worker crash e.g. by driver only fails the file dispatched to it)
+# worker : function (cf. batch_worker)
+def process_batch_parallel(files, jobs, *worker_args, worker=batch_worker):
+  import multiprocessing
+  context = multiprocessing.get_context('spawn') # Qt/GL state can't be forked
+  results = context.Queue()
+  pending = collections.deque(files)
+  workers = {}  # map<int, (Process, Queue)>
+  current = {}  # map<int, str> (pid -> file dispatched but not completed)
+  num_done = 0
+
+  def dispatch(pid):
+    _, tasks = workers[pid]
+    if len(pending) > 0:
+      current[pid] = pending.popleft()
+      tasks.put(current[pid])
+    else:
+      tasks.put(None)
+
+  def spawn():
+    tasks = context.Queue()
+    process = context.Process(target=worker, args=(tasks, results, *worker_args), daemon=True)
+    process.start()
+    workers[process.pid] = (process, tasks)
+    dispatch(process.pid)
+
+  for _ in range(min(jobs, len(files))):
+    spawn()
+
+  while len(current) > 0:
+    try:
+      _, pid, file, error, elapsed = results.get(timeout=1)
+      if current.get(pid) == file:
+        del current[pid]
+        num_done += 1
+        yield file, error, elapsed
+        dispatch(pid)
+    except queue.Empty:
+      pass
+
+    # Check every worker since others keep reporting while one has died
+    for pid, (process, _) in list(workers.items()):
+      if process.exitcode is None:
+        continue
+      del workers[pid]
+      file = current.pop(pid, None)
+      if file is None:
+        continue
+      yield file, f"worker exited with code {process.exitcode}\n", 0
+      if len(pending) == 0:
+        continue
+      if num_done == 0 and len(workers) == 0:
+        # Workers died before rendering anything (e.g. no GL context available)
+        for file in pending:
+          yield file, "no worker available\n", 0
+        pending.clear()
+        continue
+      spawn()
+
+  for process, _ in workers.values():
+    process.join()
+
+
+def process_batch(
+    files, width, height, out_dir, format, max_frames_in_flight=2, throttle=False,
+    frames_out=False, video_out=None, jobs=1, incremental=False): # -> int (number of failures)
+  render_options = dict(out_dir=out_dir, format=format, frames_out=frames_out, video_out=video_out)
+  worker_args = (width, height, max_frames_in_flight, throttle, render_options)
+
+  # Skip files whose render hash matches the one of existing output
+  cache, digests = None, {}
+  if incremental:
+    cache = BatchCache(out_dir)
+    renderer_version = get_renderer_version()
+    skipped = []
+    for file in files:
+      try:
+        digest = get_render_hash(file, width, height, render_options, renderer_version)
+      except Exception as e:
+        print(f"[process_batch] failed to hash {file} ({e})")
+        continue
+      if cache.is_fresh(file, digest):
+        skipped += [file]
+      else:
+        digests[file] = digest
+    for file in skipped:
+      print(f"[process_batch] up-to-date {file}")
+    files = [file for file in files if file not in skipped]
+  if len(files) == 0:
+    results = []
+  elif jobs > 1:
+    results = process_batch_parallel(files, jobs, *worker_args)
+  else:
+    results = process_batch_serial(files, *worker_args)
+
+  start = time.time()
+  failures = []
+  for i, (file, error, elapsed) in enumerate(results):
+    status = 'ok' if error is None else 'failed'
+    print(f"[process_batch] ({i + 1}/{len(files)}) {status} {file} ({elapsed:.2f}s)")
+    if error is not None:
+      print(error, end='')
+      failures += [file]
+    elif cache and file in digests:
+      cache.update(file, digests[file], get_output_paths(file, **render_options))
+
+  total = time.time() - start
+  print(f"[process_batch] {len(files) - len(failures)} succeeded, {len(failures)} failed "
+        f"in {total:.2f}s ({len(files) / max(total, 1e-6):.2f} files/s)")
+  for file in failures:
+    print(f"[process_batch] failed : {file}")
+  return len(failures)
 
 
 def main():
@@ -24,8 +236,14 @@ def main():
   parser.add_argument('--height', type=int, default=400,    help='resolution height')
   parser.add_argument('--out-dir', type=str, required=True, help='output directory')
   parser.add_argument('--format', type=str, default='png',  help='image file format')
+  parser.add_argument('--max-frames-in-flight', type=int, default=2, help='frames queued ahead of GPU')
+  parser.add_argument('--throttle', action='store_true', default=False, help='sleep 1/120 sec before every frame')
+  parser.add_argument('--frames-out', action='store_true', default=False, help='write every frame to <out-dir>/<name>/%%04d.<format>')
+  parser.add_argument('--video-out', type=str, default=None, help='write every frame to <out-dir>/<name>.<video-out> (e.g. mp4, npy)')
+  parser.add_argument('--jobs', type=int, default=1,        help='number of worker processes')
+  parser.add_argument('--incremental', action='store_true', default=False, help='skip files whose output is up-to-date')
   args = parser.parse_args()
-  process_batch(**args.__dict__)
+  sys.exit(1 if process_batch(**args.__dict__) > 0 else 0)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,128 @@
+import unittest, os, tempfile
+from .batch import get_render_hash, get_output_paths, BatchCache, process_batch_parallel
+
+
+# Worker for process_batch_parallel which dies on file "crash" (e.g. driver crash or os._exit in "exec")
+def crash_worker(tasks, results):
+  for file in iter(tasks.get, None):
+    if file == 'crash':
+      os._exit(3)
+    results.put(('done', os.getpid(), file, None, 0))
+
+
+def dead_worker(tasks, results):
+  os._exit(1)
+
+
+class TestBatchCache(unittest.TestCase):
+  def test_misc00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      files = [os.path.join(tmpdir, name) for name in ['a.glsl', 'b.glsl', 'common.glsl']]
+      with open(files[0], 'w') as f: f.write('#include "common.glsl"\nvoid mainImage() {}\n')
+      with open(files[1], 'w') as f: f.write('void mainImage() {}\n')
+      with open(files[2], 'w') as f: f.write('float x;\n')
+
+      options = dict(out_dir=tmpdir, format='png')
+      get_hashes = lambda: [get_render_hash(file, 8, 8, options, 'v0') for file in files[:2]]
+      hashes = get_hashes()
+      self.assertEqual(hashes, get_hashes())
+      self.assertNotEqual(hashes[0], get_render_hash(files[0], 16, 8, options, 'v0'))
+      self.assertNotEqual(hashes[0], get_render_hash(files[0], 8, 8, options, 'v1'))
+
+      # Touching include only changes hash of includer
+      with open(files[2], 'w') as f: f.write('float y;\n')
+      new_hashes = get_hashes()
+      self.assertNotEqual(hashes[0], new_hashes[0])
+      self.assertEqual(hashes[1], new_hashes[1])
+
+      # Output file must exist to be fresh
+      out_file = os.path.join(tmpdir, 'b.png')
+      cache = BatchCache(tmpdir)
+      cache.update(files[1], hashes[1], [out_file])
+      self.assertFalse(BatchCache(tmpdir).is_fresh(files[1], hashes[1]))
+      with open(out_file, 'wb') as f: pass
+      self.assertTrue(BatchCache(tmpdir).is_fresh(files[1], hashes[1]))
+      self.assertFalse(BatchCache(tmpdir).is_fresh(files[1], new_hashes[0]))
+
+  def test_outputs00(self):
+    # Every output of last render (still image, each frame of sequence, video) must still exist
+    with tempfile.TemporaryDirectory() as tmpdir:
+      file = os.path.join(tmpdir, 'a.glsl')
+      options = dict(out_dir=tmpdir, format='png', frames_out=True, video_out='mp4')
+      outputs = get_output_paths(file, **options)
+      self.assertEqual(outputs, [os.path.join(tmpdir, name) for name in ['a.png', 'a', 'a.mp4']])
+      os.makedirs(outputs[1])
+      for path in [outputs[0], outputs[2]] + [os.path.join(outputs[1], f"{i:04d}.png") for i in range(2)]:
+        with open(path, 'wb') as f: pass
+      BatchCache(tmpdir).update(file, 'digest', outputs)
+      self.assertTrue(BatchCache(tmpdir).is_fresh(file, 'digest'))
+      os.remove(os.path.join(outputs[1], '0001.png'))
+      self.assertFalse(BatchCache(tmpdir).is_fresh(file, 'digest'))
+
+  def test_env00(self):
+    # Value of %%ENV%% is part of hash
+    with tempfile.TemporaryDirectory() as tmpdir:
+      file = os.path.join(tmpdir, 'a.glsl')
+      with open(file, 'w') as f: f.write('const int N = %%ENV:TEST_BATCH_ENV_N:4%%;\n')
+      options = dict(out_dir=tmpdir, format='png')
+      get_hash = lambda: get_render_hash(file, 8, 8, options, 'v0')
+      try:
+        digest = get_hash()
+        os.environ['TEST_BATCH_ENV_N'] = '8'
+        self.assertNotEqual(digest, get_hash())
+        os.environ['TEST_BATCH_ENV_N'] = '4'
+        self.assertEqual(digest, get_hash())
+      finally:
+        os.environ.pop('TEST_BATCH_ENV_N', None)
+
+  def test_exec_dependency00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      file = os.path.join(tmpdir, 'a.glsl')
+      data_file = os.path.join(tmpdir, 'mesh.bin')
+      module_file = os.path.join(tmpdir, 'test_batch_exec_module.py')
+      with open(data_file, 'wb') as f: f.write(bytes(4))
+      with open(module_file, 'w') as f: f.write('X = 1\n')
+      with open(file, 'w') as f: f.write(f"""\
+/*
+%%config-start%%
+plugins:
+  - type: rasterscript
+    params:
+      exec: |
+        import test_batch_exec_module
+        with open({data_file!r}, 'rb') as f:
+          RESULT = f.read(), bytes()
+%%config-end%%
+*/
+""")
+      import sys
+      sys.path.insert(0, tmpdir)
+      try:
+        options = dict(out_dir=tmpdir, format='png')
+        get_hash = lambda: get_render_hash(file, 8, 8, options, 'v0')
+        digest = get_hash()
+        self.assertEqual(digest, get_hash())
+
+        # Data file loaded by multi-line snippet and imported module are part of hash
+        with open(data_file, 'wb') as f: f.write(bytes(8))
+        new_digest = get_hash()
+        self.assertNotEqual(digest, new_digest)
+        with open(module_file, 'w') as f: f.write('X = 12\n')
+        self.assertNotEqual(new_digest, get_hash())
+      finally:
+        sys.path.remove(tmpdir)
+        sys.modules.pop('test_batch_exec_module', None)
+
+
+class TestProcessBatchParallel(unittest.TestCase):
+  def test_crash00(self):
+    # Crash fails only file being rendered and remaining files go to new worker
+    results = { file: error for file, error, _ in process_batch_parallel(['a', 'crash', 'b', 'c'], 2, worker=crash_worker) }
+    self.assertEqual(set(results.keys()), {'a', 'crash', 'b', 'c'})
+    self.assertEqual(results['crash'], "worker exited with code 3\n")
+    self.assertEqual([results[file] for file in 'abc'], [None] * 3)
+
+    # Every file fails when workers can't start
+    results = list(process_batch_parallel(['a', 'b', 'c'], 2, worker=dead_worker))
+    self.assertEqual(sorted(file for file, _, _ in results), ['a', 'b', 'c'])
+    self.assertTrue(all(error is not None for _, error, _ in results))
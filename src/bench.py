@@ -0,0 +1,205 @@
+#
+# Offscreen render benchmark over example shaders
+#
+# Usage:
+#   python -m src.bench --software --out bench.json shaders/ex00_checker.glsl shaders/ex44_wave_equation.glsl
+#   python -m src.bench --software --baseline bench_baseline.json --save-baseline shaders/ex0*.glsl
+#   python -m src.bench --software --baseline bench_baseline.json --threshold 0.25 shaders/ex0*.glsl
+#
+import argparse, glob, json, os, sys, time, traceback
+import OpenGL.GL as gl
+from PySide2 import QtWidgets
+from .app import setup_misc, OffscreenRenderer
+from .program_cache import get_driver_info
+from .profiler import GpuProfiler
+from .utils import preprocess_include
+from .utils_gl import FrameFences
+from . import trace
+
+
+# Metrics compared against baseline (milliseconds, lower is better)
+METRICS = [
+  'compile_ms', 'configure_ms', 'first_frame_ms',
+  'cpu_ms_per_frame', 'gpu_ms_per_frame', 'wall_ms_per_frame',
+]
+
+
+def parse_resolution(s): # "WxH" -> (int, int)
+  w, h = s.lower().split('x')
+  return int(w), int(h)
+
+
+def get_result_key(file, w, h):
+  return f"{file}@{w}x{h}"
+
+
+# Render `file` for `warmup + num_frames` frames and measure (file must not have been configured)
+# -> map<str, float> (cf. METRICS)
+def bench_file(renderer, file, num_frames, warmup):
+  mp_renderer = renderer.renderer
+  W, H = renderer.w, renderer.h
+
+  def draw(frame):
+    mp_renderer.draw(
+        renderer.fbo.handle(), W, H, frame, frame / 60, mouse_down=False,
+        mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+        key=0, key_modifiers=0)
+
+  # Configure (compile time is sum of "build_program" spans within it)
+  trace.enable()
+  try:
+    start = time.perf_counter()
+    src, _ = preprocess_include(file)
+    mp_renderer.configure(src, W, H)
+    gl.glFinish()
+    configure_ms = (time.perf_counter() - start) * 1e3
+    compile_ms = sum(e['dur'] for e in trace.events() if e['name'] == 'build_program') * 1e-3
+  finally:
+    trace.disable()
+
+  # First frame including lazy work (e.g. plan compilation, driver shader variant)
+  start = time.perf_counter()
+  draw(0)
+  gl.glFinish()
+  first_frame_ms = (time.perf_counter() - start) * 1e3
+
+  fences = FrameFences(renderer.max_frames_in_flight)
+  try:
+    for frame in range(1, 1 + warmup):
+      draw(frame)
+      fences.end_frame()
+    gl.glFinish()
+
+    # Steady state
+    profiler = mp_renderer.profiler = GpuProfiler()
+    cpu_ms = 0
+    start = time.perf_counter()
+    for frame in range(1 + warmup, 1 + warmup + num_frames):
+      cpu_start = time.perf_counter()
+      draw(frame)
+      cpu_ms += (time.perf_counter() - cpu_start) * 1e3
+      fences.end_frame()
+    gl.glFinish()
+    wall_ms = (time.perf_counter() - start) * 1e3
+    profiler.collect(wait=True)
+    gpu_ms = sum(sum(timings.values()) for timings in profiler.frames)
+  finally:
+    fences.cleanup()
+
+  return dict(
+    compile_ms=compile_ms, configure_ms=configure_ms, first_frame_ms=first_frame_ms,
+    cpu_ms_per_frame=cpu_ms / num_frames,
+    gpu_ms_per_frame=gpu_ms / max(len(profiler.frames), 1),
+    wall_ms_per_frame=wall_ms / num_frames)
+
+
+# -> dict (cf. --out)
+def run_bench(files, resolutions, num_frames, warmup):
+  setup_misc()
+  app = QtWidgets.QApplication.instance() or QtWidgets.QApplication()
+  results = {} # map<str, dict>
+  driver_info = None
+  for w, h in resolutions:
+    renderer = OffscreenRenderer(w, h)
+    driver_info = driver_info or get_driver_info()
+    for file in files:
+      key = get_result_key(file, w, h)
+      try:
+        results[key] = bench_file(renderer, file, num_frames, warmup)
+        print(f"[bench] {key} " + ', '.join(f"{k} {v:.2f}" for k, v in results[key].items()))
+      except Exception:
+        results[key] = dict(error=traceback.format_exc())
+        print(f"[bench] {key} failed\n{results[key]['error']}", end='')
+      finally:
+        renderer.renderer.cleanup()
+        renderer.renderer.profiler = None
+  return dict(
+    driver=driver_info, num_frames=num_frames, warmup=warmup,
+    date=time.strftime('%Y-%m-%dT%H:%M:%S'), results=results)
+
+
+# Metric is regression when both relative and absolute increase exceed thresholds
+# (small absolute noise on fast shaders shouldn't fail the run)
+# thresholds : map<str, float> (relative increase per metric)
+# -> [(key : str, metric : str, baseline : float, current : float)]
+def compare_results(baseline, current, thresholds, min_delta_ms=0.5):
+  regressions = []
+  for key, entry in current['results'].items():
+    base_entry = baseline['results'].get(key)
+    if base_entry is None or 'error' in base_entry or 'error' in entry:
+      continue
+    for metric in METRICS:
+      if metric not in thresholds or metric not in base_entry:
+        continue
+      b, c = base_entry[metric], entry[metric]
+      if c > b * (1 + thresholds[metric]) and c - b > min_delta_ms:
+        regressions += [(key, metric, b, c)]
+  return regressions
+
+
+# "0.25" or "gpu_ms_per_frame=0.1,compile_ms=1.0" -> map<str, float> (over default)
+def parse_thresholds(s, default=0.25):
+  thresholds = { metric: default for metric in METRICS }
+  for item in filter(None, s.split(',')):
+    if '=' in item:
+      metric, value = item.split('=')
+      assert metric in METRICS, f"unknown metric {metric}"
+      thresholds[metric] = float(value)
+    else:
+      thresholds = { metric: float(item) for metric in thresholds }
+  return thresholds
+
+
+def main():
+  parser = argparse.ArgumentParser(description='ShaderApp (offscreen benchmark)')
+  parser.add_argument('files', type=str, nargs='*', help='shader files (default: shaders/ex*.glsl)')
+  parser.add_argument('--resolutions', type=str, default='256x256,1024x768', help='comma separated WxH')
+  parser.add_argument('--frames', type=int, default=60,   help='number of measured frames')
+  parser.add_argument('--warmup', type=int, default=5,    help='number of frames before measurement')
+  parser.add_argument('--out', type=str, default=None,    help='write results as JSON')
+  parser.add_argument('--baseline', type=str, default=None, help='baseline JSON to compare with')
+  parser.add_argument('--save-baseline', action='store_true', default=False, help='overwrite baseline with results')
+  parser.add_argument('--threshold', type=str, default='0.25', help='relative regression threshold (e.g. 0.25 or gpu_ms_per_frame=0.1,compile_ms=1)')
+  parser.add_argument('--min-delta-ms', type=float, default=0.5, help='ignore regressions smaller than this')
+  parser.add_argument('--software', action='store_true', default=False, help='use software GL (llvmpipe) without display (e.g. CI)')
+  parser.add_argument('--program-cache', action='store_true', default=False, help='keep program binary and exec result cache (compile/configure time measures cache hit)')
+  args = parser.parse_args()
+
+  if args.software:
+    os.environ['LIBGL_ALWAYS_SOFTWARE'] = '1'
+    os.environ['GALLIUM_DRIVER'] = 'llvmpipe'
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+  if not args.program_cache:
+    os.environ['SHADER_APP_PROGRAM_CACHE'] = '0'
+    os.environ['SHADER_APP_EXEC_CACHE'] = '0'
+
+  files = args.files or sorted(glob.glob('shaders/ex*.glsl'))
+  resolutions = [parse_resolution(s) for s in args.resolutions.split(',')]
+  current = run_bench(files, resolutions, args.frames, args.warmup)
+  if args.out:
+    with open(args.out, 'w') as f:
+      json.dump(current, f, indent=2)
+
+  failed = [key for key, entry in current['results'].items() if 'error' in entry]
+  regressions = []
+  if args.baseline and args.save_baseline:
+    with open(args.baseline, 'w') as f:
+      json.dump(current, f, indent=2)
+    print(f"[bench] saved baseline {args.baseline}")
+  elif args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    if baseline.get('driver') != current['driver']:
+      print(f"[bench] WARNING: baseline is from different driver\n{baseline.get('driver')}")
+    regressions = compare_results(baseline, current, parse_thresholds(args.threshold), args.min_delta_ms)
+    for key, metric, b, c in regressions:
+      print(f"[bench] regression {key} {metric} {b:.2f} -> {c:.2f} ({(c / max(b, 1e-9) - 1) * 100:+.0f}%)")
+    print(f"[bench] {len(regressions)} regressions")
+
+  for key in failed:
+    print(f"[bench] failed : {key}")
+  sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == '__main__':
+  main()
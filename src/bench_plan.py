@@ -0,0 +1,86 @@
+#
+# CPU overhead per pass of MultiPassRenderer.draw (OpenGL stubbed out, so no context needed)
+# compared with the per-frame pydash dispatch which preceded the compiled draw plan
+#
+# Usage:
+#   python -m src.bench_plan --num-iter 256 --repeat 20
+#
+import argparse, timeit
+from unittest import mock
+import pydash
+from . import app
+from .testing import NullGL, make_renderer, draw, SUBSTEP_CONFIG
+
+
+# Frozen copy of the draw loop before the plan (MultiPassRenderer.draw_global_substep_mode and
+# draw_program_substep) i.e. config lookups by pydash for each pass
+def draw_legacy(renderer, W=16, H=16, frame=0, time=0):
+  gl = app.gl
+  args = (W, H, frame, time, False, None, None, None, 0, 0, renderer.plugins)
+
+  def draw_program_substep(program):
+    texture_ids = []
+    for sampler_name in program['samplers']:
+      sampler = pydash.find(renderer.config['samplers'], {'name': sampler_name})
+      if sampler['type'] == 'file':
+        handle = renderer.images[sampler_name].handle
+      if sampler['type'] == 'framebuffer':
+        fbo_pair = renderer.framebuffers[sampler_name]
+        handle = fbo_pair[0].texture()
+        gl.glBindTexture(gl.GL_TEXTURE_2D, handle)
+        gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+      texture_ids.append(handle)
+
+    if not program.get('type') == 'compute':
+      if program['output'] == '$default':
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+      else:
+        renderer.framebuffers[program['output']][1].bind()
+    renderer.renderers[program['name']].draw(texture_ids, *args)
+
+  global_substep = renderer.config['substep']
+  for i in range(global_substep['num_iter']):
+    for task in global_substep['schedule']:
+      if task['type'] == 'program':
+        draw_program_substep(pydash.find(renderer.config['programs'], {'name': task['name']}))
+      if task['type'] == 'sampler':
+        pair = renderer.framebuffers[task['name']]
+        pair[0], pair[1] = pair[1], pair[0]
+  for program in renderer.config['programs']:
+    if not program.get('substep'):
+      draw_program_substep(program)
+
+
+# -> map<str, float> (microseconds per pass)
+def bench_plan(num_iter, repeat):
+  config = dict(SUBSTEP_CONFIG, substep=dict(SUBSTEP_CONFIG['substep'], num_iter=num_iter))
+  num_passes = num_iter + 1
+  with mock.patch.object(app, 'gl', NullGL()):
+    renderer = make_renderer(config, [])
+
+    # Plan compiled every frame (e.g. after configure/resize)
+    def draw_without_plan():
+      renderer.plan = None
+      draw(renderer)
+
+    t_legacy = timeit.timeit(lambda: draw_legacy(renderer), number=repeat) / repeat
+    t_compile = timeit.timeit(draw_without_plan, number=repeat) / repeat
+    t_plan = timeit.timeit(lambda: draw(renderer), number=repeat) / repeat
+  return dict(
+    legacy_draw_us_per_pass=t_legacy / num_passes * 1e6,
+    compile_and_draw_us_per_pass=t_compile / num_passes * 1e6,
+    draw_us_per_pass=t_plan / num_passes * 1e6)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='CPU overhead of multipass draw plan')
+  parser.add_argument('--num-iter', type=int, default=256, help='substep iterations (i.e. passes per frame - 1)')
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+  for key, value in bench_plan(args.num_iter, args.repeat).items():
+    print(f"[bench_plan] {key}: {value:.2f} us")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,31 @@
+import unittest
+from .bench import compare_results, parse_thresholds, parse_resolution, METRICS
+
+
+def make_results(**entries):
+  return dict(results=entries)
+
+
+class TestBench(unittest.TestCase):
+  def test_parse00(self):
+    self.assertEqual(parse_resolution('256X128'), (256, 128))
+    self.assertEqual(parse_thresholds('0.1'), { metric: 0.1 for metric in METRICS })
+    thresholds = parse_thresholds('gpu_ms_per_frame=0.05,compile_ms=1')
+    self.assertEqual(thresholds['gpu_ms_per_frame'], 0.05)
+    self.assertEqual(thresholds['compile_ms'], 1)
+    self.assertEqual(thresholds['cpu_ms_per_frame'], 0.25)
+
+  def test_compare00(self):
+    baseline = make_results(
+      a=dict(gpu_ms_per_frame=10, compile_ms=1),
+      b=dict(gpu_ms_per_frame=10),
+      c=dict(error='...'))
+    current = make_results(
+      a=dict(gpu_ms_per_frame=13, compile_ms=1.4), # compile_ms only +0.4ms
+      b=dict(gpu_ms_per_frame=12),                 # within 25%
+      c=dict(gpu_ms_per_frame=100),                # no baseline to compare
+      d=dict(gpu_ms_per_frame=100))
+    regressions = compare_results(baseline, current, parse_thresholds('0.25'))
+    self.assertEqual(regressions, [('a', 'gpu_ms_per_frame', 10, 13)])
+    regressions = compare_results(baseline, current, parse_thresholds('0.25'), min_delta_ms=0.1)
+    self.assertEqual(len(regressions), 2)
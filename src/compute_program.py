@@ -1,7 +1,7 @@
 from PySide2 import QtGui
 import OpenGL.GL as gl
 import math
-from .common import ShaderError
+from .program_cache import build_program
 
 
 COMPUTE_SHADER_TEMPLATE = """
@@ -25,20 +25,27 @@ void main() {{
 class ComputeProgram():
   def __init__(self, config):
     self.program = None
+    self.uniform_locations = {} # map<str, int>
     self.global_size = config['global_size']
     self.local_size = config['local_size']
 
   def init_resource(self):
     self.program = QtGui.QOpenGLShaderProgram()
 
-  def load_compute_shader(self, src):
-    self.program.removeAllShaders()
-    success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Compute, src)
-    if not success:
-      raise ShaderError(f"Compute: \n{self.program.log()}")
+  # program : QOpenGLShaderProgram | None (already linked e.g. on other thread)
+  def load_compute_shader(self, src, program=None):
+    if program is None:
+      build_program(self.program, [(QtGui.QOpenGLShader.Compute, src)])
+    else:
+      self.program = program
+    self.uniform_locations = {}
 
-    if not self.program.link():
-      raise ShaderError(f"Link: \n{self.program.log()}")
+  # Cached QOpenGLShaderProgram.uniformLocation
+  def uniform_location(self, name):
+    location = self.uniform_locations.get(name)
+    if location is None:
+      location = self.uniform_locations[name] = self.program.uniformLocation(name)
+    return location
 
   def cleanup(self):
     # QOpenGLShaderProgram's destructor frees resouce
@@ -63,15 +70,15 @@ class ComputeProgram():
       plugin.on_bind_program(self.program.programId())
 
     # Uniform setup (exactly same as `Renderer.draw`)
-    gl.glUniform1f(self.program.uniformLocation('iTime'), time)
-    gl.glUniform1i(self.program.uniformLocation('iFrame'), frame)
-    gl.glUniform3f(self.program.uniformLocation('iResolution'), W, H, W / H)
-    gl.glUniform1ui(self.program.uniformLocation('iKey'), key)
-    gl.glUniform1ui(self.program.uniformLocation('iKeyModifiers'), key_modifiers)
+    gl.glUniform1f(self.uniform_location('iTime'), time)
+    gl.glUniform1i(self.uniform_location('iFrame'), frame)
+    gl.glUniform3f(self.uniform_location('iResolution'), W, H, W / H)
+    gl.glUniform1ui(self.uniform_location('iKey'), key)
+    gl.glUniform1ui(self.uniform_location('iKeyModifiers'), key_modifiers)
 
     for i, texture_id in enumerate(texture_ids):
-      gl.glUniform1i(self.program.uniformLocation(f"iSampler{i}"), i)
-      gl.glActiveTexture(getattr(gl, f"GL_TEXTURE{i}"))
+      gl.glUniform1i(self.uniform_location(f"iSampler{i}"), i)
+      gl.glActiveTexture(gl.GL_TEXTURE0 + i)
       gl.glBindTexture(gl.GL_TEXTURE_2D, texture_id)
 
     mz, mw = mouse_press_pos or (0, H - 1)
@@ -82,7 +89,7 @@ class ComputeProgram():
       mx, my = mouse_release_pos or (0, H - 1)
       my, mw = [ H - 1 - t for t in [my, mw] ]
       mz, mw = [ -t for t in [mz, mw] ]
-    gl.glUniform4f(self.program.uniformLocation('iMouse'), mx, my, mz, mw)
+    gl.glUniform4f(self.uniform_location('iMouse'), mx, my, mz, mw)
 
     # Dispatch call
     gl.glDispatchCompute(*self.get_group_size(W, H))
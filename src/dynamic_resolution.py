@@ -0,0 +1,50 @@
+#
+# Render scale holding target frame rate (cf. MyWidget with --target-fps)
+#
+import collections, math
+
+
+# Frame time is assumed to be proportional to number of pixels (i.e. scale ** 2),
+# so each sample is normalized to full resolution cost and next scale is predicted from their median.
+class ResolutionScaler():
+  # step : float (scale is quantized so that framebuffers aren't reallocated on every small change)
+  # interaction_scale : float (extra factor while user interacts e.g. mouse drag)
+  # headroom : float (scale goes up only when predicted frame time is within this fraction of budget)
+  def __init__(
+      self, target_fps=30, min_scale=0.25, max_scale=1.0, step=0.125,
+      interaction_scale=0.5, headroom=0.8, window=8):
+    assert 0 < min_scale <= max_scale
+    self.target_fps = target_fps
+    self.min_scale = min_scale
+    self.max_scale = max_scale
+    self.step = step
+    self.interaction_scale = interaction_scale
+    self.headroom = headroom
+    self.costs = collections.deque(maxlen=window) # [float] (milliseconds at full resolution)
+    self.scale = max_scale
+
+  def reset(self):
+    self.costs.clear()
+    self.scale = self.max_scale
+
+  def clamp(self, scale): # -> float
+    return min(max(scale, self.min_scale), self.max_scale)
+
+  # ms : float (GPU time of frame rendered at `scale`)
+  def add_sample(self, ms, scale):
+    self.costs.append(ms / scale**2)
+    if len(self.costs) < self.costs.maxlen:
+      return
+    cost = sorted(self.costs)[len(self.costs) // 2] # median is robust to occasional hitch
+    budget = 1000 / self.target_fps
+    candidate = self.clamp(math.floor(math.sqrt(budget / max(cost, 1e-6)) / self.step) * self.step)
+    if candidate < self.scale or \
+       (candidate > self.scale and cost * candidate**2 <= self.headroom * budget):
+      self.scale = candidate
+      self.costs.clear()
+
+  # interacting : bool -> float
+  def get_scale(self, interacting):
+    if interacting:
+      return self.clamp(self.scale * self.interaction_scale)
+    return self.scale
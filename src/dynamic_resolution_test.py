@@ -0,0 +1,56 @@
+import unittest
+from .dynamic_resolution import ResolutionScaler
+
+
+def feed(scaler, full_res_ms, num_frames):
+  for _ in range(num_frames):
+    scale = scaler.get_scale(False)
+    scaler.add_sample(full_res_ms * scale**2, scale)
+
+
+class TestResolutionScaler(unittest.TestCase):
+  def test_scale00(self):
+    scaler = ResolutionScaler(target_fps=50, min_scale=0.25, window=4) # 20ms budget
+
+    # Cheap frame stays at full resolution
+    feed(scaler, 10, 8)
+    self.assertEqual(scaler.scale, 1.0)
+
+    # 80ms at full resolution needs 1/4 pixels
+    feed(scaler, 80, 4)
+    self.assertEqual(scaler.scale, 0.5)
+    feed(scaler, 80, 8)
+    self.assertEqual(scaler.scale, 0.5)
+
+    # Lower bound
+    feed(scaler, 10000, 4)
+    self.assertEqual(scaler.scale, 0.25)
+
+    # Goes back up once cost drops
+    feed(scaler, 15, 4)
+    self.assertEqual(scaler.scale, 1.0)
+
+  def test_scale01(self):
+    scaler = ResolutionScaler(target_fps=50, window=4, headroom=0.8)
+
+    # 24ms needs scale sqrt(20 / 24) ~ 0.91 -> 0.875
+    feed(scaler, 24, 4)
+    self.assertEqual(scaler.scale, 0.875)
+
+    # Going up needs headroom (22 * 1.0 > 0.8 * 20)
+    feed(scaler, 22, 8)
+    self.assertEqual(scaler.scale, 0.875)
+
+    # Occasional hitch doesn't change scale
+    for ms in [10, 10, 1000, 10]:
+      scaler.add_sample(ms, scaler.scale)
+    self.assertEqual(scaler.scale, 1.0)
+
+  def test_interaction00(self):
+    scaler = ResolutionScaler(min_scale=0.25, interaction_scale=0.5)
+    self.assertEqual(scaler.get_scale(True), 0.5)
+    scaler.scale = 0.375
+    self.assertEqual(scaler.get_scale(True), 0.25)
+    self.assertEqual(scaler.get_scale(False), 0.375)
+    scaler.reset()
+    self.assertEqual(scaler.get_scale(False), 1.0)
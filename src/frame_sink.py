@@ -0,0 +1,172 @@
+#
+# Destinations of offscreen rendered frames (cf. OffscreenRenderer.render)
+#
+import io, os, subprocess, threading
+from concurrent import futures
+import numpy as np
+from .readback import to_qimage
+from . import trace
+
+
+class FrameSink():
+  def open(self, W, H, fps, num_frames): pass # num_frames : int (upper bound e.g. accumulation can stop earlier)
+  def write(self, frame, data): pass # data : uint8[H, W, 4] (top row first)
+  def close(self): pass
+
+
+# Save only last written frame (i.e. usual "--offscreen" output)
+class StillImageSink(FrameSink):
+  def __init__(self, filename):
+    self.filename = filename
+    self.data = None
+
+  def write(self, frame, data):
+    self.data = data
+
+  def close(self):
+    if self.data is not None:
+      with trace.span('QImage.save', file=self.filename):
+        to_qimage(self.data).save(self.filename)
+
+
+# Numbered image sequence written by worker pool (e.g. pattern "out/%04d.png")
+class ImageSequenceSink(FrameSink):
+  def __init__(self, pattern, num_workers=4):
+    self.pattern = pattern
+    self.num_workers = num_workers
+    self.executor = None
+    self.slots = threading.BoundedSemaphore(2 * num_workers) # bound number of pending frames
+    self.futures = []
+
+  def open(self, W, H, fps, num_frames):
+    os.makedirs(os.path.dirname(self.pattern) or '.', exist_ok=True)
+    self.executor = futures.ThreadPoolExecutor(self.num_workers)
+
+  def save(self, filename, data):
+    try:
+      with trace.span('QImage.save', file=filename):
+        saved = to_qimage(data).save(filename)
+      if not saved:
+        raise RuntimeError(f"[ImageSequenceSink] Failed to save {filename}")
+    finally:
+      self.slots.release()
+
+  def write(self, frame, data):
+    self.slots.acquire()
+    self.futures = [f for f in self.futures if not f.done() or f.exception()]
+    self.futures += [self.executor.submit(self.save, self.pattern % frame, data)]
+
+  def close(self):
+    self.executor.shutdown(wait=True)
+    for f in self.futures:
+      f.result() # re-raise error from worker
+
+
+# Raw RGBA stream piped into ffmpeg subprocess
+class FfmpegSink(FrameSink):
+  def __init__(self, filename, ffmpeg='ffmpeg', options=('-pix_fmt', 'yuv420p')):
+    self.filename = filename
+    self.ffmpeg = ffmpeg
+    self.options = options
+    self.process = None
+
+  def open(self, W, H, fps, num_frames):
+    command = [
+      self.ffmpeg, '-y', '-loglevel', 'error',
+      '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f"{W}x{H}", '-r', str(fps), '-i', '-',
+      *self.options, self.filename]
+    self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+  def write(self, frame, data):
+    self.process.stdin.write(data.tobytes()) # blocks when ffmpeg is behind
+
+  def close(self):
+    self.process.stdin.close()
+    if self.process.wait() != 0:
+      raise RuntimeError(f"[FfmpegSink] ffmpeg exited with {self.process.returncode}")
+
+
+# Uncompressed uint8[num_frames, H, W, 4] array as .npy memmap
+# (shrunk to the number of frames actually written on close)
+class NpySink(FrameSink):
+  def __init__(self, filename):
+    self.filename = filename
+    self.array = None
+    self.num_written = 0
+
+  def open(self, W, H, fps, num_frames):
+    self.array = np.lib.format.open_memmap(
+        self.filename, mode='w+', dtype=np.uint8, shape=(num_frames, H, W, 4))
+    self.num_written = 0
+
+  def write(self, frame, data):
+    self.array[frame] = data
+    self.num_written = max(self.num_written, frame + 1)
+
+  def close(self):
+    self.array.flush()
+    shape = (self.num_written,) + self.array.shape[1:]
+    shrink = self.num_written < len(self.array)
+    offset = self.array.offset
+    self.array = None
+    if shrink:
+      shrink_npy(self.filename, offset, shape, np.uint8)
+
+
+# Rewrite .npy header with smaller leading dimension and drop the rest of data
+def shrink_npy(filename, offset, shape, dtype):
+  header = io.BytesIO()
+  np.lib.format.write_array_header_1_0(header, dict(
+      descr=np.lib.format.dtype_to_descr(np.dtype(dtype)), fortran_order=False, shape=shape))
+  header = header.getvalue()
+  if len(header) != offset: # header padding differs (e.g. version 2.0), so copy instead
+    data = np.load(filename, mmap_mode='r')[:shape[0]].copy()
+    np.save(filename, data)
+    return
+  with open(filename, 'r+b') as f:
+    f.write(header)
+    f.truncate(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+
+
+def make_video_sink(filename): # -> FrameSink
+  if filename.endswith('.npy'):
+    return NpySink(filename)
+  return FfmpegSink(filename)
+
+
+# Image assembled from tiles rendered at bottom-left origin (cf. render_offscreen_tiled)
+# written into memmap so that only one tile is kept in memory
+# (.npy : uint8[H, W, 4], .ppm : binary RGB)
+class TiledImageSink():
+  def __init__(self, filename, W, H, tile_size):
+    if not filename.endswith(('.npy', '.ppm')):
+      raise ValueError(f"[TiledImageSink] Unsupported format (.npy or .ppm) : {filename}")
+    self.filename = filename
+    self.W, self.H = W, H
+    self.tile_size = tile_size
+    self.tiles = [ # [(x, y, w, h)]
+      (x, y, min(tile_size, W - x), min(tile_size, H - y))
+      for y in range(0, H, tile_size) for x in range(0, W, tile_size)
+    ]
+    self.array = None
+
+  def open(self):
+    W, H = self.W, self.H
+    if self.filename.endswith('.npy'):
+      self.array = np.lib.format.open_memmap(self.filename, mode='w+', dtype=np.uint8, shape=(H, W, 4))
+      return
+    header = f"P6\n{W} {H}\n255\n".encode()
+    with open(self.filename, 'wb') as f:
+      f.write(header)
+      f.truncate(len(header) + H * W * 3)
+    self.array = np.memmap(self.filename, dtype=np.uint8, mode='r+', offset=len(header), shape=(H, W, 3))
+
+  # data : uint8[tile_size, tile_size, 4] (top row first, i.e. partial tile is at bottom-left)
+  def write(self, tile, data):
+    x, y, w, h = self.tiles[tile]
+    T = self.tile_size
+    self.array[self.H - y - h : self.H - y, x : x + w] = data[T - h:, :w, :self.array.shape[2]]
+
+  def close(self):
+    self.array.flush()
+    self.array = None
@@ -0,0 +1,72 @@
+import unittest, os, tempfile
+import numpy as np
+from .frame_sink import NpySink, ImageSequenceSink, TiledImageSink
+
+
+def make_frames(num_frames, W, H):
+  return [np.full((H, W, 4), 10 * i, np.uint8) for i in range(num_frames)]
+
+
+class TestFrameSink(unittest.TestCase):
+  def test_npy00(self):
+    frames = make_frames(3, 4, 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'out.npy')
+      sink = NpySink(filename)
+      sink.open(4, 2, 60, 3)
+      for i, data in enumerate(frames):
+        sink.write(i, data)
+      sink.close()
+      self.assertTrue(np.all(np.load(filename) == np.stack(frames)))
+
+  def test_npy_shrink00(self):
+    # Opened for upper bound of frames (e.g. accumulation max_samples) but stopped earlier
+    frames = make_frames(3, 4, 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'out.npy')
+      sink = NpySink(filename)
+      sink.open(4, 2, 60, 1024)
+      for i, data in enumerate(frames):
+        sink.write(i, data)
+      sink.close()
+      result = np.load(filename)
+      self.assertEqual(result.shape, (3, 2, 4, 4))
+      self.assertTrue(np.all(result == np.stack(frames)))
+      self.assertEqual(os.path.getsize(filename), 128 + result.nbytes)
+
+  def test_image_sequence00(self):
+    frames = make_frames(5, 4, 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      sink = ImageSequenceSink(os.path.join(tmpdir, 'frames', '%04d.png'), num_workers=2)
+      sink.open(4, 2, 60, 5)
+      for i, data in enumerate(frames):
+        sink.write(i, data)
+      sink.close()
+      self.assertEqual(
+          sorted(os.listdir(os.path.join(tmpdir, 'frames'))),
+          [f"{i:04d}.png" for i in range(5)])
+
+  def test_tiled_image00(self):
+    # Simulate PBO readback of tiles rendered at bottom-left origin
+    W, H, T = 5, 3, 2
+    image = np.arange(H * W * 4, dtype=np.uint8).reshape((H, W, 4)) # bottom row first
+    with tempfile.TemporaryDirectory() as tmpdir:
+      for ext in ['npy', 'ppm']:
+        filename = os.path.join(tmpdir, f"out.{ext}")
+        sink = TiledImageSink(filename, W, H, T)
+        self.assertEqual(len(sink.tiles), 6)
+        sink.open()
+        for i, (x, y, w, h) in enumerate(sink.tiles):
+          data = np.zeros((T, T, 4), np.uint8)
+          data[:h, :w] = image[y : y + h, x : x + w]
+          sink.write(i, data[::-1])
+        sink.close()
+        if ext == 'npy':
+          result = np.load(filename)
+        else:
+          with open(filename, 'rb') as f:
+            self.assertEqual(f.readline(), b"P6\n")
+            self.assertEqual(f.readline(), f"{W} {H}\n".encode())
+            self.assertEqual(f.readline(), b"255\n")
+            result = np.frombuffer(f.read(), np.uint8).reshape((H, W, 3))
+        self.assertTrue(np.all(result == image[::-1, :, :result.shape[2]]))
@@ -4,6 +4,7 @@ import os, ctypes, dataclasses
 import numpy as np
 from .common import ShaderError, APP
 from .utils import pad_data, reload_rec, exec_config, exec_config_if_str, if3
+from .program_cache import build_program
 from . import utils_gl
 
 
@@ -18,6 +19,9 @@ class PluginConfigureArg:
 
 class Plugin():
   def configure(self, arg : PluginConfigureArg): pass
+  def configure_src(self, src): pass # called instead of "configure" when only shader source changed
+  @classmethod
+  def depends_on_size(cls, config): return False # "configure" reads arg.W, arg.H (so redone on resize)
   def cleanup(self): pass
   def on_bind_program(self, program_handle): pass
   def on_begin_draw(self): pass
@@ -29,6 +33,10 @@ class Plugin():
 
 
 class SsboPlugin(Plugin):
+  @classmethod
+  def depends_on_size(cls, config):
+    return config['type'] == 'size' and type(config['size']) == str
+
   def configure(self, arg):
     self.W, self.H = arg.W, arg.H  # in order to support "eval" for size
     self.config = arg.config
@@ -92,7 +100,7 @@ class SsboscriptPlugin(Plugin):
     self.setup_data()
 
   def setup_data(self):
-    ls_data = exec_config(self.exec)  # List[bytes]
+    ls_data = exec_config(self.exec, cache=True)  # List[bytes]
 
     for data, align16, ssbo in zip(ls_data, self.align16s, self.ssbos):
       data = pad_data(data, align16, 16)
@@ -128,6 +136,9 @@ class RasterPlugin(Plugin):
     self.vao = QtGui.QOpenGLVertexArrayObject()
     self.vao.create()
 
+  def configure_src(self, src):
+    self.setup_program(src)
+
   def setup_program(self, src):
     self.program = QtGui.QOpenGLShaderProgram()
     vs_name = self.config['vertex_shader']
@@ -136,22 +147,16 @@ class RasterPlugin(Plugin):
       f"#define COMPILE_{vs_name}",
       src,
     ])
-    vs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Vertex, vs_src)
-    if not vs_success:
-      raise ShaderError(f"[RasterPlugin] Vertex: \n{self.program.log()}")
-
     fs_name = self.config['fragment_shader']
     fs_src = '\n'.join([
       '#version 430 core',
       f"#define COMPILE_{fs_name}",
       src,
     ])
-    fs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Fragment, fs_src)
-    if not fs_success:
-      raise ShaderError(f"[RasterPlugin] Fragment: \n{self.program.log()}")
-
-    if not self.program.link():
-      raise ShaderError(f"[RasterPlugin] Link: \n{self.program.log()}")
+    build_program(self.program, [
+      (QtGui.QOpenGLShader.Vertex, vs_src),
+      (QtGui.QOpenGLShader.Fragment, fs_src),
+    ], error_prefix='[RasterPlugin] ')
 
   def on_draw(
       self, default_framebuffer, W, H, frame, time, mouse_down,
@@ -223,7 +228,7 @@ class RasterPlugin(Plugin):
 class RasterscriptPlugin(Plugin):
   def configure(self, arg):
     self.config = arg.config
-    self.vertex_data, self.index_data = exec_config(self.config['exec'])  # (bytes, bytes)
+    self.vertex_data, self.index_data = exec_config(self.config['exec'], cache=True)  # (bytes, bytes)
     self.setup_program(arg.src)
     self.setup_vao()
 
@@ -250,7 +255,14 @@ class RasterscriptPlugin(Plugin):
     self.index_buffer.bind()
     self.index_buffer.allocate(self.index_data, len(self.index_data))
     self.index_buffer.release()
+    self.setup_vertex_attributes()
+
+  # Keep vertex data (i.e. skip "exec") and only rebuild program
+  def configure_src(self, src):
+    self.setup_program(src)
+    self.setup_vertex_attributes()
 
+  def setup_vertex_attributes(self):
     self.vao.bind()
     self.vertex_buffer.bind()
     for name, args_str in self.config['vertex_attributes'].items():
@@ -266,18 +278,15 @@ class RasterscriptPlugin(Plugin):
       '#define COMPILE_' + self.config['vertex_shader'],
       src,
     ])
-    vs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Vertex, vs_src)
-    if not vs_success:
-      raise ShaderError(f"[RasterscriptPlugin] Vertex: \n{self.program.log()}")
-
     fs_src = '\n'.join([
       '#version 430 core',
       '#define COMPILE_' + self.config['fragment_shader'],
       src,
     ])
-    fs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Fragment, fs_src)
-    if not fs_success:
-      raise ShaderError(f"[RasterscriptPlugin] Fragment: \n{self.program.log()}")
+    stages = [
+      (QtGui.QOpenGLShader.Vertex, vs_src),
+      (QtGui.QOpenGLShader.Fragment, fs_src),
+    ]
 
     gs_name = self.config.get('geometry_shader')
     if gs_name:
@@ -286,12 +295,9 @@ class RasterscriptPlugin(Plugin):
         '#define COMPILE_' + gs_name,
         src,
       ])
-      gs_success = self.program.addShaderFromSourceCode(QtGui.QOpenGLShader.Geometry, gs_src)
-      if not gs_success:
-        raise ShaderError(f"[RasterscriptPlugin] Geometry: \n{self.program.log()}")
+      stages += [(QtGui.QOpenGLShader.Geometry, gs_src)]
 
-    if not self.program.link():
-      raise ShaderError(f"[RasterscriptPlugin] Link: \n{self.program.log()}")
+    build_program(self.program, stages, error_prefix='[RasterscriptPlugin] ')
 
   def on_begin_draw(self):
     # TODO: black screen randomly happens on reloading file
@@ -449,7 +455,7 @@ class UniformPlugin(Plugin):
     self.config = arg.config
     self.offscreen = arg.offscreen
     self.resolution = self.config.get('resolution', 100)
-    self.default = exec_config_if_str(self.config['default'])
+    self.default = exec_config_if_str(self.config['default'], cache=True)
     if not self.offscreen:
       self.setup_gui()
       self.set_value(self.default)
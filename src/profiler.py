@@ -0,0 +1,122 @@
+#
+# GPU time of each pass by GL_TIME_ELAPSED queries (cf. MultiPassRenderer.profiler)
+#
+import OpenGL.GL as gl
+import collections, json
+
+
+# Queries of frame N are read back `latency` frames later so that reading result doesn't stall
+class GpuProfiler():
+  def __init__(self, latency=2, history=600):
+    self.latency = latency # int
+    self.free = []         # [GLuint] (query objects for reuse)
+    self.pending = collections.deque() # [[(name : str, query : GLuint)]] (per frame)
+    self.current = None    # [(name : str, query : GLuint)] | None
+    self.frames = collections.deque(maxlen=history) # [map<str, float>] (milliseconds per pass name)
+
+  def cleanup(self):
+    queries = self.free + [query for frame in self.pending for _, query in frame]
+    for query in queries:
+      gl.glDeleteQueries(1, [query])
+    self.free = []
+    self.pending.clear()
+    self.current = None
+
+  def begin_frame(self):
+    self.current = []
+
+  def end_frame(self):
+    if self.current is not None:
+      self.pending.append(self.current)
+    self.current = None
+    self.collect()
+
+  # Same name within frame (e.g. program run by substep) is summed
+  def begin(self, name):
+    query = self.free.pop() if len(self.free) > 0 else gl.glGenQueries(1)
+    gl.glBeginQuery(gl.GL_TIME_ELAPSED, query)
+    self.current.append((name, query))
+
+  def end(self):
+    gl.glEndQuery(gl.GL_TIME_ELAPSED)
+
+  # wait : bool (True to block until all pending results are available e.g. at exit)
+  def collect(self, wait=False):
+    while len(self.pending) > 0 and (wait or len(self.pending) > self.latency):
+      queries = self.pending[0]
+      # Queries finish in order, so last one being available implies all are
+      if not wait and len(queries) > 0 and \
+         not gl.glGetQueryObjectiv(queries[-1][1], gl.GL_QUERY_RESULT_AVAILABLE):
+        break
+      self.pending.popleft()
+      timings = {}
+      for name, query in queries:
+        elapsed = gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT) # nanoseconds
+        timings[name] = timings.get(name, 0) + int(elapsed) * 1e-6
+        self.free.append(query)
+      self.frames.append(timings)
+
+  # num_frames : int | None (only latest frames e.g. for GUI)
+  # -> map<str, dict> (mean/max milliseconds per pass in order of first appearance)
+  def summary(self, num_frames=None):
+    frames = list(self.frames)[-num_frames:] if num_frames else list(self.frames)
+    samples = {} # map<str, [float]>
+    for timings in frames:
+      for name, ms in timings.items():
+        samples.setdefault(name, []).append(ms)
+    return {
+      name: dict(mean_ms=sum(values) / len(values), max_ms=max(values), num_frames=len(values))
+      for name, values in samples.items()
+    }
+
+  def dump(self, filename):
+    with open(filename, 'w') as f:
+      json.dump(dict(summary=self.summary(), frames=list(self.frames)), f, indent=2)
+
+
+# GPU time of whole frame by GL_TIMESTAMP queries
+# (usable together with GpuProfiler since timestamp doesn't occupy GL_TIME_ELAPSED target)
+class GpuFrameTimer():
+  def __init__(self, latency=2):
+    self.latency = latency # int
+    self.free = []         # [GLuint]
+    self.pending = collections.deque() # [(tag, begin query : GLuint, end query : GLuint)]
+    self.current = None    # (tag, begin query : GLuint) | None
+
+  def cleanup(self):
+    queries = self.free + [query for _, begin, end in self.pending for query in [begin, end]]
+    if self.current is not None:
+      queries += [self.current[1]]
+    for query in queries:
+      gl.glDeleteQueries(1, [query])
+    self.free = []
+    self.pending.clear()
+    self.current = None
+
+  def timestamp(self): # -> GLuint
+    query = self.free.pop() if len(self.free) > 0 else gl.glGenQueries(1)
+    gl.glQueryCounter(query, gl.GL_TIMESTAMP)
+    return query
+
+  # tag : any (returned with frame time e.g. resolution the frame was rendered at)
+  def begin_frame(self, tag=None):
+    self.current = (tag, self.timestamp())
+
+  def end_frame(self):
+    tag, begin = self.current
+    self.pending.append((tag, begin, self.timestamp()))
+    self.current = None
+
+  # -> [(tag, milliseconds)] (frames completed since last call)
+  def collect(self, wait=False):
+    results = []
+    while len(self.pending) > 0 and (wait or len(self.pending) > self.latency):
+      tag, begin, end = self.pending[0]
+      if not wait and not gl.glGetQueryObjectiv(end, gl.GL_QUERY_RESULT_AVAILABLE):
+        break
+      self.pending.popleft()
+      t0 = gl.glGetQueryObjectui64v(begin, gl.GL_QUERY_RESULT) # nanoseconds
+      t1 = gl.glGetQueryObjectui64v(end, gl.GL_QUERY_RESULT)
+      results.append((tag, (int(t1) - int(t0)) * 1e-6))
+      self.free += [begin, end]
+    return results
@@ -0,0 +1,99 @@
+import unittest, os, tempfile, json
+from unittest import mock
+from . import profiler
+from .profiler import GpuProfiler
+
+
+# Query objects whose result is 1ms per query id and availability is controlled by test
+class FakeGL():
+  GL_TIME_ELAPSED = 0
+  GL_QUERY_RESULT = 1
+  GL_QUERY_RESULT_AVAILABLE = 2
+
+  def __init__(self):
+    self.num_queries = 0
+    self.available = True
+
+  def glGenQueries(self, n):
+    self.num_queries += 1
+    return self.num_queries
+
+  def glGetQueryObjectiv(self, query, pname):
+    return int(self.available)
+
+  def glGetQueryObjectui64v(self, query, pname):
+    return 10**6
+
+  def __getattr__(self, name):
+    return lambda *args: None
+
+
+def run_frame(p, names):
+  p.begin_frame()
+  for name in names:
+    p.begin(name)
+    p.end()
+  p.end_frame()
+
+
+class TestGpuProfiler(unittest.TestCase):
+  def test_latency00(self):
+    fake_gl = FakeGL()
+    with mock.patch.object(profiler, 'gl', fake_gl):
+      p = GpuProfiler(latency=2)
+      for _ in range(3):
+        run_frame(p, ['a', 'b', 'a'])
+      self.assertEqual(len(p.frames), 1)
+      self.assertEqual(p.frames[0], dict(a=2.0, b=1.0))
+
+      # Result not ready doesn't block
+      fake_gl.available = False
+      run_frame(p, ['a'])
+      self.assertEqual(len(p.frames), 1)
+
+      p.collect(wait=True)
+      self.assertEqual(len(p.frames), 4)
+      self.assertEqual(len(p.pending), 0)
+
+      # Queries are reused
+      self.assertEqual(fake_gl.num_queries, 9)
+      run_frame(p, ['a', 'b', 'a'])
+      self.assertEqual(fake_gl.num_queries, 9)
+
+  def test_summary00(self):
+    with mock.patch.object(profiler, 'gl', FakeGL()):
+      p = GpuProfiler(latency=0)
+      run_frame(p, ['a', 'a'])
+      run_frame(p, ['a', 'b'])
+      p.collect(wait=True)
+      summary = p.summary()
+      self.assertEqual(list(summary.keys()), ['a', 'b'])
+      self.assertEqual(summary['a'], dict(mean_ms=1.5, max_ms=2.0, num_frames=2))
+      self.assertEqual(p.summary(num_frames=1)['a']['mean_ms'], 1.0)
+      with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'profile.json')
+        p.dump(filename)
+        with open(filename) as f:
+          self.assertEqual(json.load(f)['frames'], [dict(a=2.0), dict(a=1.0, b=1.0)])
+
+
+class TestGpuFrameTimer(unittest.TestCase):
+  def test_latency00(self):
+    fake_gl = FakeGL()
+    fake_gl.glGetQueryObjectui64v = lambda query, pname: query * 10**6 # timestamp = query id (ms)
+    with mock.patch.object(profiler, 'gl', fake_gl):
+      t = profiler.GpuFrameTimer(latency=1)
+      t.begin_frame('a')
+      t.end_frame()
+      self.assertEqual(t.collect(), [])
+      t.begin_frame('b')
+      t.end_frame()
+      self.assertEqual(t.collect(), [('a', 1.0)])
+      fake_gl.available = False
+      self.assertEqual(t.collect(), [])
+      self.assertEqual(t.collect(wait=True), [('b', 1.0)])
+
+      # Queries are reused
+      t.begin_frame('c')
+      t.end_frame()
+      self.assertEqual(fake_gl.num_queries, 4)
@@ -0,0 +1,135 @@
+#
+# On-disk program binary cache (cf. glGetProgramBinary/glProgramBinary)
+#
+from PySide2 import QtGui
+import OpenGL.GL as gl
+import numpy as np
+import os, hashlib, struct
+from .common import ShaderError
+from .utils import DiskCache
+from . import trace
+
+
+# NOTE: Set SHADER_APP_PROGRAM_CACHE=0 to disable cache
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'python-shader-app', 'programs')
+DEFAULT_MAX_SIZE = 256 * 2**20  # bytes
+
+
+class ProgramBinaryCache(DiskCache):
+  def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+    super().__init__(directory, max_size, suffix='.bin')
+
+  # key : str -> (binary_format : int, binary : bytes) | None
+  def get(self, key):
+    data = self.read(key)
+    if data is None:
+      return None
+    if len(data) <= 4:
+      self.remove(key)
+      return None
+    binary_format, = struct.unpack('<I', data[:4])
+    return binary_format, data[4:]
+
+  def put(self, key, binary_format, binary):
+    self.write(key, struct.pack('<I', binary_format) + binary)
+
+
+def make_cache_key(driver_info, stages): # (str, [(int, str)]) -> str
+  h = hashlib.sha256()
+  h.update(driver_info.encode())
+  for shader_type, src in stages:
+    h.update(f"\0{int(shader_type)}\0".encode())
+    h.update(src.encode())
+  return h.hexdigest()
+
+
+def get_driver_info(): # -> str (needs current context)
+  return '\n'.join(
+      (gl.glGetString(name) or b'').decode()
+      for name in [gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION])
+
+
+_CACHE = None
+
+def get_program_cache(): # -> ProgramBinaryCache | None
+  global _CACHE
+  if os.environ.get('SHADER_APP_PROGRAM_CACHE') == '0':
+    return None
+  if _CACHE is None:
+    _CACHE = ProgramBinaryCache(
+        os.environ.get('SHADER_APP_PROGRAM_CACHE_DIR') or DEFAULT_CACHE_DIR)
+  return _CACHE
+
+
+def load_program_binary(program_id, binary_format, binary): # -> bool
+  gl.glProgramBinary(program_id, binary_format, binary, len(binary))
+  return bool(gl.glGetProgramiv(program_id, gl.GL_LINK_STATUS))
+
+
+def read_program_binary(program_id): # -> (int, bytes)
+  length = gl.glGetProgramiv(program_id, gl.GL_PROGRAM_BINARY_LENGTH)
+  binary = np.zeros(length, dtype=np.uint8)
+  written = np.zeros(1, dtype=np.int32)
+  binary_format = np.zeros(1, dtype=np.uint32)
+  gl.glGetProgramBinary(program_id, length, written, binary_format, binary)
+  return int(binary_format[0]), binary[:written[0]].tobytes()
+
+
+SHADER_TYPE_NAMES = {
+  QtGui.QOpenGLShader.Vertex: 'Vertex',
+  QtGui.QOpenGLShader.Fragment: 'Fragment',
+  QtGui.QOpenGLShader.Geometry: 'Geometry',
+  QtGui.QOpenGLShader.Compute: 'Compute',
+}
+
+# Compile and link QOpenGLShaderProgram or restore it from binary cache
+# program : QOpenGLShaderProgram, stages : [(QOpenGLShader.ShaderTypeBit, str)]
+@trace.traced()
+def build_program(program, stages, error_prefix=''):
+  program.removeAllShaders()
+  cache = get_program_cache()
+  key = None
+  if cache is not None:
+    program.create()
+    key = make_cache_key(get_driver_info(), stages)
+    try:
+      entry = cache.get(key)
+    except OSError as e: # e.g. unreadable cache directory, so compile without cache
+      print(f"[build_program] program cache is not available ({e})")
+      cache = entry = None
+    if entry is not None:
+      # NOTE: QOpenGLShaderProgram.link without shaders only checks GL_LINK_STATUS
+      with trace.span('load_program_binary'):
+        loaded = load_program_binary(program.programId(), *entry) and program.link()
+      if loaded:
+        return
+      # Binary format mismatch (e.g. driver update), so fallback to compile
+      print(f"[build_program] discard stale program binary {key[:12]}")
+      try:
+        cache.remove(key)
+      except OSError:
+        pass
+
+  for shader_type, src in stages:
+    with trace.span('compile', type=SHADER_TYPE_NAMES[shader_type]):
+      compiled = program.addShaderFromSourceCode(shader_type, src)
+    if not compiled:
+      raise ShaderError(f"{error_prefix}{SHADER_TYPE_NAMES[shader_type]}: \n{program.log()}")
+
+  if cache is not None:
+    gl.glProgramParameteri(program.programId(), gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+
+  with trace.span('link'):
+    linked = program.link()
+  if not linked:
+    raise ShaderError(f"{error_prefix}Link: \n{program.log()}")
+
+  if cache is not None:
+    binary_format, binary = read_program_binary(program.programId())
+    if len(binary) > 0:
+      try:
+        cache.put(key, binary_format, binary)
+      except OSError as e: # e.g. read-only or full cache directory
+        print(f"[build_program] failed to save program binary ({e})")
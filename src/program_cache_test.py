@@ -0,0 +1,42 @@
+import unittest, os, tempfile
+from unittest import mock
+from .program_cache import ProgramBinaryCache, make_cache_key
+
+
+class TestProgramCache(unittest.TestCase):
+  def test_misc00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = ProgramBinaryCache(tmpdir, max_size=1024)
+      self.assertEqual(cache.get('a'), None)
+      cache.put('a', 123, b'xyz')
+      self.assertEqual(cache.get('a'), (123, b'xyz'))
+      cache.remove('a')
+      self.assertEqual(cache.get('a'), None)
+
+  def test_evict00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = ProgramBinaryCache(tmpdir, max_size=(4 + 100) * 2)
+      for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, 0, bytes(100))
+        os.utime(cache.path(key), (i, i)) # make access order deterministic
+      cache.evict()
+      self.assertEqual(cache.get('a'), None)
+      self.assertEqual(cache.get('b'), (0, bytes(100)))
+      self.assertEqual(cache.get('c'), (0, bytes(100)))
+
+  def test_evict_concurrent00(self):
+    # Entries removed by other process while evicting
+    with tempfile.TemporaryDirectory() as tmpdir:
+      cache = ProgramBinaryCache(tmpdir, max_size=(4 + 100) * 2)
+      for key in ['a', 'b', 'c']:
+        cache.put(key, 0, bytes(100))
+      with mock.patch('os.remove', side_effect=FileNotFoundError):
+        cache.put('d', 0, bytes(100))
+      self.assertEqual(cache.get('d'), (0, bytes(100)))
+
+  def test_key00(self):
+    stages = [(1, 'void main() {}'), (2, 'void main() {}')]
+    key = make_cache_key('vendor', stages)
+    self.assertEqual(key, make_cache_key('vendor', stages))
+    self.assertNotEqual(key, make_cache_key('other-vendor', stages))
+    self.assertNotEqual(key, make_cache_key('vendor', stages[::-1]))
@@ -0,0 +1,106 @@
+#
+# Asynchronous readback of offscreen render result
+#
+import OpenGL.GL as gl
+import numpy as np
+import ctypes, threading, queue
+from . import trace
+
+
+# Consume frames on background thread with bounded queue (i.e. `put` blocks when consumer is behind)
+class FrameWriter():
+  def __init__(self, consume, max_queue=4):
+    self.consume = consume # (frame : int, data : uint8[H, W, 4]) -> None
+    self.queue = queue.Queue(max_queue)
+    self.error = None
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def run(self):
+    while True:
+      item = self.queue.get()
+      if item is None:
+        break
+      if self.error is None:
+        try:
+          self.consume(*item)
+        except Exception as e:
+          self.error = e
+
+  def put(self, frame, data):
+    if self.error is not None:
+      raise self.error
+    self.queue.put((frame, data))
+
+  def close(self):
+    self.queue.put(None)
+    self.thread.join()
+    if self.error is not None:
+      raise self.error
+
+
+# Ring of pixel buffer objects so that frame N is copied while frame N + 1 renders
+class PboReadback():
+  def __init__(self, W, H, on_frame, num_buffers=3):
+    self.W, self.H = W, H
+    self.on_frame = on_frame       # (frame : int, data : uint8[H, W, 4]) -> None
+    self.num_buffers = num_buffers # int
+    self.size = W * H * 4
+    self.pbos = []
+    self.pending = [] # [(frame : int, pbo : GLuint, fence : GLsync)]
+
+  def init_resource(self):
+    self.pbos = [gl.glGenBuffers(1) for _ in range(self.num_buffers)]
+    for pbo in self.pbos:
+      gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+      gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, self.size, None, gl.GL_STREAM_READ)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+
+  def cleanup(self):
+    for _, _, fence in self.pending:
+      gl.glDeleteSync(fence)
+    self.pending = []
+    for pbo in self.pbos:
+      gl.glDeleteBuffers(1, [pbo])
+    self.pbos = []
+
+  # Enqueue copy from framebuffer into next PBO (doesn't wait GPU unless ring is full)
+  def read(self, framebuffer, frame):
+    if len(self.pending) == self.num_buffers:
+      self.collect()
+    pbo = self.pbos[frame % self.num_buffers]
+    gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, framebuffer)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+    gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+    gl.glReadPixels(0, 0, self.W, self.H, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, 0)
+    fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+    self.pending.append((frame, pbo, fence))
+
+  # Map oldest pending PBO and pass its pixels (top row first) to `on_frame`
+  @trace.traced()
+  def collect(self):
+    frame, pbo, fence = self.pending.pop(0)
+    gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, gl.GL_TIMEOUT_IGNORED)
+    gl.glDeleteSync(fence)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, pbo)
+    ptr = gl.glMapBufferRange(gl.GL_PIXEL_PACK_BUFFER, 0, self.size, gl.GL_MAP_READ_BIT)
+    data = np.ctypeslib.as_array((ctypes.c_ubyte * self.size).from_address(ptr))
+    data = data.reshape((self.H, self.W, 4))[::-1].copy()
+    gl.glUnmapBuffer(gl.GL_PIXEL_PACK_BUFFER)
+    gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+    self.on_frame(frame, data)
+
+  def flush(self):
+    while len(self.pending) > 0:
+      self.collect()
+
+
+# data : uint8[H, W, 4] -> QImage
+@trace.traced()
+def to_qimage(data):
+  from PySide2 import QtGui
+  H, W = data.shape[:2]
+  qimage = QtGui.QImage(data.tobytes(), W, H, W * 4, QtGui.QImage.Format_RGBA8888)
+  return qimage.copy() # detach from temporary bytes
@@ -0,0 +1,21 @@
+import unittest
+import numpy as np
+from .readback import FrameWriter
+
+
+class TestFrameWriter(unittest.TestCase):
+  def test_misc00(self):
+    frames = []
+    writer = FrameWriter(lambda frame, data: frames.append((frame, int(data.sum()))), max_queue=2)
+    for frame in range(8):
+      writer.put(frame, np.full((2, 2, 4), frame, np.uint8))
+    writer.close()
+    self.assertEqual(frames, [(frame, frame * 16) for frame in range(8)])
+
+  def test_error00(self):
+    def consume(frame, data):
+      raise RuntimeError('disk full')
+    writer = FrameWriter(consume)
+    writer.put(0, None)
+    with self.assertRaises(RuntimeError):
+      writer.close()
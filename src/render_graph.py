@@ -0,0 +1,201 @@
+#
+# Dependency analysis of multipass configuration (cf. MultiPassRenderer.compile_plan)
+#
+import collections
+from .common import ShaderError
+
+
+# config : dict -> [('program', program : dict) | ('swap', sampler_name : str)]
+def schedule_ops(config):
+  programs = {}
+  for program in config['programs']:
+    programs.setdefault(program['name'], program)
+  samplers = [sampler['name'] for sampler in config['samplers'] if sampler['type'] == 'framebuffer']
+
+  ops = []
+  global_substep = config.get('substep')
+  if global_substep:
+    schedule = []
+    for task in global_substep['schedule']:
+      if task['type'] == 'program':
+        if task['name'] not in programs:
+          raise ShaderError(f"[render_graph] Unknown program in substep schedule : {task['name']}")
+        schedule += [('program', programs[task['name']])]
+      if task['type'] == 'sampler':
+        if task['name'] not in samplers:
+          raise ShaderError(f"[render_graph] Unknown sampler in substep schedule : {task['name']}")
+        schedule += [('swap', task['name'])]
+    ops += schedule * global_substep['num_iter']
+    ops += [('program', program) for program in config['programs'] if not program.get('substep')]
+
+  else:
+    ops += [('program', program) for program in config['programs']]
+    ops += [('swap', name) for name in samplers]
+
+  return ops
+
+
+# Draw recorded by `trace_frames`
+TraceDraw = collections.namedtuple('TraceDraw', [
+  'program', # dict
+  'frame',   # int
+  'reads',   # [(sampler name : str, index of draw which wrote what is read : int | None)]
+  'output',  # str | None (framebuffer sampler name)
+  'hazard',  # bool (reads and writes same texture)
+])
+
+# Simulate frames while tracking physical texture of front/back of each framebuffer
+# so that we know which draw wrote what each draw reads (including feedback from previous frame).
+# double_buffering : map<str, bool> -> ([TraceDraw], final front texture writer : map<str, int>)
+def trace_frames(config, double_buffering, num_frames=2):
+  framebuffers = [sampler['name'] for sampler in config['samplers'] if sampler['type'] == 'framebuffer']
+  ops = schedule_ops(config)
+
+  pairs = {} # map<str, [int, int]> (physical texture ids of front/back)
+  for i, name in enumerate(framebuffers):
+    pairs[name] = [2 * i, 2 * i + 1] if double_buffering[name] else [2 * i, 2 * i]
+
+  last_writer = {} # map<int, int> (texture id -> index of draw)
+  draws = []
+  for frame in range(num_frames):
+    for op, arg in ops:
+      if op == 'swap':
+        pair = pairs[arg]
+        pair[0], pair[1] = pair[1], pair[0]
+        continue
+      program = arg
+      reads = [name for name in program['samplers'] if name in pairs]
+      output = program.get('output')
+      output = output if output in pairs else None
+      hazard = output is not None and pairs[output][1] in [pairs[name][0] for name in reads]
+      reads = [(name, last_writer.get(pairs[name][0])) for name in reads]
+      if output is not None:
+        last_writer[pairs[output][1]] = len(draws)
+      draws += [TraceDraw(program, frame, reads, output, hazard)]
+
+  fronts = { name: last_writer.get(pairs[name][0]) for name in framebuffers }
+  return draws, fronts
+
+
+def get_double_buffering(config): # -> map<str, bool>
+  return {
+    sampler['name']: sampler.get('double_buffering', True)
+    for sampler in config['samplers'] if sampler['type'] == 'framebuffer'
+  }
+
+
+# Framebuffers whose content written in a frame is read in later frame (i.e. state carried across frames)
+# double_buffering : map<str, bool> (cf. plan_framebuffers) -> set<str>
+def find_feedback(config, double_buffering):
+  draws, _ = trace_frames(config, double_buffering)
+  return {
+    name for draw in draws for name, j in draw.reads
+    if j is not None and draws[j].frame != draw.frame
+  }
+
+
+# Find programs contributing to screen (or to "keep" sampler/program)
+# config : dict -> live program names : set<str>
+def analyze_liveness(config):
+  draws, fronts = trace_frames(config, get_double_buffering(config))
+  for draw in draws:
+    if draw.hazard:
+      raise ShaderError(
+          f"[render_graph] Program {draw.program['name']} reads and writes single-buffered sampler {draw.output}")
+
+  # Keep sampler's final content is read back by user (e.g. on_cleanup)
+  roots = set()
+  for sampler in config['samplers']:
+    if sampler.get('keep') and fronts.get(sampler['name']) is not None:
+      roots.add(fronts[sampler['name']])
+
+  for i, draw in enumerate(draws):
+    # Compute program and output to default framebuffer have side effects
+    program = draw.program
+    if program.get('type') == 'compute' or program.get('output') == '$default' or program.get('keep'):
+      roots.add(i)
+
+  # Propagate liveness backward by program name until fixpoint
+  live = set()
+  stack = list(roots)
+  while len(stack) > 0:
+    i = stack.pop()
+    name = draws[i].program['name']
+    if name not in live:
+      live.add(name)
+      stack += [j for j, draw in enumerate(draws) if draw.program['name'] == name]
+    stack += [j for _, j in draws[i].reads if j is not None and draws[j].program['name'] not in live]
+  return live
+
+
+BYTES_PER_PIXEL = {
+  'GL_R8': 1, 'GL_RG8': 2, 'GL_RGB8': 4, 'GL_RGBA8': 4,
+  'GL_R16F': 2, 'GL_RG16F': 4, 'GL_RGB16F': 8, 'GL_RGBA16F': 8,
+  'GL_R32F': 4, 'GL_RG32F': 8, 'GL_RGB32F': 12, 'GL_RGBA32F': 16,
+}
+
+def texture_bytes(sampler, w, h): # -> int
+  size = w * h * BYTES_PER_PIXEL.get(sampler.get('internal_format', 'GL_RGBA8'), 4)
+  return size * 4 // 3 if sampler.get('mipmap') else size
+
+
+# Decide framebuffer layout
+# - sampler without explicit "double_buffering" is single-buffered if no read can observe the difference
+# - single-buffered samplers only living within a frame share texture when lifetimes don't overlap
+# (config : dict, sizes : map<str, (int, int)>) -> (map<str, (double_buffering : bool, alias : str | None)>, stats : dict)
+def plan_framebuffers(config, sizes):
+  samplers = { s['name']: s for s in config['samplers'] if s['type'] == 'framebuffer' }
+  configured = get_double_buffering(config)
+  auto = [name for name, sampler in samplers.items() if 'double_buffering' not in sampler]
+
+  # Compare what each read observes with and without double buffering
+  draws_double, _ = trace_frames(config, configured)
+  draws_single, _ = trace_frames(config, dict(configured, **{ name: False for name in auto }))
+  double_buffering = dict(configured)
+  for name in auto:
+    hazard = any(draw.hazard and draw.output == name for draw in draws_single)
+    reads_double = [(i, j) for i, draw in enumerate(draws_double) for n, j in draw.reads if n == name]
+    reads_single = [(i, j) for i, draw in enumerate(draws_single) for n, j in draw.reads if n == name]
+    double_buffering[name] = hazard or reads_double != reads_single
+
+  # Lifetime of single-buffered samplers within the last simulated frame
+  draws, _ = trace_frames(config, double_buffering)
+  last_frame = draws[-1].frame if len(draws) > 0 else 0
+  intervals = {} # map<str, [int, int]>
+  transient = { name for name in samplers if not double_buffering[name] and not samplers[name].get('keep') }
+  for i, draw in enumerate(draws):
+    if draw.frame != last_frame:
+      continue
+    for name, j in draw.reads:
+      if j is None or draws[j].frame != last_frame or name not in intervals:
+        transient.discard(name) # content lives across frames
+        continue
+      intervals[name][1] = i
+    if draw.output is not None:
+      intervals.setdefault(draw.output, [i, i])[1] = i
+
+  # Greedy interval coloring among compatible textures
+  def texture_key(name):
+    sampler = samplers[name]
+    return (sizes[name], sampler.get('internal_format', 'GL_RGBA8'),
+            bool(sampler.get('mipmap')), sampler.get('mipmap_max_level'), sampler.get('wrap'), sampler.get('filter'))
+
+  aliases = {} # map<str, str>
+  slots = []   # [(key, primary : str, end : int)]
+  for name in sorted((n for n in transient if n in intervals), key=lambda n: intervals[n][0]):
+    start, end = intervals[name]
+    for k, (key, primary, slot_end) in enumerate(slots):
+      if key == texture_key(name) and slot_end < start:
+        aliases[name] = primary
+        slots[k] = (key, primary, end)
+        break
+    else:
+      slots += [(texture_key(name), name, end)]
+
+  layout = { name: (double_buffering[name], aliases.get(name)) for name in samplers }
+  naive = sum(
+      texture_bytes(samplers[name], *sizes[name]) * (2 if configured[name] else 1) for name in samplers)
+  planned = sum(
+      texture_bytes(samplers[name], *sizes[name]) * (2 if double_buffering[name] else 1)
+      for name in samplers if name not in aliases)
+  return layout, dict(naive_bytes=naive, planned_bytes=planned)
@@ -0,0 +1,175 @@
+import unittest
+from .common import ShaderError
+from .render_graph import analyze_liveness, plan_framebuffers, find_feedback, get_double_buffering
+
+
+def framebuffer(name, **kwargs):
+  return dict(name=name, type='framebuffer', **kwargs)
+
+
+class TestRenderGraph(unittest.TestCase):
+  def test_liveness00(self):
+    config = dict(
+      samplers=[framebuffer('buf0'), framebuffer('buf1'), framebuffer('unused')],
+      programs=[
+        dict(name='pass0', samplers=[], output='buf0'),
+        dict(name='pass1', samplers=['buf0'], output='buf1'),
+        dict(name='pass2', samplers=['buf1'], output='unused'),
+        dict(name='pass3', samplers=['buf1'], output='$default'),
+      ])
+    self.assertEqual(analyze_liveness(config), {'pass0', 'pass1', 'pass3'})
+
+    config['samplers'][2]['keep'] = True
+    self.assertEqual(analyze_liveness(config), {'pass0', 'pass1', 'pass2', 'pass3'})
+
+  def test_liveness01(self):
+    # Manual ping-pong of single-buffered samplers (cf. ex43_convection_diffusion_substep_manual)
+    config = dict(
+      samplers=[
+        framebuffer('buf', double_buffering=False),
+        framebuffer('buf1', double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf1'),
+        dict(name='mainImage2', samplers=['buf1'], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    self.assertEqual(analyze_liveness(config), {'mainImage', 'mainImage1', 'mainImage2'})
+
+  def test_liveness02(self):
+    # Only last write within frame is visible from next frame
+    config = dict(
+      samplers=[framebuffer('buf')],
+      programs=[
+        dict(name='overwritten', samplers=[], output='buf'),
+        dict(name='writer', samplers=[], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    self.assertEqual(analyze_liveness(config), {'writer', 'mainImage'})
+
+  def test_liveness03(self):
+    config = dict(
+      samplers=[framebuffer('buf')],
+      programs=[
+        dict(name='substep', samplers=['buf'], output='buf', substep=True),
+        dict(name='unused', samplers=[], output='buf', substep=True),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ],
+      substep=dict(num_iter=4, schedule=[
+        dict(type='program', name='substep'),
+        dict(type='sampler', name='buf'),
+      ]))
+    self.assertEqual(analyze_liveness(config), {'substep', 'mainImage'})
+
+  def test_hazard00(self):
+    config = dict(
+      samplers=[framebuffer('buf', double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    with self.assertRaises(ShaderError):
+      analyze_liveness(config)
+
+  def test_plan00(self):
+    # "buf" is always read before written within frame, so single buffer is enough
+    config = dict(
+      samplers=[framebuffer('buf'), framebuffer('feedback')],
+      programs=[
+        dict(name='mainImage', samplers=['buf', 'feedback'], output='$default'),
+        dict(name='mainImage1', samplers=['feedback'], output='buf'),
+        dict(name='mainImage2', samplers=['feedback'], output='feedback'),
+      ])
+    sizes = dict(buf=(4, 4), feedback=(4, 4))
+    layout, stats = plan_framebuffers(config, sizes)
+    self.assertEqual(layout, dict(buf=(False, None), feedback=(True, None)))
+    self.assertEqual(stats, dict(naive_bytes=4 * 4 * 4 * 4, planned_bytes=4 * 4 * 4 * 3))
+
+  def test_plan01(self):
+    # Transient single-buffered samplers with disjoint lifetimes share texture
+    config = dict(
+      samplers=[
+        framebuffer('a', double_buffering=False),
+        framebuffer('b', double_buffering=False),
+        framebuffer('c', double_buffering=False),
+        framebuffer('d', double_buffering=False, internal_format='GL_RGBA32F')],
+      programs=[
+        dict(name='pass0', samplers=[], output='a'),
+        dict(name='pass1', samplers=['a'], output='b'),
+        dict(name='pass2', samplers=['b'], output='c'),
+        dict(name='pass3', samplers=['c'], output='d'),
+        dict(name='mainImage', samplers=['d'], output='$default'),
+      ])
+    sizes = { name: (4, 4) for name in 'abcd' }
+    layout, stats = plan_framebuffers(config, sizes)
+    self.assertEqual(layout, dict(a=(False, None), b=(False, None), c=(False, 'a'), d=(False, None)))
+    self.assertEqual(stats['naive_bytes'] - stats['planned_bytes'], 4 * 4 * 4)
+
+  def test_plan02(self):
+    # Only textures of same size, format, mipmap, wrap and filter are shared
+    config = dict(
+      samplers=[framebuffer(name, double_buffering=False) for name in 'abcd'],
+      programs=[
+        dict(name='pass0', samplers=[], output='a'),
+        dict(name='pass1', samplers=['a'], output='b'),
+        dict(name='pass2', samplers=['b'], output='c'),
+        dict(name='pass3', samplers=['c'], output='d'),
+        dict(name='mainImage', samplers=['d'], output='$default'),
+      ])
+    sizes = { name: (4, 4) for name in 'abcd' }
+    layout, _ = plan_framebuffers(config, sizes)
+    self.assertEqual(layout, dict(a=(False, None), b=(False, None), c=(False, 'a'), d=(False, 'b')))
+
+    config['samplers'][2]['mipmap'] = True
+    layout, _ = plan_framebuffers(config, dict(sizes, d=(8, 8)))
+    self.assertEqual(layout, dict(a=(False, None), b=(False, None), c=(False, None), d=(False, None)))
+
+    # Texture parameter set per texture (cf. configure_gl_texture)
+    config['samplers'][2]['mipmap'] = False
+    config['samplers'][2]['mipmap_max_level'] = 2
+    layout, _ = plan_framebuffers(config, sizes)
+    self.assertEqual(layout['c'], (False, None))
+
+  def test_plan03(self):
+    # "keep" sampler's content outlives frame, so its texture isn't shared
+    config = dict(
+      samplers=[
+        framebuffer('a', double_buffering=False),
+        framebuffer('b', double_buffering=False),
+        framebuffer('c', double_buffering=False, keep=True)],
+      programs=[
+        dict(name='pass0', samplers=[], output='a'),
+        dict(name='pass1', samplers=['a'], output='b'),
+        dict(name='pass2', samplers=['b'], output='c'),
+        dict(name='mainImage', samplers=['b'], output='$default'),
+      ])
+    layout, _ = plan_framebuffers(config, { name: (4, 4) for name in 'abc' })
+    self.assertEqual(layout, dict(a=(False, None), b=(False, None), c=(False, None)))
+
+    del config['samplers'][2]['keep']
+    config['programs'][3]['samplers'] = ['c']
+    layout, _ = plan_framebuffers(config, { name: (4, 4) for name in 'abc' })
+    self.assertEqual(layout['c'], (False, 'a'))
+
+  def test_feedback00(self):
+    # Manual ping-pong carries "buf" to next frame even though it is single-buffered
+    config = dict(
+      samplers=[
+        framebuffer('buf', double_buffering=False),
+        framebuffer('buf1', double_buffering=False),
+        framebuffer('tmp', double_buffering=False)],
+      programs=[
+        dict(name='mainImage1', samplers=['buf'], output='buf1'),
+        dict(name='mainImage2', samplers=['buf1'], output='buf'),
+        dict(name='mainImage3', samplers=[], output='tmp'),
+        dict(name='mainImage', samplers=['buf', 'tmp'], output='$default'),
+      ])
+    self.assertEqual(find_feedback(config, get_double_buffering(config)), {'buf'})
+
+    # Double-buffered sampler is read one frame later
+    config = dict(
+      samplers=[framebuffer('buf')],
+      programs=[
+        dict(name='mainImage1', samplers=[], output='buf'),
+        dict(name='mainImage', samplers=['buf'], output='$default'),
+      ])
+    self.assertEqual(find_feedback(config, get_double_buffering(config)), {'buf'})
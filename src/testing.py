@@ -0,0 +1,66 @@
+#
+# OpenGL/Qt stubs to run MultiPassRenderer without context (used by app_test and bench_plan)
+#
+from . import app
+from .render_graph import analyze_liveness
+
+
+# Stub for OpenGL.GL and Qt objects so that MultiPassRenderer can run without context
+class NullGL():
+  def __init__(self):
+    self.calls = [] # [str]
+
+  def __getattr__(self, name):
+    if name.startswith('GL_'):
+      return 0
+    return lambda *args, **kwargs: self.calls.append(name)
+
+
+class FakeRenderer():
+  def __init__(self, name, log):
+    self.name = name
+    self.log = log
+
+  def draw(self, texture_ids, *args, **kwargs):
+    self.log.append((self.name, tuple(texture_ids)))
+
+
+class FakeFbo():
+  def __init__(self, handle):
+    self.handle = handle
+
+  def texture(self):
+    return self.handle
+
+  def bind(self):
+    pass
+
+
+def make_renderer(config, log):
+  renderer = app.MultiPassRenderer(offscreen=True)
+  renderer.config = config
+  renderer.live_programs = analyze_liveness(config)
+  for program in config['programs']:
+    renderer.renderers[program['name']] = FakeRenderer(program['name'], log)
+  for i, sampler in enumerate(config['samplers']):
+    renderer.framebuffers[sampler['name']] = [FakeFbo(2 * i + 1), FakeFbo(2 * i + 2)]
+    renderer.framebuffer_sizes[sampler['name']] = app.get_sampler_size(sampler, 16, 16)
+  return renderer
+
+
+def draw(renderer, frame=0):
+  renderer.draw(
+      0, 16, 16, frame, 0, mouse_down=False,
+      mouse_press_pos=None, mouse_release_pos=None, mouse_move_pos=None,
+      key=0, key_modifiers=0)
+
+
+SUBSTEP_CONFIG = dict(
+  samplers=[dict(name='buf', type='framebuffer', mipmap=True)],
+  programs=[
+    dict(name='mainImage1', samplers=['buf'], output='buf', substep=True),
+    dict(name='mainImage', samplers=['buf'], output='$default'),
+  ],
+  substep=dict(
+    num_iter=3,
+    schedule=[dict(type='program', name='mainImage1'), dict(type='sampler', name='buf')]))
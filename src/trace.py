@@ -0,0 +1,80 @@
+#
+# CPU tracing spans exported as Chrome trace-event JSON (cf. chrome://tracing, https://ui.perfetto.dev)
+#
+# Usage:
+#   with trace.span('configure', file=file): ...
+#   @trace.traced()
+#   def f(): ...
+#
+import contextlib, functools, json, os, threading, time
+
+_events = None # [dict] | None (None when disabled so that spans cost only one check)
+
+
+def enable():
+  global _events
+  _events = []
+
+
+def disable():
+  global _events
+  _events = None
+
+
+def is_enabled():
+  return _events is not None
+
+
+def events(): # -> [dict] (recorded so far)
+  return list(_events or [])
+
+
+def _now_us():
+  return time.perf_counter_ns() / 1000
+
+
+class _Span():
+  __slots__ = ['name', 'args', 'start']
+
+  def __init__(self, name, args):
+    self.name = name
+    self.args = args
+
+  def __enter__(self):
+    self.start = _now_us()
+    return self
+
+  def __exit__(self, *_):
+    events = _events
+    if events is not None:
+      events.append(dict(
+        name=self.name, ph='X', ts=self.start, dur=_now_us() - self.start,
+        pid=os.getpid(), tid=threading.get_ident(), args=self.args))
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+# args : values shown in viewer (converted by str)
+def span(name, **args):
+  if _events is None:
+    return _NULL_SPAN
+  return _Span(name, { k: str(v) for k, v in args.items() })
+
+
+# Decorator version of `span` (name defaults to qualified function name)
+def traced(name=None):
+  def decorator(func):
+    span_name = name or func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if _events is None:
+        return func(*args, **kwargs)
+      with _Span(span_name, {}):
+        return func(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def export(filename):
+  with open(filename, 'w') as f:
+    json.dump(dict(traceEvents=events(), displayTimeUnit='ms'), f)
@@ -0,0 +1,48 @@
+import unittest, os, tempfile, json, timeit
+from . import trace
+
+
+@trace.traced()
+def traced_function(x):
+  return x + 1
+
+
+class TestTrace(unittest.TestCase):
+  def tearDown(self):
+    trace.disable()
+
+  def test_disabled00(self):
+    self.assertFalse(trace.is_enabled())
+    with trace.span('a', k=1):
+      pass
+    self.assertEqual(traced_function(1), 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'trace.json')
+      trace.export(filename)
+      with open(filename) as f:
+        self.assertEqual(json.load(f)['traceEvents'], [])
+
+  def test_enabled00(self):
+    trace.enable()
+    with trace.span('outer', file='x.glsl'):
+      self.assertEqual(traced_function(1), 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'trace.json')
+      trace.export(filename)
+      with open(filename) as f:
+        events = json.load(f)['traceEvents']
+    self.assertEqual([e['name'] for e in events], ['traced_function', 'outer'])
+    inner, outer = events
+    self.assertEqual(outer['args'], dict(file='x.glsl'))
+    self.assertEqual(outer['ph'], 'X')
+    self.assertLessEqual(outer['ts'], inner['ts'])
+    self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+  def test_overhead00(self):
+    # Disabled span must be cheap enough to leave in per-frame code
+    # (~0.3us here, bound is loose for slow/noisy CI machines)
+    def run():
+      with trace.span('a', k=1):
+        pass
+    t = min(timeit.repeat(run, number=10000, repeat=5)) / 10000
+    self.assertLess(t, 5e-6)
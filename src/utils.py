@@ -1,10 +1,11 @@
 #
 # Miscellaneous helper
 #
-import sys, traceback, signal, os, re
+import sys, traceback, signal, os, re, collections, threading, hashlib, pickle
 from PySide2 import QtCore
 import numpy as np
-from .common import APP
+from .common import APP, ShaderError
+from . import trace
 
 
 # Wrap buggy function which is constantly invoked from Qt's eventloop
@@ -57,100 +58,299 @@ def handle_OpenGL_debug_message(m):
   print(f"[QOpenGLDebugLogger] {message}")
 
 
-# file : str -> (result : str, include_files : [str])
-def preprocess_include(file, add_line_directive=True):
-  import os, re
-  file_dir = os.path.dirname(file)
-  with open(file) as f:
-    file_content = f.read()
-  include_files = [] # [str]
-  result = ''
-  if add_line_directive:
-    result += '#line 1\n'
-  for i, line in enumerate(file_content.splitlines(keepends=True)):
-    m = re.match('#include "(.*)"', line)
-    if m:
-      dep = os.path.join(file_dir, m.group(1))
-      dep_result, dep_include_files = preprocess_include(dep)
-      include_files += ([dep] + dep_include_files)
-      result += dep_result
+def get_file_stamp(file): # -> (int, int) (mtime in nanoseconds, size)
+  stat = os.stat(file)
+  return stat.st_mtime_ns, stat.st_size
+
+
+# File parsed for include expansion (cf. IncludeCache)
+IncludeNode = collections.namedtuple('IncludeNode', [
+  'stamp',    # (int, int) (cf. get_file_stamp)
+  'lines',    # [str]
+  'includes', # map<int, str> (line index -> included file)
+  'once',     # bool (file has "#pragma once" line)
+])
+
+
+# Include graph where
+# - each file is re-read only when its mtime/size changes
+# - expanded result is memoized until any file it depends on changes
+# - file with "#pragma once" is expanded only once per result
+#   (others can be included repeatedly e.g. utils/font_data_v0.glsl defining variants by macro)
+class IncludeCache():
+  def __init__(self):
+    self.nodes = {}   # map<str, IncludeNode>
+    self.results = {} # map<(str, bool), (str, [str], [(str, stamp)])>
+
+  def clear(self):
+    self.nodes = {}
+    self.results = {}
+
+  def get_node(self, file, stamp): # -> IncludeNode
+    node = self.nodes.get(file)
+    if node is not None and node.stamp == stamp:
+      return node
+    with open(file) as f:
+      lines = f.read().splitlines(keepends=True)
+    file_dir = os.path.dirname(file)
+    includes, once = {}, False
+    for i, line in enumerate(lines):
+      m = re.match('#include "(.*)"', line)
+      if m:
+        includes[i] = os.path.join(file_dir, m.group(1))
+      elif line.strip() == '#pragma once':
+        once = True
+        lines[i] = '\n' # keep line number
+    node = self.nodes[file] = IncludeNode(stamp, lines, includes, once)
+    return node
+
+  # -> (result : str, include_files : [str])
+  def preprocess(self, file, add_line_directive=True):
+    key = (file, add_line_directive)
+    memo = self.results.get(key)
+    if memo is not None and all(get_file_stamp(dep) == stamp for dep, stamp in memo[2]):
+      return memo[0], list(memo[1])
+    stamps = {} # map<str, stamp> (every file read for this result, stat only once)
+    result, include_files = self.expand(file, add_line_directive, [], set(), stamps)
+    self.results[key] = (result, include_files, list(stamps.items()))
+    return result, list(include_files)
+
+  # stack : [str] (includers of file for cycle detection)
+  # expanded : set<str> (files with "#pragma once" already expanded)
+  def expand(self, file, add_line_directive, stack, expanded, stamps):
+    norm_file = os.path.normpath(file)
+    if norm_file in stack:
+      raise ShaderError(f"[preprocess_include] Include cycle ( {' -> '.join(stack + [norm_file])} )")
+    if file not in stamps:
+      stamps[file] = get_file_stamp(file)
+    node = self.get_node(file, stamps[file])
+    if node.once:
+      expanded.add(norm_file)
+
+    include_files = [] # [str]
+    result = ''
+    if add_line_directive:
+      result += '#line 1\n'
+    for i, line in enumerate(node.lines):
+      dep = node.includes.get(i)
+      if dep is None:
+        result += line
+        continue
+      if os.path.normpath(dep) not in expanded:
+        dep_result, dep_include_files = self.expand(
+            dep, add_line_directive, stack + [norm_file], expanded, stamps)
+        include_files += ([dep] + dep_include_files)
+        result += dep_result
       if add_line_directive:
         result += f"#line {i + 2}\n"
-    else:
-      result += line
-  return result, include_files
+    return result, include_files
+
+
+INCLUDE_CACHE = IncludeCache()
 
 
+# file : str -> (result : str, include_files : [str])
+@trace.traced()
+def preprocess_include(file, add_line_directive=True):
+  return INCLUDE_CACHE.preprocess(file, add_line_directive)
+
+
+# Emit `changed` once per burst of file change events (editor's save often emits several e.g.
+# truncate, write, rename) and only when expanded source actually changed
 class PreprocessIncludeWatcher(QtCore.QObject):
   changed = QtCore.Signal()
 
   # in_file : str
-  def __init__(self, in_file):
+  # debounce_ms : int (events within this interval since last event are coalesced)
+  # max_retries : int (times to wait for file missing or empty transitionally e.g. during atomic rename)
+  def __init__(self, in_file, debounce_ms=100, max_retries=20):
     super(PreprocessIncludeWatcher, self).__init__()
     self.in_file = in_file
+    self.max_retries = max_retries
+    self.retries = 0
+    self.changed_paths = set() # set<str> (since last update)
+    self.src_hash = None       # str | None (hash of expanded source at last update)
+    self.timer = QtCore.QTimer(self)
+    self.timer.setSingleShot(True)
+    self.timer.setInterval(debounce_ms)
+    self.timer.timeout.connect(self.handle_timeout)
     self.qt_watcher = QtCore.QFileSystemWatcher([in_file])
     self.qt_watcher.fileChanged.connect(self.handle_changed)
     self.update(emit_signal=False)
 
-  # Ignore empty file which can be sometimes produced by file writer transitionally
   def handle_changed(self, path):
-    with open(path) as f:
-      src = f.read()
-    if len(src) == 0:
-      print(f"[PreprocessIncludeWatcher] ignore empty file {path}")
-    else:
-      self.update(emit_signal=True)
+    self.changed_paths.add(path)
+    self.timer.start() # restart so that reload happens after burst settles
+
+  def handle_timeout(self):
+    # File can be missing or empty transitionally (e.g. truncated before write, removed before rename)
+    pending = [
+      path for path in self.changed_paths | {self.in_file}
+      if not os.path.exists(path) or os.path.getsize(path) == 0
+    ]
+    if len(pending) > 0 and self.retries < self.max_retries:
+      self.retries += 1
+      self.timer.start()
+      return
+    if len(pending) > 0:
+      print(f"[PreprocessIncludeWatcher] missing or empty file ( {', '.join(pending)} )")
+    self.retries = 0
+    self.changed_paths = set()
+    self.update(emit_signal=True)
 
   # emit_signal : bool
   def update(self, emit_signal):
-    _, include_files = preprocess_include(self.in_file)
-    self.qt_watcher.removePaths(self.qt_watcher.files())
-    self.qt_watcher.addPaths([self.in_file] + include_files)
-    if emit_signal:
+    try:
+      src, include_files = preprocess_include(self.in_file)
+      src_hash = hashlib.sha1(src.encode()).hexdigest()
+    except (OSError, ShaderError):
+      # Reload reports the error while files which exist are kept watched
+      src_hash, include_files = None, []
+
+    # Path replaced by rename drops out of watcher, so it's added back whenever it exists
+    paths = [path for path in dict.fromkeys([self.in_file] + include_files) if os.path.exists(path)]
+    watched = self.qt_watcher.files()
+    removed = [path for path in watched if path not in paths]
+    added = [path for path in paths if path not in watched]
+    if len(removed) > 0:
+      self.qt_watcher.removePaths(removed)
+    if len(added) > 0:
+      self.qt_watcher.addPaths(added)
+    if len(removed) > 0 or len(added) > 0:
+      print(f"[PreprocessIncludeWatcher] watching ( {', '.join(self.qt_watcher.files())} )")
+
+    unchanged = src_hash is not None and src_hash == self.src_hash
+    self.src_hash = src_hash
+    if emit_signal and unchanged:
+      print(f"[PreprocessIncludeWatcher] skip reload since source is unchanged")
+    elif emit_signal:
       self.changed.emit()
-    print(f"[PreprocessIncludeWatcher] watching ( {', '.join(self.qt_watcher.files())} )")
-
-
-def preprocess_source_env(src):
-  # %%ENV:<name>:<default>%%
-  ms = re.finditer('%%ENV:(.*?):(.*?)%%', src)
-  result = src
-  for m in list(ms)[::-1]: # replace from the tail of the source
-    value = os.environ.get(m.group(1)) or m.group(2)
-    result = result[:m.start()] + value + result[m.end():]
-  return result
-
-
-def preprocess_source_eval(src):
-  # %%EVAL:<expr>%%
-  ms = re.finditer('%%EVAL:(.*?)%%', src)
-  result = src
-  eval_ns = dict(os=os)
-  for m in list(ms)[::-1]: # replace from the tail of the source
-    value = str(eval(m.group(1), eval_ns))
-    result = result[:m.start()] + value + result[m.end():]
-  return result
-
-
-def preprocess_source_exec(src):
-  # %%EXEC:<statements>%%
-  import textwrap
-  ms = re.finditer('%%EXEC:(.*?)%%', src, re.DOTALL)
-  result = src
-  for m in list(ms)[::-1]: # replace from the tail of the source
-    value = str(exec_config(textwrap.dedent(m.group(1))))
-    result = result[:m.start()] + value + result[m.end():]
-  return result
 
 
+# Directive kinds in the order of expansion i.e.
+# - result of directive is expanded only by later kinds
+# - %%EVAL%% can contain earlier kinds (e.g. "%%EVAL: %%ENV:N:1%% * 4 %%")
+DIRECTIVE_KINDS = ('EXEC', 'ENV', 'EVAL')
+DIRECTIVE_PATTERNS = dict(
+  EXEC=re.compile('%%EXEC:(.*?)%%', re.DOTALL), # %%EXEC:<statements>%%
+  ENV=re.compile('%%ENV:(.*?):(.*?)%%'),        # %%ENV:<name>:<default>%%
+  # %%EVAL:<expr>%% ends at "%%" found by scanning <expr> (cf. DirectivePreprocessor.scan)
+)
+DIRECTIVE_DELIMITER = re.compile('%%(?:(EXEC|ENV|EVAL):)?')
+
+
+# Expand all directives in single scan where
+# - output is collected as chunks and joined once
+# - source map tells original line of each output line (for error reporting)
+# - %%EVAL%% result is memoized by (expression, environment)
+class DirectivePreprocessor():
+  def __init__(self, max_size=256):
+    self.eval_results = {} # map<(str, tuple), str>
+    self.max_size = max_size
+
+  def clear(self):
+    self.eval_results = {}
+
+  # -> (result : str, source_map : [int] (1-based line in `src` of each output line))
+  def preprocess(self, src):
+    # Environment is read when each directive is expanded since %%EXEC%% can modify it
+    # (e.g. ex74_dynamics), so %%EVAL%% memo key is recomputed only after %%EXEC%%
+    context = dict(environ_key=None)
+    result, _, source_map = self.scan(src, 0, DIRECTIVE_KINDS, context, in_eval=False)
+    return result, source_map
+
+  # Scan `src` from `pos` until the end (or the end of %%EVAL%% expression when `in_eval`)
+  # -> (result : str, end : int, source_map : [int]) | None (when %%EVAL%% is not closed)
+  def scan(self, src, pos, kinds, context, in_eval):
+    chunks = [] # [str]
+    line = 1 # relative to `pos`
+    source_map = [line]
+    while True:
+      m = DIRECTIVE_DELIMITER.search(src, pos)
+      end = len(src) if m is None else m.start()
+      if in_eval and (m is None or '\n' in src[pos:end]):
+        return None # expression must be within single line
+      chunks.append(src[pos:end])
+      num_lines = src.count('\n', pos, end)
+      source_map.extend(range(line + 1, line + 1 + num_lines))
+      line += num_lines
+      if m is None:
+        break
+
+      kind = m.group(1)
+      expanded = None
+      if kind in kinds:
+        expanded = self.expand(src, m, kind, context)
+      if expanded is None:
+        if in_eval:
+          return ''.join(chunks), m.start() + 2, source_map
+        chunks.append('%') # literal "%" (e.g. "%%config-start%%")
+        pos = m.start() + 1
+        continue
+      value, directive_end = expanded
+      later_kinds = DIRECTIVE_KINDS[DIRECTIVE_KINDS.index(kind) + 1:]
+      if later_kinds and '%%' in value:
+        value, _, _ = self.scan(value, 0, later_kinds, context, in_eval=False)
+      chunks.append(value)
+      source_map.extend([line] * value.count('\n'))
+      line += src.count('\n', m.start(), directive_end)
+      pos = directive_end
+    return ''.join(chunks), len(src), source_map
+
+  # -> (value : str, end : int) | None (when directive is not closed)
+  def expand(self, src, m, kind, context):
+    try:
+      if kind == 'EVAL':
+        scanned = self.scan(src, m.end(), DIRECTIVE_KINDS[:-1], context, in_eval=True)
+        if scanned is None:
+          return None
+        expr, end, _ = scanned
+        if context['environ_key'] is None:
+          context['environ_key'] = tuple(sorted(os.environ.items()))
+        return self.eval(expr, context['environ_key']), end
+
+      d = DIRECTIVE_PATTERNS[kind].match(src, m.start())
+      if d is None:
+        return None
+      if kind == 'ENV':
+        return os.environ.get(d.group(1)) or d.group(2), d.end()
+      import textwrap
+      context['environ_key'] = None
+      return str(exec_config(textwrap.dedent(d.group(1)))), d.end()
+    except ShaderError:
+      raise
+    except Exception as e:
+      line = src.count('\n', 0, m.start()) + 1
+      raise ShaderError(
+          f"[preprocess_source] %%{kind}%% at line {line}\n{traceback.format_exc()}") from e
+
+  def eval(self, expr, environ_key): # -> str
+    key = (expr, environ_key)
+    value = self.eval_results.get(key)
+    if value is None:
+      if len(self.eval_results) >= self.max_size:
+        self.eval_results = {}
+      value = self.eval_results[key] = str(eval(expr, dict(os=os)))
+    return value
+
+
+DIRECTIVE_PREPROCESSOR = DirectivePreprocessor()
+
+
+# -> (str, [int]) (cf. DirectivePreprocessor.preprocess)
+def preprocess_source_map(src):
+  return DIRECTIVE_PREPROCESSOR.preprocess(src)
+
+
+@trace.traced()
 def preprocess_source(src): # -> str
-  src = preprocess_source_exec(src)
-  src = preprocess_source_env(src)
-  src = preprocess_source_eval(src)
-  return src
+  # %%EXEC%% and %%ENV%% share os.environ and exec namespace with other thread (cf. ShaderBuildWorker)
+  with EXEC_LOCK:
+    return preprocess_source_map(src)[0]
 
 
 # src : str -> config : dict
+@trace.traced()
 def parse_shader_config(src):
   # TODO: this is super out-dated
   """
@@ -244,20 +444,326 @@ DEFAULT_EXEC_NAMESPACE = dict(
   APP=APP,
 )
 
+# Serialize snippets since GUI thread and ShaderBuildWorker share namespace, os.environ and cache
+EXEC_LOCK = threading.RLock()
+
+# cache : bool (reuse result while inputs are unchanged cf. ExecResultCache)
+@trace.traced()
 def exec_config(
     v, result_name='RESULT',
-    namespace=DEFAULT_EXEC_NAMESPACE):
-  exec(v, namespace)
-  return namespace[result_name]
+    namespace=DEFAULT_EXEC_NAMESPACE, cache=False):
+  with EXEC_LOCK:
+    exec_cache = get_exec_cache() if cache else None
+    if exec_cache is not None:
+      return exec_cache.exec(v, result_name, namespace)
+    exec(v, namespace)
+    return namespace[result_name]
 
 def exec_config_if_str(
     v, result_name='RESULT',
-    namespace=DEFAULT_EXEC_NAMESPACE):
+    namespace=DEFAULT_EXEC_NAMESPACE, cache=False):
   if type(v) == str:
-    return exec_config(v, result_name, namespace)
+    return exec_config(v, result_name, namespace, cache)
   return v
 
 
+# Files under `directory` where least recently used ones are removed when total size exceeds `max_size`
+class DiskCache():
+  def __init__(self, directory, max_size, suffix='.bin'):
+    self.directory = directory # str
+    self.max_size = max_size   # int (bytes)
+    self.suffix = suffix       # str
+
+  def path(self, key):
+    return os.path.join(self.directory, f"{key}{self.suffix}")
+
+  def read(self, key): # -> bytes | None
+    path = self.path(key)
+    try:
+      with open(path, 'rb') as f:
+        data = f.read()
+      os.utime(path) # mark as recently used for eviction
+    except FileNotFoundError: # including removal by other process
+      return None
+    return data
+
+  def write(self, key, data):
+    os.makedirs(self.directory, exist_ok=True)
+    # Write to temporary file first so that concurrent reader never sees partial data
+    path = self.path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+      with open(tmp_path, 'wb') as f:
+        f.write(data)
+      os.replace(tmp_path, path)
+    except OSError:
+      if os.path.exists(tmp_path): # e.g. disk full
+        os.remove(tmp_path)
+      raise
+    self.evict()
+
+  def remove(self, key):
+    try:
+      os.remove(self.path(key))
+    except FileNotFoundError:
+      pass
+
+  # NOTE: Other process (e.g. batch --jobs) can remove the same files concurrently
+  def evict(self):
+    entries = [] # [(mtime, size, path)]
+    for name in os.listdir(self.directory):
+      if not name.endswith(self.suffix):
+        continue
+      path = os.path.join(self.directory, name)
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        continue
+      entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total <= self.max_size:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+
+
+# Names referred from exec snippet
+# -> (modules : [str], names : set<str>, strings : [str])
+def get_exec_inputs(v):
+  import ast
+  modules, names, strings = [], set(), []
+  for node in ast.walk(ast.parse(v)):
+    if isinstance(node, ast.Import):
+      modules += [alias.name for alias in node.names]
+    elif isinstance(node, ast.ImportFrom) and node.level == 0:
+      modules += [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+    elif isinstance(node, ast.Name):
+      names.add(node.id)
+    elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+      strings.append(node.value)
+  return modules, names, strings
+
+
+OS_WRITE_FUNCTIONS = ['putenv', 'unsetenv', 'chdir']
+ENVIRON_WRITE_METHODS = ['update', 'setdefault', 'pop', 'popitem', 'clear']
+
+# True when snippet affects more than its result so that it cannot be skipped on cache hit
+# e.g. os.environ['N1'] = '16' (ex74_dynamics), "def" for later snippet, APP (app state)
+def has_exec_side_effects(v): # -> bool
+  import ast
+  for node in ast.walk(ast.parse(v)):
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal)):
+      return True
+    if isinstance(node, ast.Name) and node.id == 'APP':
+      return True
+    if isinstance(node, ast.Attribute):
+      if isinstance(node.ctx, (ast.Store, ast.Del)) or node.attr in OS_WRITE_FUNCTIONS:
+        return True
+    if isinstance(node, ast.Subscript) and isinstance(node.ctx, (ast.Store, ast.Del)) and \
+        isinstance(node.value, ast.Attribute) and node.value.attr == 'environ':
+      return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and \
+        node.func.attr in ENVIRON_WRITE_METHODS and \
+        isinstance(node.func.value, ast.Attribute) and node.func.value.attr == 'environ':
+      return True
+  return False
+
+
+def is_library_file(file): # -> bool (standard library or site-packages)
+  file = os.path.abspath(file)
+  prefixes = [sys.prefix, sys.base_prefix, sys.exec_prefix]
+  return 'site-packages' in file or any(file.startswith(prefix + os.sep) for prefix in prefixes)
+
+
+# Files of non-library modules reachable from `module_names` via module attributes
+# (e.g. "import misc.mesh.src.ex01" depends on misc/mesh/src/utils.py imported by ex01)
+def get_module_files(module_names): # -> [str]
+  from types import ModuleType, FunctionType
+  stack = [sys.modules[name] for name in module_names if name in sys.modules]
+  visited = set()
+  files = []
+  while len(stack) > 0:
+    m = stack.pop()
+    if m.__name__ in visited:
+      continue
+    visited.add(m.__name__)
+    file = getattr(m, '__file__', None)
+    if file is None or is_library_file(file):
+      continue
+    files.append(file)
+    for value in list(vars(m).values()):
+      if isinstance(value, ModuleType):
+        stack.append(value)
+      elif isinstance(value, (type, FunctionType)) and value.__module__ in sys.modules:
+        stack.append(sys.modules[value.__module__])
+  return files
+
+
+def is_plain_data(obj): # -> bool (result which can be cached)
+  if isinstance(obj, (tuple, list)):
+    return all(is_plain_data(x) for x in obj)
+  if isinstance(obj, dict):
+    return all(is_plain_data(k) and is_plain_data(v) for k, v in obj.items())
+  if isinstance(obj, np.ndarray):
+    return obj.dtype != object
+  return obj is None or isinstance(obj, (bytes, bytearray, str, bool, int, float, np.generic))
+
+
+ExecEntry = collections.namedtuple('ExecEntry', [
+  'stamps',  # [(str, (int, int))] (cf. get_file_stamp)
+  'environ', # map<str, str | None>
+  'result',
+])
+
+ENV_NAME_PATTERN = re.compile('[A-Za-z_][A-Za-z0-9_]*$')
+
+
+# Memoized exec_config result (in memory and on disk) which is reused while
+# - snippet source is same
+# - files of imported modules (cf. get_module_files) and files named by string literal are unchanged
+# - environment variables named by string literal are unchanged
+# Snippet is executed on copy of namespace so that its imports/assignments are invisible to other
+# snippets whether cached or not. Snippet with side effects (cf. has_exec_side_effects) or returning
+# other than plain data is always executed as usual.
+class ExecResultCache():
+  def __init__(self, disk=None, max_entries=32):
+    self.disk = disk               # DiskCache | None
+    self.entries = {}              # map<str, ExecEntry> (insertion order is recency)
+    self.max_entries = max_entries # int
+
+  def make_key(self, v, result_name): # -> str
+    return hashlib.sha256(f"{result_name}\0{v}".encode()).hexdigest()
+
+  def is_valid(self, entry): # -> bool
+    for file, stamp in entry.stamps:
+      try:
+        if get_file_stamp(file) != stamp:
+          return False
+      except FileNotFoundError:
+        return False
+    return all(os.environ.get(name) == value for name, value in entry.environ.items())
+
+  def get(self, key): # -> ExecEntry | None
+    entry = self.entries.pop(key, None)
+    if entry is None and self.disk is not None:
+      try:
+        data = self.disk.read(key)
+      except OSError as e:
+        print(f"[ExecResultCache] failed to read cache ({e})")
+        data = None
+      if data is not None:
+        try:
+          entry = pickle.loads(data)
+        except Exception:
+          entry = None
+          self.disk.remove(key) # e.g. written by incompatible version
+    if entry is None or not self.is_valid(entry):
+      return None
+    self.put_memory(key, entry)
+    return entry
+
+  def put_memory(self, key, entry):
+    self.entries[key] = entry
+    while len(self.entries) > self.max_entries:
+      self.entries.pop(next(iter(self.entries)))
+
+  def put(self, key, entry):
+    self.put_memory(key, entry)
+    if self.disk is not None:
+      try:
+        self.disk.write(key, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+      except OSError as e: # e.g. read-only or full cache directory
+        print(f"[ExecResultCache] failed to write cache ({e})")
+
+  def exec(self, v, result_name, namespace):
+    if has_exec_side_effects(v):
+      return exec_config(v, result_name, namespace)
+    key = self.make_key(v, result_name)
+    entry = self.get(key)
+    if entry is not None:
+      namespace[result_name] = entry.result
+      return entry.result
+
+    modules, _, strings = get_exec_inputs(v)
+    files = [s for s in strings if '\n' not in s and os.path.isfile(s)]
+    environ = { s: os.environ.get(s) for s in strings if ENV_NAME_PATTERN.match(s) }
+    stamps = [(file, get_file_stamp(file)) for file in files]
+    result = namespace[result_name] = exec_config(v, result_name, dict(namespace))
+    if is_plain_data(result):
+      stamps += [(file, get_file_stamp(file)) for file in get_module_files(modules)]
+      self.put(key, ExecEntry(stamps, environ, result))
+    return result
+
+
+# NOTE: Set SHADER_APP_EXEC_CACHE=0 to disable cache
+DEFAULT_EXEC_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'python-shader-app', 'exec')
+DEFAULT_EXEC_CACHE_MAX_SIZE = 1024 * 2**20  # bytes
+
+_EXEC_CACHE = None
+
+def get_exec_cache(): # -> ExecResultCache | None
+  global _EXEC_CACHE
+  if os.environ.get('SHADER_APP_EXEC_CACHE') == '0':
+    return None
+  if _EXEC_CACHE is None:
+    _EXEC_CACHE = ExecResultCache(DiskCache(
+        os.environ.get('SHADER_APP_EXEC_CACHE_DIR') or DEFAULT_EXEC_CACHE_DIR,
+        DEFAULT_EXEC_CACHE_MAX_SIZE, suffix='.pickle'))
+  return _EXEC_CACHE
+
+
+# Collect stamps of existing files referenced from config values (e.g. sampler "file", ssbo "data")
+# obj : dict | list | str -> [(path : str, mtime : float, size : int)]
+def file_stamps(obj):
+  if isinstance(obj, dict):
+    return [stamp for v in obj.values() for stamp in file_stamps(v)]
+  if isinstance(obj, list):
+    return [stamp for v in obj for stamp in file_stamps(v)]
+  if isinstance(obj, str) and '\n' not in obj and os.path.isfile(obj):
+    stat = os.stat(obj)
+    return [(obj, stat.st_mtime, stat.st_size)]
+  return []
+
+
+# Files which python snippets in config (e.g. rasterscript "exec") depend on i.e.
+# files named by string literal (e.g. gltf) and imported non-library modules (e.g. misc/mesh/src/*.py)
+# config : dict | list | str -> [(path : str, mtime : float, size : int)]
+def get_exec_file_stamps(config):
+  import importlib
+  snippets = [] # [str]
+  stack = [config]
+  while len(stack) > 0:
+    obj = stack.pop()
+    if isinstance(obj, dict):
+      stack += list(obj.values())
+    elif isinstance(obj, list):
+      stack += obj
+    elif isinstance(obj, str):
+      snippets.append(obj)
+
+  files, modules = [], []
+  for snippet in snippets:
+    try:
+      snippet_modules, _, strings = get_exec_inputs(snippet)
+    except SyntaxError: # not python (e.g. "$default")
+      continue
+    files += strings
+    modules += snippet_modules
+  # Import to follow transitive imports (same modules are imported by rendering anyway)
+  for name in modules:
+    try:
+      importlib.import_module(name)
+    except ImportError: # e.g. "from misc.mesh.src.data import hedron20"
+      pass
+  return file_stamps(sorted(set(files))) + file_stamps(sorted(set(get_module_files(modules))))
+
+
 def if3(cond, x, y):
   return x if cond else y
 
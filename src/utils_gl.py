@@ -1,9 +1,12 @@
 from PySide2 import QtGui, QtCore
 import OpenGL.GL as gl
 import numpy as np
+import collections
 from .utils import if3
+from . import trace
 
 
+@trace.traced()
 def setup_texture_data(target, filename, config, level=0):
   if filename.endswith('.hdr'):
     setup_texture_data_hdr(target, filename, config, level=level)
@@ -54,3 +57,32 @@ def setup_texture_parameters(target, config):
     gl.glTexParameteri(target, gl.GL_TEXTURE_BASE_LEVEL, 0)
     gl.glTexParameteri(target, gl.GL_TEXTURE_MAX_LEVEL, len(config.get('file_mipmaps', range(10))) - 1)
     gl.glGenerateMipmap(target)
+
+
+# Names of uniforms used after linking (compiler drops declared but unused ones)
+def get_active_uniforms(program_handle): # -> set<str>
+  names = set()
+  for i in range(int(gl.glGetProgramiv(program_handle, gl.GL_ACTIVE_UNIFORMS))):
+    name, _, _ = gl.glGetActiveUniform(program_handle, i)
+    name = name.decode()
+    names.add(name[:-3] if name.endswith('[0]') else name)
+  return names
+
+
+# Bound number of frames CPU can queue ahead of GPU by waiting the oldest frame's fence
+class FrameFences():
+  def __init__(self, max_in_flight):
+    self.max_in_flight = max_in_flight # int
+    self.fences = collections.deque()  # deque<GLsync>
+
+  def end_frame(self):
+    self.fences.append(gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0))
+    while len(self.fences) > self.max_in_flight:
+      fence = self.fences.popleft()
+      gl.glClientWaitSync(fence, gl.GL_SYNC_FLUSH_COMMANDS_BIT, gl.GL_TIMEOUT_IGNORED)
+      gl.glDeleteSync(fence)
+
+  def cleanup(self):
+    for fence in self.fences:
+      gl.glDeleteSync(fence)
+    self.fences.clear()
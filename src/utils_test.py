@@ -1,8 +1,21 @@
 import unittest, os, tempfile
-from .utils import preprocess_include, preprocess_source
+from .common import ShaderError
+from .utils import preprocess_include, preprocess_source, preprocess_source_map, file_stamps, \
+    IncludeCache, DirectivePreprocessor, DiskCache, ExecResultCache
 
 
 class TestUtils(unittest.TestCase):
+  # Keep developer's cache (~/.cache/python-shader-app/exec) untouched
+  def setUp(self):
+    self.exec_cache_env = os.environ.get('SHADER_APP_EXEC_CACHE')
+    os.environ['SHADER_APP_EXEC_CACHE'] = '0'
+
+  def tearDown(self):
+    if self.exec_cache_env is None:
+      del os.environ['SHADER_APP_EXEC_CACHE']
+    else:
+      os.environ['SHADER_APP_EXEC_CACHE'] = self.exec_cache_env
+
   def test_misc00(self):
     example = """\
 a
@@ -29,6 +42,48 @@ None e
     result = preprocess_source(example)
     self.assertEqual(result, expected)
 
+  def test_preprocess_source_map00(self):
+    example = """\
+a
+%%EXEC:
+  RESULT = 'b'
+%% %%EVAL: '1\\n2' %%
+c %%EVAL: %%ENV:TEST_PREPROCESS_SOURCE_MAP:3%% * 2 %% %%config-start%%
+"""
+    result, source_map = preprocess_source_map(example)
+    self.assertEqual(result, "a\nb 1\n2\nc 6 %%config-start%%\n")
+    self.assertEqual(source_map, [1, 2, 4, 5, 6])
+
+  def test_preprocess_source_exec_env00(self):
+    # %%ENV%% sees environment modified by preceding %%EXEC%% (e.g. ex74_dynamics)
+    name = 'TEST_PREPROCESS_SOURCE_EXEC_ENV'
+    src = f'%%EXEC:\nos.environ["{name}"]="16"\nRESULT=""\n%%\nvalue=%%ENV:{name}:none%% %%EVAL: %%ENV:{name}:0%% * 2 %%'
+    try:
+      self.assertEqual(preprocess_source(src), '\nvalue=16 32')
+    finally:
+      os.environ.pop(name, None)
+
+  def test_preprocess_source_error00(self):
+    with self.assertRaises(ShaderError) as cm:
+      preprocess_source("a\nb\n%%EVAL: undefined_name %%\n")
+    self.assertIn('%%EVAL%% at line 3', str(cm.exception))
+
+  def test_preprocess_source_memo00(self):
+    preprocessor = DirectivePreprocessor()
+    name = 'TEST_PREPROCESS_SOURCE_MEMO'
+    src = f"%%EVAL: int(os.environ.get('{name}', 0)) + 1 %%"
+    os.environ[name] = '1'
+    try:
+      self.assertEqual(preprocessor.preprocess(src)[0], '2')
+      self.assertEqual(len(preprocessor.eval_results), 1)
+      self.assertEqual(preprocessor.preprocess(src)[0], '2')
+      self.assertEqual(len(preprocessor.eval_results), 1)
+      os.environ[name] = '2'
+      self.assertEqual(preprocessor.preprocess(src)[0], '3')
+      self.assertEqual(len(preprocessor.eval_results), 2)
+    finally:
+      del os.environ[name]
+
 
   def test_preprocess_include_ex1(self):
     includer = """\
@@ -98,3 +153,154 @@ void mainImage(out vec4 frag_color, vec2 frag_coord) {
       result, included_files = preprocess_include(includer_file, add_line_directive=True)
       self.assertEqual(result, expected_result)
       self.assertEqual(included_files, [includee1_file, includee2_file])
+
+  def test_preprocess_include_once00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      files = { name: os.path.join(tmpdir, name) for name in ['main.glsl', 'a.glsl', 'b.glsl', 'macro.glsl'] }
+      contents = {
+        'main.glsl': '#include "a.glsl"\n#include "b.glsl"\n#include "macro.glsl"\n#include "macro.glsl"\n',
+        'a.glsl': '#pragma once\n#include "b.glsl"\nA\n',
+        'b.glsl': '#pragma once\nB\n',
+        'macro.glsl': 'M\n',
+      }
+      for name, content in contents.items():
+        with open(files[name], 'w') as f: f.write(content)
+
+      # "#pragma once" file is expanded once and file without it is expanded every time
+      result, include_files = IncludeCache().preprocess(files['main.glsl'], add_line_directive=False)
+      self.assertEqual(result, '\n\nB\nA\nM\nM\n')
+      self.assertEqual(include_files, [files[name] for name in ['a.glsl', 'b.glsl', 'macro.glsl', 'macro.glsl']])
+
+      # Cycle
+      with open(files['b.glsl'], 'w') as f: f.write('#include "main.glsl"\n')
+      with self.assertRaisesRegex(ShaderError, 'Include cycle'):
+        IncludeCache().preprocess(files['main.glsl'])
+
+  def test_preprocess_include_cache00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      main_file, common_file = os.path.join(tmpdir, 'main.glsl'), os.path.join(tmpdir, 'common.glsl')
+      with open(main_file, 'w') as f: f.write('#include "common.glsl"\nmain\n')
+      with open(common_file, 'w') as f: f.write('common\n')
+      cache = IncludeCache()
+      result0, _ = cache.preprocess(main_file)
+      main_node = cache.nodes[main_file]
+
+      # Unchanged files are neither read nor expanded again
+      memo = cache.results[(main_file, True)]
+      self.assertEqual(cache.preprocess(main_file)[0], result0)
+      self.assertIs(cache.results[(main_file, True)], memo)
+
+      # Only changed file is read again
+      with open(common_file, 'w') as f: f.write('common changed\n')
+      result1, _ = cache.preprocess(main_file)
+      self.assertEqual(result1, '#line 1\n#line 1\ncommon changed\n#line 2\nmain\n')
+      self.assertIs(cache.nodes[main_file], main_node)
+
+  def test_file_stamps(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      file = os.path.join(tmpdir, "data.bin")
+      with open(file, 'wb') as f: f.write(bytes(16))
+      config = dict(
+        name='buf', file=file, exec='import os\nRESULT = 0',
+        files=[file, os.path.join(tmpdir, "not_found.bin")])
+      stamps = file_stamps(config)
+      self.assertEqual([path for path, _, _ in stamps], [file, file])
+      self.assertEqual(stamps[0][2], 16)
+
+  def test_watcher00(self):
+    from .utils import PreprocessIncludeWatcher
+    with tempfile.TemporaryDirectory() as tmpdir:
+      main_file, common_file = os.path.join(tmpdir, 'main.glsl'), os.path.join(tmpdir, 'common.glsl')
+      with open(main_file, 'w') as f: f.write('#include "common.glsl"\nmain\n')
+      with open(common_file, 'w') as f: f.write('common\n')
+      watcher = PreprocessIncludeWatcher(main_file, max_retries=1)
+      emitted = []
+      watcher.changed.connect(lambda: emitted.append(True))
+      self.assertEqual(sorted(watcher.qt_watcher.files()), sorted([main_file, common_file]))
+
+      # Burst of events is handled once (timeout is called directly instead of event loop)
+      with open(common_file, 'w') as f: f.write('common changed\n')
+      watcher.handle_changed(common_file)
+      watcher.handle_changed(common_file)
+      self.assertTrue(watcher.timer.isActive())
+      watcher.handle_timeout()
+      self.assertEqual(len(emitted), 1)
+
+      # Saving same content doesn't reload
+      with open(common_file, 'w') as f: f.write('common changed\n')
+      watcher.handle_changed(common_file)
+      watcher.handle_timeout()
+      self.assertEqual(len(emitted), 1)
+
+      # Empty file waits for write
+      open(main_file, 'w').close()
+      watcher.handle_changed(main_file)
+      watcher.handle_timeout()
+      self.assertEqual(len(emitted), 1)
+
+      # Atomic rename save keeps file watched
+      tmp_file = os.path.join(tmpdir, 'main.glsl.tmp')
+      with open(tmp_file, 'w') as f: f.write('#include "common.glsl"\nmain changed\n')
+      os.replace(tmp_file, main_file)
+      watcher.handle_timeout()
+      self.assertEqual(len(emitted), 2)
+      self.assertEqual(sorted(watcher.qt_watcher.files()), sorted([main_file, common_file]))
+
+  def test_exec_cache00(self):
+    with tempfile.TemporaryDirectory() as tmpdir:
+      module_file = os.path.join(tmpdir, 'test_exec_cache_module.py')
+      data_file = os.path.join(tmpdir, 'data.txt')
+      with open(module_file, 'w') as f: f.write('COUNT = [0]\n')
+      with open(data_file, 'w') as f: f.write('abc')
+      name = 'TEST_EXEC_CACHE'
+      src = f"""\
+import test_exec_cache_module as m
+m.COUNT[0] += 1
+with open({data_file!r}) as f:
+  RESULT = f.read() + os.environ.get('{name}', ''), m.COUNT[0]
+"""
+      import sys
+      sys.path.insert(0, tmpdir)
+      try:
+        cache = ExecResultCache(DiskCache(os.path.join(tmpdir, 'cache'), 2**20, suffix='.pickle'))
+        namespace = dict(RESULT=None, os=os)
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abc', 1))
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abc', 1))
+
+        # Restore from disk
+        cache = ExecResultCache(cache.disk)
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abc', 1))
+
+        # Re-execute when data file, environment or module changes
+        with open(data_file, 'w') as f: f.write('abcd')
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abcd', 2))
+        os.environ[name] = 'e'
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abcde', 3))
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abcde', 3))
+        with open(module_file, 'w') as f: f.write('COUNT = [0]\n\n')
+        self.assertEqual(cache.exec(src, 'RESULT', namespace), ('abcde', 4))
+
+        # Snippet referring app state is always executed
+        src_app = "APP['count'] += 1\nRESULT = APP['count']"
+        namespace['APP'] = dict(count=0)
+        self.assertEqual(cache.exec(src_app, 'RESULT', namespace), 1)
+        self.assertEqual(cache.exec(src_app, 'RESULT', namespace), 2)
+
+        # Snippet modifying environment or defining function is always executed
+        src_env = f"os.environ['{name}'] = 'x'\nRESULT = 0"
+        self.assertEqual(cache.exec(src_env, 'RESULT', namespace), 0)
+        del os.environ[name]
+        self.assertEqual(cache.exec(src_env, 'RESULT', namespace), 0)
+        self.assertEqual(os.environ.get(name), 'x')
+        src_def = "def helper(): return 1\nRESULT = 0"
+        cache.exec(src_def, 'RESULT', namespace)
+        self.assertIn('helper', namespace)
+
+        # Cached snippet doesn't leak its names into shared namespace
+        self.assertNotIn('m', namespace)
+        self.assertNotIn('f', namespace)
+        self.assertEqual(len(cache.entries), 1)
+      finally:
+        sys.path.remove(tmpdir)
+        sys.modules.pop('test_exec_cache_module', None)
+        os.environ.pop(name, None)